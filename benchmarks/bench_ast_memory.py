@@ -0,0 +1,97 @@
+import gc
+import os
+import random
+import re
+import sys
+import tracemalloc
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# memory held by the parsed tree of a 100k statement program, measured with
+# tracemalloc for the tree nodes in slots and for the same compiler with the
+# slots of the tree nodes taken out, so every node carries a dict
+
+STATEMENTS = 100000
+STATEMENTS_PER_FUNCTION = 50
+SEED = 1
+
+
+def generate_source(seed = SEED):
+    # plain assignments with an if or while block every few statements
+    rng = random.Random(seed)
+    lines = ["global {"]
+    for function in range(STATEMENTS // STATEMENTS_PER_FUNCTION):
+        lines.append(f"    f{function}(a, b) {{")
+        statement = 0
+        while statement < STATEMENTS_PER_FUNCTION:
+            choice = rng.random()
+            if choice < 0.1:
+                lines.append(f"        if a > {rng.randint(0, 99)} {{")
+                lines.append(f"            b = b + {rng.randint(0, 9)}")
+                lines.append("        }")
+                statement += 2
+            elif choice < 0.15:
+                lines.append(f"        while b < {rng.randint(0, 99)} {{")
+                lines.append("            b = b * 2 + a")
+                lines.append("        }")
+                statement += 2
+            else:
+                lines.append(f"        x{statement} = a * {rng.randint(0, 99)} + f(b, {rng.randint(0, 9)})")
+                statement += 1
+        lines.append("        return a")
+        lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def compiler_without_node_slots():
+    # the same compiler source, loaded as a second module with the slots of
+    # the tree node classes removed
+    with open(muriel.__file__) as f:
+        source = f.read()
+    source = re.sub(r"^    __slots__ = \(\"parent_ast\".*\n", "", source, flags = re.MULTILINE)
+    module = types.ModuleType("muriel_dict")
+    module.__file__ = muriel.__file__
+    exec(compile(source, muriel.__file__, "exec"), module.__dict__)
+    return module
+
+
+def measure(module, source):
+    tokens = module.TokenTable.from_source(source, "bench")
+    gc.collect()
+    tracemalloc.start()
+    ast = module.MurielAst("bench")
+    ast.parse(module.module_token_span(tokens, "bench"))
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = 0
+    pending = [function.body for namespace in ast.namespaces.values() for function in namespace.functions.values()]
+    while pending:
+        scope = pending.pop()
+        for statement in scope.statements:
+            nodes += 1
+            for name in ("body", "else_block"):
+                block = getattr(statement, name, None)
+                if block is not None:
+                    pending.append(block)
+    return current, peak, nodes
+
+
+def main():
+    source = generate_source()
+    print(f"{'nodes':>7} {'statements':>11} {'tree (MiB)':>11} {'peak (MiB)':>11} {'bytes/stmt':>11}")
+    base = None
+    for name, module in [("dict", compiler_without_node_slots()), ("slots", muriel)]:
+        current, peak, statements = measure(module, source)
+        if base is None:
+            base = current
+        print(f"{name:>7} {statements:>11} {current / 2 ** 20:>11.1f} {peak / 2 ** 20:>11.1f} {current / statements:>11.0f}")
+    print(f"slots keep the tree in {current / base:.0%} of the memory")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+from program_generator import generate_program
+
+# a project of many small programs that all include the same generated
+# library modules, compiled with one interpreter launch per file and as one
+# batch, in a single process and in a worker pool
+
+PROGRAMS = 60
+LIBRARY_MODULES = 8
+JOBS = [1, 2]
+SEED = 1
+COMPILER = muriel.__file__
+
+
+def generate_project(directory, seed = SEED):
+    # the library is a generated program whose main module is dropped, every
+    # program calls the entry of a few library modules
+    rng = random.Random(seed)
+    library = os.path.join(directory, "lib")
+    os.makedirs(library)
+    os.remove(generate_program(library, seed, modules = LIBRARY_MODULES, include_shape = "tree"))
+    programs = os.path.join(directory, "programs")
+    os.makedirs(programs)
+    for index in range(PROGRAMS):
+        used = rng.sample(range(LIBRARY_MODULES), 3)
+        lines = [f"include (m{module}) as m{module}" for module in used]
+        lines.extend(["", "global {", "    main() {", "        t = 0"])
+        lines.extend(f"        t = t + m{module}.entry({rng.randint(0, 9)})" for module in used)
+        lines.extend(["        print(t)", "    }", "}"])
+        with open(os.path.join(programs, f"p{index}.mur"), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+    return library, programs
+
+
+def compile_separately(library, programs, out_dir):
+    os.makedirs(out_dir)
+    start = time.perf_counter()
+    for name in sorted(os.listdir(programs)):
+        subprocess.run([sys.executable, COMPILER, "-I", library, os.path.join(programs, name), os.path.join(out_dir, name + ".out.c")], check = True, capture_output = True)
+    return time.perf_counter() - start
+
+
+def compile_batch(library, programs, out_dir, jobs):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, COMPILER, "-I", library, "--out-dir", out_dir, "-j", str(jobs), programs], check = True, capture_output = True)
+    return time.perf_counter() - start
+
+
+def same_outputs(first, second):
+    for name in os.listdir(first):
+        with open(os.path.join(first, name), 'rb') as a, open(os.path.join(second, name), 'rb') as b:
+            if a.read() != b.read():
+                return False
+    return True
+
+
+def main():
+    print(f"{'mode':>12} {'files':>6} {'time (s)':>9} {'files/s':>8} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        library, programs = generate_project(directory)
+        base_dir = os.path.join(directory, "separate")
+        base = compile_separately(library, programs, base_dir)
+        print(f"{'separate':>12} {PROGRAMS:>6} {base:>9.2f} {PROGRAMS / base:>8.1f} {1:>7.1f}x")
+        for jobs in JOBS:
+            out_dir = os.path.join(directory, f"batch{jobs}")
+            elapsed = compile_batch(library, programs, out_dir, jobs)
+            if not same_outputs(base_dir, out_dir):
+                print(f"-j {jobs}: outputs differ")
+            print(f"{f'batch -j {jobs}':>12} {PROGRAMS:>6} {elapsed:>9.2f} {PROGRAMS / elapsed:>8.1f} {base / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
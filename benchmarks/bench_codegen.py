@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+from bench_token_storage import generate_flat_source
+
+# C generation of a large program streamed through the buffered writer against
+# joining every chunk into one string first, the streamed peak should not grow
+# with the size of the output
+
+FUNCTION_COUNTS = [5000, 20000]
+
+
+def load(directory, function_count):
+    file = os.path.join(directory, f"flat{function_count}.mur")
+    with open(file, 'w') as f:
+        f.write(generate_flat_source(function_count))
+    return muriel.CompilationSession().load_program(file)
+
+
+def streamed(ast, output):
+    muriel.write_output(ast, output)
+
+
+def joined(ast, output):
+    text = "".join(muriel.CGenerator(ast).emit_program())
+    with open(output, 'w') as f:
+        f.write(text)
+
+
+def measure(emit, ast, output):
+    # timed and traced in separate runs, tracing slows the emitter down
+    start = time.perf_counter()
+    emit(ast, output)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    emit(ast, output)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    print(f"{'functions':>10} {'emitter':>8} {'output (MiB)':>13} {'time (ms)':>10} {'MiB/s':>8} {'peak (KiB)':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "out.c")
+        for function_count in FUNCTION_COUNTS:
+            ast = load(directory, function_count)
+            for name, emit in (("streamed", streamed), ("joined", joined)):
+                elapsed, peak = measure(emit, ast, output)
+                size = os.path.getsize(output) / (1024 * 1024)
+                print(f"{function_count:>10} {name:>8} {size:>13.2f} {elapsed * 1000:>10.1f} {size / elapsed:>8.1f} {peak / 1024:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# machine generated functions with if, while, loop and switch blocks nested
+# thousands deep, compiled to C from the source file, and parsed with the
+# explicit stack statement parser and with a recursive reference parser, which
+# runs the same parse steps but opens every nested scope with a call and is
+# given a raised recursion limit once it fails with the default one
+
+DEPTHS = [100, 1000, 10000]
+REPEATS = 3
+RECURSION_LIMIT = 200000
+
+
+def generate_nested_source(depth):
+    # generated code is not indented, indenting every level would make the
+    # source quadratic in the depth
+    lines = ["global {", "main(args) {"]
+    for level in range(depth):
+        lines.append(f"x = x + {level}")
+        kind = level % 4
+        if kind == 0:
+            lines.append(f"if x > {level} {{")
+        elif kind == 1:
+            lines.append(f"while x < {level} {{")
+        elif kind == 2:
+            lines.append("loop {")
+        else:
+            lines.extend([f"switch x {{", f"{level}: {{", "x = 0", "}", "default: {"])
+    for level in reversed(range(depth)):
+        lines.append("}" if level % 4 != 3 else "}\n}")
+    lines.append("}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def recursive_parse(scope, span):
+    # the reference parser, every scope a block opens is parsed by a nested call
+    for nested, nested_span in scope.parse_steps(span):
+        recursive_parse(nested, nested_span)
+
+
+def parse_time(source, parse):
+    tokens = muriel.TokenTable.from_source(source, "bench")
+    # the body of main is left to the parsers
+    ast = muriel.MurielAst("bench", muriel.CompilationSession(lazy_bodies = True))
+    ast.parse(muriel.module_token_span(tokens, "bench"))
+    function = ast.namespaces["global"].functions["main"]
+    best = None
+    for _ in range(REPEATS):
+        scope = muriel.ScopeBlockAst(function)
+        start = time.perf_counter()
+        parse(scope, function.span)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(tokens), best
+
+
+def recursive_parse_time(source):
+    # the default limit first, then the raised one for the timing
+    limit = sys.getrecursionlimit()
+    try:
+        return parse_time(source, recursive_parse)[1], "default"
+    except RecursionError:
+        pass
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    try:
+        return parse_time(source, recursive_parse)[1], "raised"
+    except RecursionError:
+        return None, "failed"
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+def compile_time(source, directory):
+    # lexing, parsing and generating the C of the whole program
+    path = os.path.join(directory, "bench.mur")
+    with open(path, 'w') as f:
+        f.write(source)
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        ast = muriel.CompilationSession().load_program(path)
+        muriel.write_output(ast, os.path.join(directory, "bench.c"))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print(f"{'depth':>6} {'tokens':>8} {'compile (ms)':>13} {'stack (ms)':>11} {'recursive (ms)':>15} {'limit':>8} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for depth in DEPTHS:
+            source = generate_nested_source(depth)
+            compiled = compile_time(source, directory)
+            token_count, elapsed = parse_time(source, muriel.ScopeBlockAst.parse)
+            recursive_elapsed, limit = recursive_parse_time(source)
+            line = f"{depth:>6} {token_count:>8} {compiled * 1000:>13.1f} {elapsed * 1000:>11.1f}"
+            if recursive_elapsed is None:
+                print(f"{line} {'-':>15} {limit:>8}")
+                continue
+            print(f"{line} {recursive_elapsed * 1000:>15.1f} {limit:>8} {recursive_elapsed / elapsed:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
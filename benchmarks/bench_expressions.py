@@ -0,0 +1,94 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# throughput of the expression parser on generated statements and conditions,
+# about a third of the generated expressions are constant and fold away
+
+FUNCTION_COUNTS = [1000, 5000]
+STATEMENTS_PER_FUNCTION = 8
+SEED = 1
+REPEATS = 3
+
+OPERATORS = ["+", "-", "*", "/", "%", "==", "<", ">=", "&&", "||", "<<", "&"]
+
+
+def random_operand(rng, constant):
+    if constant or rng.random() < 0.3:
+        return str(rng.randint(0, 1000))
+    return rng.choice(["a", "b", "c", "x.y", "items[i]", "f(a, b)", "v.norm()"])
+
+
+def random_expression(rng, depth, constant):
+    if depth == 0 or rng.random() < 0.2:
+        return random_operand(rng, constant)
+    left = random_expression(rng, depth - 1, constant)
+    right = random_expression(rng, depth - 1, constant)
+    text = f"{left} {rng.choice(OPERATORS)} {right}"
+    return f"({text})" if rng.random() < 0.3 else text
+
+
+def generate_expression_source(function_count, seed = SEED):
+    rng = random.Random(seed)
+    lines = ["global {"]
+    for function_index in range(function_count):
+        lines.append(f"    function{function_index}(a, b, c, items, i, x, v) {{")
+        for statement in range(STATEMENTS_PER_FUNCTION):
+            constant = rng.random() < 0.33
+            lines.append(f"        t{statement} = {random_expression(rng, 4, constant)}")
+        lines.append(f"        if {random_expression(rng, 3, False)} {{")
+        lines.append(f"            return {random_expression(rng, 2, False)}")
+        lines.append(f"        }}")
+        lines.append(f"    }}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def collect_expressions(scope, expressions):
+    for statement in scope.statements:
+        if isinstance(statement, muriel.ExpressionAst):
+            expressions.append(("statement", statement))
+        elif isinstance(statement, muriel.IfBlockAst):
+            expressions.append(("expression", statement.expression))
+            collect_expressions(statement.body, expressions)
+        else:
+            collect_expressions(statement.body, expressions)
+
+
+def main():
+    print(f"{'functions':>10} {'expressions':>12} {'tokens':>10} {'time (ms)':>10} {'expr/s':>10} {'folded':>8}")
+    for function_count in FUNCTION_COUNTS:
+        source = generate_expression_source(function_count)
+        tokens = muriel.TokenTable.from_source(source, "bench")
+        ast = muriel.MurielAst("bench")
+        ast.parse(muriel.module_token_span(tokens, "bench"))
+        expressions = []
+        for function in ast.namespaces["global"].functions.values():
+            collect_expressions(function.body, expressions)
+        token_count = sum(len(expression.tokens) for _, expression in expressions)
+
+        best = None
+        for _ in range(REPEATS):
+            parsed = []
+            start = time.perf_counter()
+            for kind, expression in expressions:
+                fresh = muriel.ExpressionAst(expression.parent_ast)
+                if kind == "statement":
+                    fresh.parse_statement(expression.tokens)
+                else:
+                    fresh.parse(expression.tokens)
+                parsed.append(fresh)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        folded = sum(1 for expression in parsed if expression.expression[0] <= muriel.EXPR_STRING)
+        print(f"{function_count:>10} {len(expressions):>12} {token_count:>10} {best * 1000:>10.1f} {len(expressions) / best:>10.0f} {folded / len(expressions):>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
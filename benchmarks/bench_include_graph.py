@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# a diamond-shaped include graph: every module of a layer includes two modules
+# of the next layer, so most modules are reached through many include chains
+# but each one should only be read and parsed once per session
+
+LAYERS = 20
+WIDTH = 20
+FUNCTIONS_PER_MODULE = 10
+
+
+def module_source(includes):
+    lines = []
+    for layer, index in includes:
+        lines.append(f"include (layer{layer}.m{index}) as l{layer}m{index}")
+    lines.append("global {")
+    for function_index in range(FUNCTIONS_PER_MODULE):
+        lines.append(f"    f{function_index}(a, b) {{")
+        lines.append(f"        if a > b {{")
+        lines.append(f"            return a - b")
+        lines.append(f"        }}")
+        lines.append(f"        return b - a")
+        lines.append(f"    }}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def write_graph(directory):
+    edges = 0
+    for layer in range(LAYERS):
+        os.makedirs(os.path.join(directory, f"layer{layer}"))
+        for index in range(WIDTH):
+            includes = []
+            if layer + 1 < LAYERS:
+                includes = [(layer + 1, index), (layer + 1, (index + 1) % WIDTH)]
+            edges += len(includes)
+            with open(os.path.join(directory, f"layer{layer}", f"m{index}.mur"), 'w') as f:
+                f.write(module_source(includes))
+    with open(os.path.join(directory, "main.mur"), 'w') as f:
+        f.write(module_source([(0, index) for index in range(WIDTH)]))
+    return edges + WIDTH
+
+
+def main():
+    lexed_files = []
+    map_file = muriel.TokenTable.map_file
+
+    def counting_map_file(file):
+        lexed_files.append(file)
+        return map_file(file)
+
+    muriel.TokenTable.map_file = staticmethod(counting_map_file)
+    with tempfile.TemporaryDirectory() as directory:
+        edges = write_graph(directory)
+        os.chdir(directory)
+        start = time.perf_counter()
+        session = muriel.CompilationSession()
+        ast = session.load_module("main.mur")
+        elapsed = time.perf_counter() - start
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    print(f"modules:        {LAYERS * WIDTH + 1}")
+    print(f"include edges:  {edges}")
+    print(f"files lexed:    {len(lexed_files)}")
+    print(f"linked modules: {len(ast.modules)}")
+    print(f"time:           {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# a generated call heavy program, small functions spread over the namespaces
+# of an included module pass pairs of numbers down chains of calls and are
+# called through the module alias from a loop of the main module, compiled
+# with the local cc at several inline thresholds, the first inlines nothing
+
+NAMESPACES = 8
+FUNCTIONS_PER_NAMESPACE = 6
+ITERATIONS = 200000
+THRESHOLDS = [0, 10, muriel.INLINE_THRESHOLD, 100]
+SEED = 1
+REPEATS = 3
+CC = os.environ.get("CC", "cc")
+
+
+def random_function(rng, namespace, index):
+    # a few field reads and arithmetic around a call of an earlier function,
+    # of this namespace or of the one before it, making a new pair
+    if index > 0:
+        callee = f"ops{namespace}.f{rng.randrange(index)}"
+    elif namespace > 0:
+        callee = f"ops{namespace - 1}.f{rng.randrange(FUNCTIONS_PER_NAMESPACE)}"
+    else:
+        callee = None
+    first, second = rng.sample(["p.a", "p.b", "q.a", "q.b"] if callee else ["p.a", "p.b"], 2)
+    lines = [f"    f{index}(p) {{"]
+    if callee:
+        lines.append(f"        var q = {callee}(p)")
+    lines.append(f"        return pair(({first} * {rng.randint(2, 9)} + {second}) % 1009, ({second} + {rng.randint(1, 9)}) % 1009)")
+    lines.append("    }")
+    return lines
+
+
+def generate_library_source(seed = SEED):
+    rng = random.Random(seed)
+    lines = ["global {", "    pair(a, b) {", "        return {{ a: a, b: b }}", "    }", "}", ""]
+    for namespace in range(NAMESPACES):
+        lines.append(f"ops{namespace} {{")
+        for index in range(FUNCTIONS_PER_NAMESPACE):
+            lines.extend(random_function(rng, namespace, index))
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_main_source(seed = SEED):
+    rng = random.Random(seed + 1)
+    lines = ["include (calls) as lib", "", "global {", "    main() {", "        total = 0", "        i = 0"]
+    lines.append(f"        while i < {ITERATIONS} {{")
+    for _ in range(4):
+        namespace = rng.randrange(NAMESPACES)
+        index = rng.randrange(FUNCTIONS_PER_NAMESPACE)
+        lines.append(f"            total = (total + lib.ops{namespace}.f{index}(lib.pair(i % 97, total % 89)).a) % 1000003")
+    lines.append("            i = i + 1")
+    lines.append("        }")
+    lines.append("        print(total)")
+    lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def build(directory, threshold):
+    file = os.path.join(directory, "main.mur")
+    ast = muriel.CompilationSession(include_paths = [directory]).load_program(file)
+    output = os.path.join(directory, f"main_{threshold}.c")
+    start = time.perf_counter()
+    generator = muriel.write_output(ast, output, inline_threshold = threshold)
+    generate = time.perf_counter() - start
+    executable = os.path.join(directory, f"main_{threshold}")
+    subprocess.run([CC, "-O2", "-o", executable, output], check = True)
+    return executable, generator.inlines, generate, os.path.getsize(output)
+
+
+def best_time(executable):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = subprocess.run([executable], check = True, capture_output = True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result.stdout.strip()
+
+
+def main():
+    if shutil.which(CC) is None:
+        print(f"{CC} not found, set CC to a C compiler")
+        return
+    print(f"{'threshold':>10} {'inlined':>8} {'codegen (ms)':>13} {'C bytes':>9} {'time (ms)':>10} {'ns/iter':>8} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "calls.mur"), 'w') as f:
+            f.write(generate_library_source())
+        with open(os.path.join(directory, "main.mur"), 'w') as f:
+            f.write(generate_main_source())
+        base = None
+        for threshold in THRESHOLDS:
+            executable, inlines, generate, size = build(directory, threshold)
+            elapsed, result = best_time(executable)
+            if base is None:
+                base, base_result = elapsed, result
+            elif result != base_result:
+                print(f"threshold {threshold}: results differ, {base_result} and {result}")
+            print(f"{threshold:>10} {inlines:>8} {generate * 1000:>13.1f} {size:>9} {elapsed * 1000:>10.1f} {elapsed * 1e9 / ITERATIONS:>8.1f} {base / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
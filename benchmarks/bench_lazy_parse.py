@@ -0,0 +1,87 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# an include heavy program that calls a few functions of large libraries,
+# loaded and generated with every function body parsed up front and with
+# bodies parsed only once code generation or the reachability walk from
+# global.main reads them
+
+LIBRARY_COUNTS = [4, 16]
+FUNCTIONS_PER_LIBRARY = 300
+USED_FUNCTIONS = 10
+SEED = 1
+REPEATS = 3
+
+
+def generate_library_source(rng, name):
+    lines = ["global {"]
+    for index in range(FUNCTIONS_PER_LIBRARY):
+        lines.append(f"    {name}_f{index}(a, b) {{")
+        lines.append(f"        var t = a * {rng.randint(2, 9)} + b")
+        lines.append(f"        if t > {rng.randint(100, 1000)} {{")
+        lines.append(f"            t = t % {rng.randint(50, 99)}")
+        lines.append("        } else {")
+        lines.append(f"            t = t + [a, b, {rng.randint(0, 9)}][{rng.randint(0, 2)}]")
+        lines.append("        }")
+        lines.append("        return t")
+        lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_program(directory, library_count, seed = SEED):
+    rng = random.Random(seed)
+    lines = []
+    for library in range(library_count):
+        name = f"lib{library}"
+        with open(os.path.join(directory, f"{name}.mur"), 'w') as f:
+            f.write(generate_library_source(rng, name))
+        lines.append(f"include ({name})")
+    lines.extend(["", "global {", "    main() {", "        total = 0"])
+    for _ in range(USED_FUNCTIONS):
+        library = rng.randrange(library_count)
+        lines.append(f"        total = total + lib{library}.lib{library}_f{rng.randrange(FUNCTIONS_PER_LIBRARY)}(total, 3)")
+    lines.extend(["        print(total)", "    }", "}"])
+    with open(os.path.join(directory, "main.mur"), 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def compile_program(directory, lazy_bodies):
+    start = time.perf_counter()
+    session = muriel.CompilationSession(include_paths = [directory], lazy_bodies = lazy_bodies)
+    ast = session.load_program(os.path.join(directory, "main.mur"))
+    loaded = time.perf_counter()
+    muriel.write_output(ast, os.path.join(directory, "main.c"))
+    end = time.perf_counter()
+    functions = [function for module in session.module_graph.values() for namespace in module.namespaces.values() for function in namespace.functions.values()]
+    parsed = sum(1 for function in functions if function.parsed_body is not None)
+    return loaded - start, end - start, parsed, len(functions)
+
+
+def main():
+    print(f"{'libraries':>10} {'mode':>6} {'parsed':>12} {'load (ms)':>10} {'total (ms)':>11} {'speedup':>8}")
+    for library_count in LIBRARY_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            generate_program(directory, library_count)
+            base = None
+            for lazy_bodies in [False, True]:
+                best = None
+                for _ in range(REPEATS):
+                    result = compile_program(directory, lazy_bodies)
+                    if best is None or result[1] < best[1]:
+                        best = result
+                load, total, parsed, functions = best
+                if base is None:
+                    base = total
+                print(f"{library_count:>10} {'lazy' if lazy_bodies else 'eager':>6} {f'{parsed}/{functions}':>12} {load * 1000:>10.1f} {total * 1000:>11.1f} {base / total:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
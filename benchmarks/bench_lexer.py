@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import time
+import tokenize
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+from bench_token_storage import generate_flat_source
+
+# tokens per second of the Muriel lexer against the previous path through
+# Python's tokenize module, both reading the module from disk
+
+FUNCTION_COUNTS = [1000, 10000]
+REPEATS = 5
+
+
+def lex_with_tokenize(file):
+    with open(file, 'rb') as f:
+        return list(tokenize.tokenize(f.readline))
+
+
+def lex_with_muriel(file):
+    return muriel.TokenTable.from_file(file, "bench")
+
+
+def best_time(lex, file):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        tokens = lex(file)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(tokens), best
+
+
+def main():
+    print(f"{'functions':>10} {'lexer':>10} {'tokens':>10} {'time (ms)':>10} {'tokens/s':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for function_count in FUNCTION_COUNTS:
+            file = os.path.join(directory, f"flat{function_count}.mur")
+            with open(file, 'w') as f:
+                f.write(generate_flat_source(function_count))
+            results = []
+            for name, lex in (("tokenize", lex_with_tokenize), ("muriel", lex_with_muriel)):
+                token_count, elapsed = best_time(lex, file)
+                results.append(elapsed)
+                print(f"{function_count:>10} {name:>10} {token_count:>10} {elapsed * 1000:>10.2f} {token_count / elapsed:>12.0f}")
+            print(f"{'':>10} {'speedup':>10} {results[0] / results[1]:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
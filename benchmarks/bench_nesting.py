@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# parse time per token should stay flat as the nesting depth grows
+
+DEPTHS = [50, 100, 200, 400, 800]
+STATEMENTS_PER_LEVEL = 4
+REPEATS = 3
+
+
+def generate_nested_source(depth, statements_per_level):
+    lines = ["global {", "    main(args) {"]
+    indent = "        "
+    for level in range(depth):
+        for statement in range(statements_per_level):
+            lines.append(f"{indent}x{statement} = x{statement} + {level}")
+        lines.append(f"{indent}if x0 > {level} {{")
+        indent += "    "
+    for level in range(depth):
+        indent = indent[:-4]
+        lines.append(f"{indent}}}")
+    lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def bench_depth(depth):
+    source = generate_nested_source(depth, STATEMENTS_PER_LEVEL)
+    tokens = muriel.TokenTable.from_source(source, "bench")
+    best = None
+    for _ in range(REPEATS):
+        ast = muriel.MurielAst("bench")
+        start = time.perf_counter()
+        ast.parse(muriel.module_token_span(tokens, "bench"))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    muriel.MurielAst("bench").parse(muriel.module_token_span(tokens, "bench"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(tokens), best, peak
+
+
+def main():
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), max(DEPTHS) * 10))
+    print(f"{'depth':>8} {'tokens':>10} {'parse (ms)':>12} {'us/token':>10} {'peak (KiB)':>12}")
+    for depth in DEPTHS:
+        token_count, elapsed, peak = bench_depth(depth)
+        print(f"{depth:>8} {token_count:>10} {elapsed * 1000:>12.2f} {elapsed * 1e6 / token_count:>10.3f} {peak / 1024:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
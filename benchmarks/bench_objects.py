@@ -0,0 +1,124 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# the Vector3 example of examples/class.mur looped in a compiled program, with
+# objects dispatched by name lookups only, through their literal shapes and
+# inline caches, and with escape analysis keeping the vectors off the heap,
+# "vector" adds and normalizes a fresh vector every iteration and "dispatch"
+# only reads fields and calls a method
+
+REPEATS = 3
+# (object_dispatch, object_allocation) of every build, the first is the base
+BUILDS = [
+    (muriel.OBJECT_DYNAMIC, muriel.OBJECT_HEAP),
+    (muriel.OBJECT_SHAPES, muriel.OBJECT_HEAP),
+    (muriel.OBJECT_SHAPES, muriel.OBJECT_ALLOCATION),
+]
+CC = os.environ.get("CC", "cc")
+
+VECTOR_SOURCE = """
+extern {
+    sqrt(double) -> double
+}
+
+vector {
+
+    add(a, b) {
+        return Vector3(a.x + b.x, a.y + b.y, a.z + b.z)
+    }
+
+    normalize(a) {
+        var len = sqrt(a.x * a.x + a.y * a.y + a.z * a.z)
+        return Vector3(a.x / len, a.y / len, a.z / len)
+    }
+
+    dot(a, b) {
+        return a.x * b.x + a.y * b.y + a.z * b.z
+    }
+
+}
+
+global {
+
+    Vector3(x, y, z) {
+        return {{
+            x: x,
+            y: y,
+            z: z,
+            @normalize :vector.normalize,
+            @dot :vector.dot,
+            __add__ :vector.add
+        }}
+    }
+
+    main(args) {
+        var a = Vector3(1, 2, 3)
+        var b = Vector3(4, 5, 6)
+        var total = 0.0
+        var i = 0
+        while i < ITERATIONS {
+            BODY
+            i = i + 1
+        }
+        print(total)
+    }
+
+}
+"""
+
+BODIES = {
+    "vector": (1000000, "var c = (a + b).normalize()\n            total = total + c.x + c.y + c.z"),
+    "dispatch": (5000000, "total = total + a.dot(b) + a.x - b.z"),
+}
+
+
+def build(directory, name, object_dispatch, object_allocation):
+    iterations, body = BODIES[name]
+    file = os.path.join(directory, f"{name}.mur")
+    with open(file, 'w') as f:
+        f.write(VECTOR_SOURCE.replace("ITERATIONS", str(iterations)).replace("BODY", body))
+    ast = muriel.CompilationSession().load_program(file)
+    output = os.path.join(directory, f"{name}_{object_dispatch}_{object_allocation}.c")
+    muriel.write_output(ast, output, object_dispatch = object_dispatch, object_allocation = object_allocation)
+    executable = os.path.join(directory, f"{name}_{object_dispatch}_{object_allocation}")
+    subprocess.run([CC, "-O2", "-o", executable, output, "-lm"], check = True)
+    return executable
+
+
+def best_time(executable):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = subprocess.run([executable], check = True, capture_output = True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result.stdout.strip()
+
+
+def main():
+    if shutil.which(CC) is None:
+        print(f"{CC} not found, set CC to a C compiler")
+        return
+    print(f"{'loop':>9} {'iterations':>11} {'dispatch':>9} {'allocation':>11} {'time (ms)':>10} {'ns/iter':>8} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (iterations, _) in BODIES.items():
+            base = None
+            for object_dispatch, object_allocation in BUILDS:
+                elapsed, result = best_time(build(directory, name, object_dispatch, object_allocation))
+                if base is None:
+                    base, base_result = elapsed, result
+                elif result != base_result:
+                    print(f"{name}: results differ, {base_result} and {result}")
+                print(f"{name:>9} {iterations:>11} {object_dispatch:>9} {object_allocation:>11} {elapsed * 1000:>10.1f} {elapsed * 1e9 / iterations:>8.1f} {base / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
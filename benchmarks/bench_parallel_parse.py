@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+import bench_include_graph
+
+# serial loading against the process pool loader on the diamond include graph,
+# the two module trees must be identical
+
+JOBS = [1, 2, 4]
+bench_include_graph.FUNCTIONS_PER_MODULE = 60
+
+
+def tree_signature(ast):
+    signature = [tuple(ast.alias_map.items())]
+    for module_name, module in [(ast.module_name, ast)] + list(ast.modules.items()):
+        namespaces = tuple((name, tuple(namespace.functions)) for name, namespace in module.namespaces.items())
+        signature.append((module_name, module.module_name, tuple(module.alias_map.items()), tuple(module.modules), namespaces))
+    return signature
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        bench_include_graph.write_graph(directory)
+        previous_directory = os.getcwd()
+        os.chdir(directory)
+        reference = None
+        print(f"{'jobs':>6} {'time (ms)':>10} {'identical':>10}")
+        for jobs in JOBS:
+            start = time.perf_counter()
+            ast = muriel.CompilationSession(parse_jobs = jobs).load_program("main.mur")
+            elapsed = time.perf_counter() - start
+            signature = tree_signature(ast)
+            if reference is None:
+                reference = signature
+            print(f"{jobs:>6} {elapsed * 1000:>10.1f} {str(signature == reference):>10}")
+        os.chdir(previous_directory)
+
+
+if __name__ == '__main__':
+    main()
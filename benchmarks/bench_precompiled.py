@@ -0,0 +1,69 @@
+import gc
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+from program_generator import generate_program
+
+# a generated program of many modules loaded from the sources, from the parse
+# cache and from precompiled .murc modules, function bodies are parsed lazily
+# in every mode, as the compiler only parses the bodies it generates code for
+
+MODULES = 32
+SEED = 1
+REPEATS = 5
+
+
+def load_time(directory, main_file, parse_cache = None):
+    best = None
+    for _ in range(REPEATS):
+        gc.collect()
+        start = time.perf_counter()
+        muriel.CompilationSession(parse_cache, include_paths = [directory], lazy_bodies = True).load_program(main_file)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def output(directory, main_file, name):
+    path = os.path.join(directory, name)
+    muriel.write_output(muriel.CompilationSession(include_paths = [directory]).load_program(main_file), path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        main_file = generate_program(directory, SEED, modules = MODULES)
+        modules = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".mur"))
+        size = sum(os.path.getsize(file) for file in modules)
+        source_output = output(directory, main_file, "source.c")
+
+        source = load_time(directory, main_file)
+        parse_cache = muriel.ParseCache(os.path.join(directory, "cache"))
+        load_time(directory, main_file, parse_cache)
+        cached = load_time(directory, main_file, parse_cache)
+        cache_size = sum(entry.stat().st_size for entry in os.scandir(parse_cache.directory))
+        session = muriel.CompilationSession(include_paths = [directory])
+        for file in modules:
+            ast = session.load_module(file)
+            ast.parse_bodies()
+            muriel.write_precompiled(ast, os.path.splitext(file)[0] + muriel.PRECOMPILED_SUFFIX, muriel.precompiled_include_hashes(ast))
+        # main is loaded from its .murc too, the includes find theirs
+        precompiled = load_time(directory, os.path.splitext(main_file)[0] + muriel.PRECOMPILED_SUFFIX)
+        murc_size = sum(os.path.getsize(os.path.splitext(file)[0] + muriel.PRECOMPILED_SUFFIX) for file in modules)
+
+        print(f"{len(modules)} modules, {size / 1024:.0f} KiB of source, {cache_size / 1024:.0f} KiB in the parse cache, {murc_size / 1024:.0f} KiB of .murc")
+        print(f"{'load':>12} {'time (ms)':>10} {'speedup':>8}")
+        for name, elapsed in [("source", source), ("parse cache", cached), (".murc", precompiled)]:
+            print(f"{name:>12} {elapsed * 1000:>10.2f} {source / elapsed:>7.1f}x")
+        if output(directory, main_file, "precompiled.c") != source_output:
+            print("the C of the precompiled program differs")
+
+
+if __name__ == '__main__':
+    main()
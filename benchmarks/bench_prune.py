@@ -0,0 +1,99 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# a program that uses a few functions of a large included library and leaves
+# a second library unused, generated to C with every function kept and with
+# the functions, externs and modules global.main cannot reach pruned, then
+# compiled with the local cc
+
+LIBRARY_NAMESPACES = 40
+FUNCTIONS_PER_NAMESPACE = 25
+USED_FUNCTIONS = 20
+SEED = 1
+REPEATS = 3
+CC = os.environ.get("CC", "cc")
+
+
+def generate_library_source(rng):
+    lines = ["extern {", "    abs(int) -> int", "    labs(long) -> long", "}", "", "global {", "}", ""]
+    for namespace in range(LIBRARY_NAMESPACES):
+        lines.append(f"util{namespace} {{")
+        for index in range(FUNCTIONS_PER_NAMESPACE):
+            lines.append(f"    f{index}(a, b) {{")
+            lines.append(f"        var t = a * {rng.randint(2, 9)} + b")
+            if index > 0 and rng.random() < 0.5:
+                lines.append(f"        t = t + util{namespace}.f{rng.randrange(index)}(b, a)")
+            lines.append(f"        if t > {rng.randint(100, 1000)} {{")
+            lines.append(f"            t = t % {rng.randint(50, 99)}")
+            lines.append("        }")
+            lines.append("        return abs(t)")
+            lines.append("    }")
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_main_source(rng):
+    lines = ["include (library) as library", "include (unused) as unused", "", "global {", "    main() {", "        total = 0"]
+    for _ in range(USED_FUNCTIONS):
+        namespace = rng.randrange(LIBRARY_NAMESPACES)
+        index = rng.randrange(FUNCTIONS_PER_NAMESPACE)
+        lines.append(f"        total = total + library.util{namespace}.f{index}(total % 7, 3)")
+    lines.append("        print(total)")
+    lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def build(directory, prune):
+    ast = muriel.CompilationSession(include_paths = [directory]).load_program(os.path.join(directory, "main.mur"))
+    output = os.path.join(directory, f"main_{prune}.c")
+    start = time.perf_counter()
+    generator = muriel.write_output(ast, output, prune = prune, inline_threshold = 0)
+    generate = time.perf_counter() - start
+    executable = os.path.join(directory, f"main_{prune}")
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        subprocess.run([CC, "-O2", "-o", executable, output], check = True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    result = subprocess.run([executable], check = True, capture_output = True).stdout.strip()
+    return generator, generate, os.path.getsize(output), best, result
+
+
+def main():
+    if shutil.which(CC) is None:
+        print(f"{CC} not found, set CC to a C compiler")
+        return
+    rng = random.Random(SEED)
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ["library", "unused"]:
+            with open(os.path.join(directory, f"{name}.mur"), 'w') as f:
+                f.write(generate_library_source(rng))
+        with open(os.path.join(directory, "main.mur"), 'w') as f:
+            f.write(generate_main_source(rng))
+        print(f"{'build':>7} {'functions':>10} {'codegen (ms)':>13} {'C bytes':>10} {'cc (ms)':>9} {'speedup':>8}")
+        base = None
+        for prune in [False, True]:
+            generator, generate, size, compile_time, result = build(directory, prune)
+            if base is None:
+                base, base_result = compile_time, result
+            elif result != base_result:
+                print(f"results differ, {base_result} and {result}")
+            print(f"{'pruned' if prune else 'all':>7} {len(generator.functions):>10} {generate * 1000:>13.1f} {size:>10} {compile_time * 1000:>9.1f} {base / compile_time:>7.1f}x")
+        for line in generator.prune_report():
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# a 1000 case switch compiled with the local cc, lowered to an if chain against
+# the automatic lowering: a jump table for dense ints, a binary search for
+# sparse ints and a hash search for strings
+
+CASES = 1000
+ITERATIONS = 1000000
+REPEATS = 3
+CC = os.environ.get("CC", "cc")
+
+CASE_KEYS = {
+    "dense": [str(index) for index in range(CASES)],
+    "sparse": [str(index * 7919 - 500000) for index in range(CASES)],
+    "string": [f"\"case{index}\"" for index in range(CASES)],
+}
+
+
+def switch_source(keys):
+    lines = ["global {", "    classify(x) {", "        switch x {"]
+    for index, key in enumerate(keys):
+        lines.append(f"            {key}: {{")
+        lines.append(f"                return {index}")
+        lines.append(f"            }}")
+    lines.append("        }")
+    lines.append("        return -1")
+    lines.append("    }")
+    lines.append("")
+    lines.append("    main(args) {")
+    lines.append(f"        keys = [{', '.join(keys)}]")
+    lines.append("        total = 0")
+    lines.append("        i = 0")
+    lines.append(f"        while i < {ITERATIONS} {{")
+    lines.append(f"            total = total + classify(keys[(i * 7) % {len(keys)}])")
+    lines.append("            i = i + 1")
+    lines.append("        }")
+    lines.append("        print(total)")
+    lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def build(directory, name, source, switch_lowering):
+    file = os.path.join(directory, f"{name}.mur")
+    with open(file, 'w') as f:
+        f.write(source)
+    ast = muriel.CompilationSession().load_program(file)
+    output = os.path.join(directory, f"{name}_{switch_lowering}.c")
+    muriel.write_output(ast, output, switch_lowering = switch_lowering)
+    executable = os.path.join(directory, f"{name}_{switch_lowering}")
+    subprocess.run([CC, "-O2", "-o", executable, output], check = True)
+    return executable
+
+
+def best_time(executable):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = subprocess.run([executable], check = True, capture_output = True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result.stdout.strip()
+
+
+def main():
+    if shutil.which(CC) is None:
+        print(f"{CC} not found, set CC to a C compiler")
+        return
+    print(f"{'cases':>8} {'lowering':>9} {'time (ms)':>10} {'ns/call':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, keys in CASE_KEYS.items():
+            chain, chain_result = best_time(build(directory, name, switch_source(keys), "chain"))
+            lowered, lowered_result = best_time(build(directory, name, switch_source(keys), "auto"))
+            if chain_result != lowered_result:
+                print(f"{name}: results differ, {chain_result} and {lowered_result}")
+            print(f"{name:>8} {'chain':>9} {chain * 1000:>10.1f} {chain * 1e9 / ITERATIONS:>9.1f}")
+            print(f"{name:>8} {'auto':>9} {lowered * 1000:>10.1f} {lowered * 1e9 / ITERATIONS:>9.1f} {chain / lowered:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
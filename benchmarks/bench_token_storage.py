@@ -0,0 +1,51 @@
+import io
+import os
+import sys
+import tokenize
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+
+# memory held by the token stream of one module: a list of TokenInfo tuples
+# against the columnar TokenTable
+
+FUNCTION_COUNTS = [100, 1000, 5000]
+
+
+def generate_flat_source(function_count):
+    lines = ["global {"]
+    for function_index in range(function_count):
+        lines.append(f"    function{function_index}(a, b, c) {{")
+        lines.append(f"        x = a * {function_index} + b")
+        lines.append(f"        if x > c {{")
+        lines.append(f"            return x - c")
+        lines.append(f"        }}")
+        lines.append(f"        return x")
+        lines.append(f"    }}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def measure(build):
+    tracemalloc.start()
+    tokens = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tokens, current
+
+
+def main():
+    print(f"{'functions':>10} {'tokens':>10} {'TokenInfo (KiB)':>16} {'TokenTable (KiB)':>17} {'ratio':>7}")
+    for function_count in FUNCTION_COUNTS:
+        source = generate_flat_source(function_count)
+        data = source.encode()
+        tokens, list_size = measure(lambda: list(tokenize.tokenize(io.BytesIO(data).readline)))
+        table, table_size = measure(lambda: muriel.TokenTable.from_source(data, "bench"))
+        print(f"{function_count:>10} {len(table):>10} {list_size / 1024:>16.1f} {table_size / 1024:>17.1f} {list_size / table_size:>7.1f}")
+        del tokens, table
+
+
+if __name__ == '__main__':
+    main()
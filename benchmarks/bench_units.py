@@ -0,0 +1,87 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+from program_generator import generate_program
+
+# a generated program of many modules built from one C file and from one C
+# unit per module, cold with an empty object cache, again with nothing changed
+# and after edits to one module: a changed function, where only the unit of
+# that module is compiled again, a new function, which also compiles the units
+# that include the header of that module, and a new object shape, which also
+# compiles the units that use shapes
+
+MODULES = 12
+SEED = 1
+CC = os.environ.get("CC", "cc")
+CFLAGS = "-O2"
+COMPILER = muriel.__file__
+
+
+def build_single(main_file, directory):
+    start = time.perf_counter()
+    output = os.path.join(directory, "single.c")
+    subprocess.run([sys.executable, COMPILER, "-I", directory, main_file, output], check = True, capture_output = True)
+    subprocess.run([CC, CFLAGS, "-o", os.path.join(directory, "single"), output, "-lm"], check = True, capture_output = True)
+    return time.perf_counter() - start
+
+
+def build_units(main_file, directory):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, COMPILER, "-I", directory, main_file, "--build", os.path.join(directory, "units"), f"--cflags={CFLAGS}"], check = True, capture_output = True, text = True)
+    elapsed = time.perf_counter() - start
+    line = [line for line in result.stdout.splitlines() if line.startswith("built ")][-1]
+    return elapsed, line.split(": ", 1)[1]
+
+
+EDITS = [
+    ("one edit", "        t = a + b\n", "        t = a + b + 1\n"),
+    # returns early, so it is called and not inlined
+    ("new function", "ns0 {\n    f0(a, b) {\n        t = a + b + 1\n", "ns0 {\n    added(a) {\n        if a > 1 {\n            return a\n        }\n        return a + 1\n    }\n    f0(a, b) {\n        t = added(a) + b + 1\n"),
+    ("new shape", "        t = added(a) + b + 1\n", "        o = {{x: a, y: b}}\n        t = added(o.x) + o.y + 1\n"),
+]
+
+
+def edit_module(directory, old, new):
+    path = os.path.join(directory, "m3.mur")
+    with open(path) as f:
+        source = f.read()
+    with open(path, 'w') as f:
+        f.write(source.replace(old, new, 1))
+
+
+def run(directory, executable):
+    return subprocess.run([os.path.join(directory, executable)], check = True, capture_output = True).stdout
+
+
+def main():
+    if shutil.which(CC) is None:
+        print(f"no C compiler '{CC}', set CC")
+        return
+    print(f"{'build':>26} {'time (s)':>9}  units")
+    with tempfile.TemporaryDirectory() as directory:
+        main_file = generate_program(directory, SEED, modules = MODULES)
+        single = build_single(main_file, directory)
+        print(f"{'single file':>26} {single:>9.2f}")
+        for name in ["units cold", "units unchanged"]:
+            elapsed, units = build_units(main_file, directory)
+            print(f"{name:>26} {elapsed:>9.2f}  {units}")
+        if run(directory, "single") != run(directory, "units"):
+            print("the outputs differ")
+        for name, old, new in EDITS:
+            edit_module(directory, old, new)
+            print(f"{'single file, ' + name:>26} {build_single(main_file, directory):>9.2f}")
+            elapsed, units = build_units(main_file, directory)
+            print(f"{'units, ' + name:>26} {elapsed:>9.2f}  {units}")
+            if run(directory, "single") != run(directory, "units"):
+                print(f"the outputs differ after the {name}")
+
+
+if __name__ == '__main__':
+    main()
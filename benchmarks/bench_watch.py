@@ -0,0 +1,141 @@
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+from program_generator import generate_program
+
+# the watch server compiling a generated program of many modules after lines
+# are added above the namespaces of one of them, which keep their trees and
+# are moved onto the new tokens, against a compile from scratch, then a check
+# that the errors the server sends back after such an edit carry the lines a
+# compile from scratch reports
+
+MODULES = 16
+SEED = 1
+REPEATS = 5
+# profiled, the C then holds the lines of every function and loop
+CODEGEN_OPTIONS = {"profile": True}
+
+CHECK_SOURCE = """other {
+    f(a) {
+        return a
+    }
+}
+
+global {
+    main(args) {
+        x = missing(1)
+    }
+}
+"""
+CHECK_EDIT = ("other {\n", "other {\n    g(a) {\n        return a\n    }\n")
+
+
+def request(path, message):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(json.dumps(message).encode() + b"\n")
+        return json.loads(client.makefile('rb').readline())
+
+
+def start_server(directory):
+    path = os.path.join(directory, "muriel.sock")
+    server = muriel.CompilerServer(path, muriel.CompilationSession(include_paths = [directory], persistent = True), codegen_options = CODEGEN_OPTIONS)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server, path
+
+
+def fresh_compile(main_file, directory):
+    # the reply of a server that never saw the program before
+    path = os.path.join(directory, "fresh.sock")
+    server = muriel.CompilerServer(path, muriel.CompilationSession(include_paths = [directory], persistent = True), codegen_options = CODEGEN_OPTIONS)
+    try:
+        return server.compile(main_file, os.path.join(directory, "fresh.c"))
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def prepend(path, text):
+    with open(path) as f:
+        source = f.read()
+    with open(path, 'w') as f:
+        f.write(text + source)
+
+
+def edit(path, old, new):
+    with open(path) as f:
+        source = f.read()
+    with open(path, 'w') as f:
+        f.write(source.replace(old, new, 1))
+
+
+def time_rebuilds(directory):
+    main_file = generate_program(directory, SEED, modules = MODULES)
+    edited = os.path.join(directory, "m3.mur")
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        response = fresh_compile(main_file, directory)
+    fresh = (time.perf_counter() - start) / REPEATS
+
+    server, path = start_server(directory)
+    try:
+        request(path, {"command": "compile", "file": main_file})
+        elapsed = 0.0
+        for _ in range(REPEATS):
+            prepend(edited, "# edited\n" * 3)
+            start = time.perf_counter()
+            response = request(path, {"command": "compile", "file": main_file})
+            elapsed += time.perf_counter() - start
+        with open(main_file + ".out.c") as f:
+            output = f.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+    fresh_response = fresh_compile(main_file, directory)
+    with open(os.path.join(directory, "fresh.c")) as f:
+        same = f.read() == output
+    return fresh, elapsed / REPEATS, response, same and fresh_response["ok"]
+
+
+def check_lines(directory):
+    main_file = os.path.join(directory, "check.mur")
+    with open(main_file, 'w') as f:
+        f.write(CHECK_SOURCE)
+    server, path = start_server(directory)
+    try:
+        request(path, {"command": "compile", "file": main_file})
+        edit(main_file, *CHECK_EDIT)
+        response = request(path, {"command": "compile", "file": main_file})
+    finally:
+        server.shutdown()
+        server.server_close()
+    return response["error"], fresh_compile(main_file, directory)["error"]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        fresh, rebuild, response, same = time_rebuilds(directory)
+        print(f"{MODULES + 1} modules, lines added above the namespaces of one")
+        print(f"{'compile':>22} {'time (ms)':>10}")
+        print(f"{'from scratch':>22} {fresh * 1000:>10.1f}")
+        print(f"{'watch server':>22} {rebuild * 1000:>10.1f}  {response['relexed']} modules lexed, {response['reparsed']} namespaces parsed, {response['reused']} reused")
+        if not same:
+            print("the C of the watch server differs")
+    with tempfile.TemporaryDirectory() as directory:
+        watched, fresh = check_lines(directory)
+        if watched == fresh:
+            print(f"errors after an edit above an unchanged namespace match a compile from scratch: {fresh.splitlines()[-1]}")
+        else:
+            print(f"the watch server reports\n{watched}a compile from scratch reports\n{fresh}", end = "")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import os
+import random
+
+# seeded generator of .mur programs for the benchmark suite, the same seed and
+# parameters always write the same files, a program is a main module and a
+# graph of included modules, each with namespaces of functions whose bodies
+# nest if/elif/else, while, loop and switch blocks down to a set depth
+
+DEFAULTS = {
+    "modules": 4,
+    "include_shape": "tree",
+    "namespaces": 4,
+    "functions_per_namespace": 8,
+    "statements_per_scope": 4,
+    "nesting_depth": 3,
+    "switch_cases": 6,
+}
+INCLUDE_SHAPES = ["star", "chain", "tree", "diamond"]
+BLOCK_KINDS = ["if", "while", "loop", "switch"]
+SEED = 1
+
+
+def include_graph(shape, modules):
+    # the indices of the modules main and every module include
+    if modules == 0:
+        return [], []
+    if shape == "star":
+        return list(range(modules)), [[] for _ in range(modules)]
+    if shape == "chain":
+        return [0], [[index + 1] if index + 1 < modules else [] for index in range(modules)]
+    if shape == "tree":
+        return [0], [[child for child in (2 * index + 1, 2 * index + 2) if child < modules] for index in range(modules)]
+    if shape == "diamond":
+        # layers of the same width, every module includes two of the next layer
+        width = max(1, round(modules ** 0.5))
+        includes = []
+        for index in range(modules):
+            layer_start = index - index % width
+            next_start = layer_start + width
+            children = {next_start + index % width, next_start + (index + 1) % width}
+            includes.append(sorted(child for child in children if child < modules))
+        return list(range(min(width, modules))), includes
+    raise ValueError(f"unknown include shape {shape!r}, expected one of {', '.join(INCLUDE_SHAPES)}")
+
+
+def random_expression(rng, names):
+    first, second = rng.choice(names), rng.choice(names)
+    operator = rng.choice(["+", "-", "*", "%"])
+    if operator == "%":
+        return f"{first} % {rng.randint(2, 97)}"
+    return f"({first} {operator} {second}) {rng.choice(['+', '-'])} {rng.randint(0, 99)}"
+
+
+def simple_statements(rng, count, indent, callees):
+    lines = []
+    for _ in range(count):
+        choice = rng.random()
+        if callees and choice < 0.2:
+            lines.append(f"{indent}t = t + {rng.choice(callees)}(a, t % 13)")
+        elif choice < 0.4:
+            lines.append(f"{indent}var v{rng.randrange(4)} = {random_expression(rng, ['a', 'b', 't'])}")
+        elif choice < 0.5:
+            lines.append(f"{indent}l = [a, b, t, {rng.randint(0, 9)}]")
+        else:
+            lines.append(f"{indent}t = {random_expression(rng, ['a', 'b', 't'])}")
+    return lines
+
+
+def scope_lines(rng, config, depth, indent, callees):
+    # the simple statements of one scope around one block, only one scope of
+    # that block nests further, so the size of a function grows linearly with
+    # the nesting depth
+    count = config["statements_per_scope"]
+    before = rng.randint(0, count)
+    lines = simple_statements(rng, before, indent, callees)
+    if depth > 0:
+        lines.extend(block_lines(rng, config, depth, indent, callees))
+    lines.extend(simple_statements(rng, count - before, indent, callees))
+    return lines
+
+
+def block_lines(rng, config, depth, indent, callees):
+    inner = indent + "    "
+    kind = rng.choice(BLOCK_KINDS)
+    if kind == "if":
+        branches = rng.randint(0, 2)
+        nested = rng.randint(0, branches)
+        lines = [f"{indent}if t > {rng.randint(0, 999)} {{"]
+        for branch in range(branches + 1):
+            if branch > 0:
+                lines.append(f"{indent}}} elif t < {rng.randint(0, 999)} {{")
+            lines.extend(scope_lines(rng, config, depth - 1 if branch == nested else 0, inner, callees))
+        if rng.random() < 0.5:
+            lines.append(f"{indent}}} else {{")
+            lines.extend(simple_statements(rng, config["statements_per_scope"], inner, callees))
+        lines.append(f"{indent}}}")
+        return lines
+    # loops count with a variable of their depth, so every program ends
+    counter = f"i{depth}"
+    if kind == "while":
+        lines = [f"{indent}{counter} = 0", f"{indent}while {counter} < {rng.randint(1, 3)} {{"]
+        lines.extend(scope_lines(rng, config, depth - 1, inner, callees))
+        lines.append(f"{inner}{counter} = {counter} + 1")
+        lines.append(f"{indent}}}")
+        return lines
+    if kind == "loop":
+        lines = [f"{indent}{counter} = 0", f"{indent}loop {{"]
+        lines.extend(scope_lines(rng, config, depth - 1, inner, callees))
+        lines.append(f"{inner}{counter} = {counter} + 1")
+        lines.append(f"{inner}if {counter} > {rng.randint(0, 2)} {{")
+        lines.append(f"{inner}    break")
+        lines.append(f"{inner}}}")
+        lines.append(f"{indent}}}")
+        return lines
+    cases = config["switch_cases"]
+    nested = rng.randrange(cases + 1)
+    values = rng.sample(range(cases * 4), cases)
+    lines = [f"{indent}switch t {{"]
+    for case in range(cases + 1):
+        lines.append(f"{inner}{values[case] if case < cases else 'default'}: {{")
+        lines.extend(scope_lines(rng, config, depth - 1 if case == nested else 0, inner + "    ", callees))
+        lines.append(f"{inner}}}")
+    lines.append(f"{indent}}}")
+    return lines
+
+
+def module_source(rng, config, includes, is_main = False):
+    lines = [f"include (m{index}) as m{index}" for index in includes]
+    lines.append("")
+    for namespace in range(config["namespaces"]):
+        lines.append(f"ns{namespace} {{")
+        callees = []
+        for function in range(config["functions_per_namespace"]):
+            lines.append(f"    f{function}(a, b) {{")
+            lines.append("        t = a + b")
+            lines.extend(scope_lines(rng, config, config["nesting_depth"], "        ", callees[-4:]))
+            lines.append("        return t")
+            lines.append("    }")
+            lines.append("")
+            callees.append(f"ns{namespace}.f{function}")
+        lines.append("}")
+        lines.append("")
+    lines.append("global {")
+    if is_main:
+        lines.append("    main() {")
+        lines.append("        print(entry(1))")
+        lines.append("    }")
+        lines.append("")
+    lines.append("    entry(a) {")
+    lines.append("        t = a")
+    if config["namespaces"] and config["functions_per_namespace"]:
+        lines.append(f"        t = t + ns0.f{config['functions_per_namespace'] - 1}(a, 1)")
+    for index in includes:
+        lines.append(f"        t = t + m{index}.entry(a)")
+    lines.append("        return t")
+    lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_program(directory, seed = SEED, **parameters):
+    # writes main.mur and m0.mur, m1.mur and so on, returns the path of main
+    config = dict(DEFAULTS)
+    unknown = set(parameters) - set(config)
+    if unknown:
+        raise ValueError(f"unknown parameters {', '.join(sorted(unknown))}")
+    config.update(parameters)
+    rng = random.Random(seed)
+    main_includes, includes = include_graph(config["include_shape"], config["modules"])
+    for index, module_includes in enumerate(includes):
+        with open(os.path.join(directory, f"m{index}.mur"), 'w') as f:
+            f.write(module_source(rng, config, module_includes))
+    path = os.path.join(directory, "main.mur")
+    with open(path, 'w') as f:
+        f.write(module_source(rng, config, main_includes, is_main = True))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "write a generated .mur program")
+    parser.add_argument("directory")
+    parser.add_argument("--seed", type = int, default = SEED)
+    for name, value in DEFAULTS.items():
+        option = "--" + name.replace("_", "-")
+        if name == "include_shape":
+            parser.add_argument(option, choices = INCLUDE_SHAPES, default = value)
+        else:
+            parser.add_argument(option, type = int, default = value)
+    args = parser.parse_args()
+    os.makedirs(args.directory, exist_ok = True)
+    parameters = {name: getattr(args, name) for name in DEFAULTS}
+    print(generate_program(args.directory, args.seed, **parameters))
+
+
+if __name__ == '__main__':
+    main()
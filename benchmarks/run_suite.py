@@ -0,0 +1,245 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import muriel
+from program_generator import generate_program
+
+# the benchmark suite, generated programs that each scale one dimension of the
+# default program are lexed, parsed module by module and linked through their
+# includes, the median of several runs of every step and the peak memory of a
+# whole load are compared against the stored baseline, times are scaled by a
+# fixed reference workload timed with every program so a machine that is
+# busier than when the baseline was recorded does not fail the run, a step
+# that got slower than the tolerance allows is measured again and is a
+# regression only if it is still slower
+
+SUITE = [
+    ("default", {}),
+    ("namespaces", {"namespaces": 16}),
+    ("functions", {"functions_per_namespace": 32}),
+    ("nesting", {"nesting_depth": 12}),
+    ("switch", {"switch_cases": 32}),
+    ("chain", {"modules": 48, "include_shape": "chain", "namespaces": 1, "functions_per_namespace": 4}),
+    ("star", {"modules": 48, "include_shape": "star", "namespaces": 1, "functions_per_namespace": 4}),
+    ("diamond", {"modules": 64, "include_shape": "diamond", "namespaces": 1, "functions_per_namespace": 4}),
+]
+
+SEED = 1
+REPEATS = 9
+# times a program that looks slower is measured again before it fails
+CONFIRMATIONS = 2
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# the slowdown of a step and the growth of the peak memory over the baseline
+# that count as a regression
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+# steps that take this much longer or less are within the noise of the
+# timer, in milliseconds and as a share of the step in the baseline
+NOISE_MS = 1.0
+NOISE_FRACTION = 0.10
+STEPS = ["lex_ms", "parse_ms", "include_ms"]
+REFERENCE_TEXT = [f"value{index % 97} = value{index % 13} + {index} * call(arg{index % 7})" for index in range(20000)]
+
+
+def module_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".mur"))
+
+
+def median_of(function, setup = None):
+    # setup runs untimed before every run and its result is passed in
+    times = []
+    for _ in range(REPEATS):
+        argument = setup() if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def reference_workload():
+    # pure Python work of the kind the lexer and parser do, independent of the
+    # compiler, its time tracks the speed of the machine
+    counts = {}
+    for line in REFERENCE_TEXT:
+        for word in line.split():
+            counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+def parse_modules(tables):
+    asts = {}
+    session = muriel.CompilationSession()
+    for path, (module_name, tokens) in tables.items():
+        ast = muriel.MurielAst(module_name, session)
+        ast.file = path
+        ast.tokens = tokens
+        ast.parse(muriel.module_token_span(tokens, module_name), process_includes = False)
+        asts[path] = ast
+    return asts
+
+
+def measure(directory, main_file):
+    files = module_files(directory)
+    sources = {}
+    for path in files:
+        with open(path, 'rb') as f:
+            sources[os.path.realpath(path)] = (os.path.splitext(os.path.basename(path))[0], f.read())
+
+    def lex():
+        return {path: (module_name, muriel.TokenTable.from_source(source, module_name)) for path, (module_name, source) in sources.items()}
+
+    tables = lex()
+    # the reference is timed before and after the steps, the machine can
+    # slow down while they run
+    reference_time = median_of(reference_workload)
+    lex_time = median_of(lex)
+    parse_time = median_of(lambda: parse_modules(tables))
+
+    # includes are linked from modules parsed ahead of time, like the parallel
+    # loader does, so only resolving and linking is timed
+    def parsed_session():
+        session = muriel.CompilationSession(include_paths = [directory])
+        session.parsed_modules = parse_modules(tables)
+        return session
+
+    include_time = median_of(lambda session: session.load_module(main_file), parsed_session)
+    reference_time = (reference_time + median_of(reference_workload)) / 2
+
+    gc.collect()
+    tracemalloc.start()
+    muriel.CompilationSession(include_paths = [directory]).load_program(main_file)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "files": len(files),
+        "bytes": sum(len(source) for _, source in sources.values()),
+        "tokens": sum(len(tokens) for _, tokens in tables.values()),
+        "lex_ms": round(lex_time * 1000, 3),
+        "parse_ms": round(parse_time * 1000, 3),
+        "include_ms": round(include_time * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "reference_ms": round(reference_time * 1000, 3),
+    }
+
+
+def run_suite(names = None, baseline = None, time_tolerance = TIME_TOLERANCE, memory_tolerance = MEMORY_TOLERANCE):
+    # a program slower or larger than its baseline is measured again and
+    # keeps the fastest time of every step, scaled to the speed of the first
+    # measurement, and the smallest peak, a pause of the machine or a late
+    # garbage collection does not fail a run
+    results = {}
+    for name, parameters in SUITE:
+        if names and name not in names:
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            main_file = generate_program(directory, SEED, **parameters)
+            result = measure(directory, main_file)
+            program_baseline = baseline["results"].get(name) if baseline else None
+            for _ in range(CONFIRMATIONS):
+                if program_baseline is None or not compare(name, result, program_baseline, time_tolerance, memory_tolerance)[1]:
+                    break
+                again = measure(directory, main_file)
+                for step in STEPS:
+                    result[step] = min(result[step], again[step] * result["reference_ms"] / again["reference_ms"])
+                result["peak_kib"] = min(result["peak_kib"], again["peak_kib"])
+            results[name] = result
+    return results
+
+
+def compare(name, result, baseline, time_tolerance, memory_tolerance):
+    # the ratios to the baseline and the regressions of one program
+    if baseline is None:
+        return {}, ["not in the baseline"]
+    if baseline["tokens"] != result["tokens"]:
+        return {}, [f"the program changed, {baseline['tokens']} tokens in the baseline and {result['tokens']} now, update the baseline"]
+    # the times on a machine as fast as when the baseline was recorded
+    speed = result["reference_ms"] / baseline["reference_ms"] if baseline.get("reference_ms") else 1.0
+    ratios = {}
+    regressions = []
+    for step in STEPS:
+        scaled = result[step] / speed
+        ratios[step] = scaled / baseline[step] if baseline[step] else 1.0
+        if ratios[step] > 1 + time_tolerance and scaled - baseline[step] > max(NOISE_MS, NOISE_FRACTION * baseline[step]):
+            regressions.append(f"{step[:-3]} {ratios[step]:.2f}x slower")
+    ratios["peak_kib"] = result["peak_kib"] / baseline["peak_kib"] if baseline["peak_kib"] else 1.0
+    if ratios["peak_kib"] > 1 + memory_tolerance:
+        regressions.append(f"peak memory {ratios['peak_kib']:.2f}x larger")
+    return ratios, regressions
+
+
+def environment():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(), "machine": platform.machine(), "system": platform.system(), "compiler": muriel.COMPILER_VERSION}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "run the benchmark suite and compare it against the baseline")
+    parser.add_argument("programs", nargs = "*", help = f"run only these programs of the suite: {', '.join(name for name, _ in SUITE)}")
+    parser.add_argument("--baseline", default = BASELINE, help = "baseline JSON file (default: benchmarks/baseline.json)")
+    parser.add_argument("--update-baseline", action = "store_true", help = "write the results to the baseline instead of comparing")
+    parser.add_argument("--json", metavar = "FILE", help = "also write the results to FILE")
+    parser.add_argument("--time-tolerance", type = float, default = TIME_TOLERANCE, help = f"slowdown of a step that counts as a regression (default: {TIME_TOLERANCE})")
+    parser.add_argument("--memory-tolerance", type = float, default = MEMORY_TOLERANCE, help = f"growth of the peak memory that counts as a regression (default: {MEMORY_TOLERANCE})")
+    args = parser.parse_args()
+
+    unknown = set(args.programs) - {name for name, _ in SUITE}
+    if unknown:
+        parser.error(f"unknown programs {', '.join(sorted(unknown))}")
+
+    baseline = None
+    if not args.update_baseline and os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["environment"] != environment():
+            print(f"the baseline was recorded with {baseline['environment']}, the times may not compare")
+
+    results = run_suite(args.programs, baseline, args.time_tolerance, args.memory_tolerance)
+    report = {"environment": environment(), "seed": SEED, "results": results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent = 2)
+            f.write("\n")
+
+    print(f"{'program':>11} {'files':>6} {'tokens':>8} {'lex (ms)':>9} {'parse (ms)':>11} {'includes (ms)':>14} {'peak (KiB)':>11}")
+    failed = False
+    for name, result in results.items():
+        line = f"{name:>11} {result['files']:>6} {result['tokens']:>8} {result['lex_ms']:>9.2f} {result['parse_ms']:>11.2f} {result['include_ms']:>14.2f} {result['peak_kib']:>11.1f}"
+        if baseline is not None:
+            ratios, regressions = compare(name, result, baseline["results"].get(name), args.time_tolerance, args.memory_tolerance)
+            if ratios:
+                line += "  " + " ".join(f"{ratios[step]:.2f}x" for step in STEPS + ["peak_kib"])
+            if regressions:
+                failed = True
+                line += "  REGRESSION: " + ", ".join(regressions)
+        print(line)
+
+    if args.update_baseline:
+        # programs left out of this run keep their baseline
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                previous = json.load(f)
+            if previous["environment"] == report["environment"]:
+                report["results"] = {**previous["results"], **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent = 2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    elif baseline is not None:
+        print("no regressions" if not failed else "regressions against the baseline")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+/* profiling runtime of the C programs generated by muriel.py --profile, the
+   compiler copies this header after the runtime and defines the tables of
+   the functions and loops of the program, every call enters a node of the
+   tree of call paths and adds its time less the time of its callees to that
+   node, the tree is written out at exit as collapsed stacks, one line of
+   frames and self nanoseconds per call path */
+
+#ifndef MURIEL_PROFILE_H
+#define MURIEL_PROFILE_H
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+
+typedef struct mur_profile_function {
+    const char *name;
+    unsigned long long calls;
+    unsigned long long total_ns;
+    unsigned long long self_ns;
+    unsigned long long active;
+} mur_profile_function;
+
+typedef struct mur_profile_loop {
+    const char *name;
+    unsigned long long iterations;
+} mur_profile_loop;
+
+typedef struct mur_profile_node mur_profile_node;
+
+struct mur_profile_node {
+    size_t function;
+    unsigned long long calls;
+    unsigned long long self_ns;
+    mur_profile_node *parent;
+    mur_profile_node *children;
+    mur_profile_node *next;
+};
+
+typedef struct mur_profile_frame mur_profile_frame;
+
+struct mur_profile_frame {
+    unsigned long long start;
+    unsigned long long callees_ns;
+    mur_profile_frame *caller;
+};
+
+typedef struct mur_profile_state {
+    mur_profile_node root;
+    mur_profile_node *node;
+    mur_profile_frame *frame;
+} mur_profile_state;
+
+/* defined by the generated program, in the unit of main when it is split */
+extern mur_profile_function mur_profile_functions[];
+extern mur_profile_loop mur_profile_loops[];
+extern const size_t mur_profile_function_count;
+extern const size_t mur_profile_loop_count;
+extern mur_profile_state mur_profile;
+
+static inline unsigned long long mur_profile_now(void) {
+#ifdef _WIN32
+    LARGE_INTEGER counter, frequency;
+    QueryPerformanceCounter(&counter);
+    QueryPerformanceFrequency(&frequency);
+    return (unsigned long long)((double)counter.QuadPart * 1e9 / (double)frequency.QuadPart);
+#else
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (unsigned long long)now.tv_sec * 1000000000ull + (unsigned long long)now.tv_nsec;
+#endif
+}
+
+static inline void mur_profile_enter(mur_profile_frame *frame, size_t function) {
+    mur_profile_node *node = mur_profile.node->children;
+    while (node && node->function != function) {
+        node = node->next;
+    }
+    if (!node) {
+        node = calloc(1, sizeof(mur_profile_node));
+        if (!node) {
+            fputs("muriel: out of memory\n", stderr);
+            exit(1);
+        }
+        node->function = function;
+        node->parent = mur_profile.node;
+        node->next = mur_profile.node->children;
+        mur_profile.node->children = node;
+    }
+    mur_profile.node = node;
+    frame->callees_ns = 0;
+    frame->caller = mur_profile.frame;
+    mur_profile.frame = frame;
+    mur_profile_functions[function].active++;
+    frame->start = mur_profile_now();
+}
+
+static inline void mur_profile_leave(mur_profile_frame *frame) {
+    unsigned long long elapsed = mur_profile_now() - frame->start;
+    unsigned long long self = elapsed - frame->callees_ns;
+    mur_profile_node *node = mur_profile.node;
+    mur_profile_function *function = &mur_profile_functions[node->function];
+    node->calls++;
+    node->self_ns += self;
+    function->calls++;
+    function->self_ns += self;
+    /* the time of recursive calls is already in their outermost call */
+    if (--function->active == 0) {
+        function->total_ns += elapsed;
+    }
+    if (frame->caller) {
+        frame->caller->callees_ns += elapsed;
+    }
+    mur_profile.frame = frame->caller;
+    mur_profile.node = node->parent;
+}
+
+static void mur_profile_write_stacks(FILE *stream, mur_profile_node *node, mur_profile_node **path, size_t depth) {
+    path[depth] = node;
+    if (node->self_ns) {
+        for (size_t i = 0; i <= depth; i++) {
+            fputs(i ? ";" : "", stream);
+            fputs(mur_profile_functions[path[i]->function].name, stream);
+        }
+        fprintf(stream, " %llu\n", node->self_ns);
+    }
+    for (mur_profile_node *child = node->children; child; child = child->next) {
+        mur_profile_write_stacks(stream, child, path, depth + 1);
+    }
+}
+
+static size_t mur_profile_depth(mur_profile_node *node) {
+    size_t depth = 0;
+    for (mur_profile_node *child = node->children; child; child = child->next) {
+        size_t child_depth = mur_profile_depth(child) + 1;
+        depth = child_depth > depth ? child_depth : depth;
+    }
+    return depth;
+}
+
+/* the collapsed stacks go to $MURIEL_PROFILE, muriel.folded by default, and
+   the calls, times and loop iterations of every function to the same name
+   with .txt appended */
+static void mur_profile_write(void) {
+    const char *file = getenv("MURIEL_PROFILE");
+    file = file && *file ? file : "muriel.folded";
+    FILE *stream = fopen(file, "w");
+    if (!stream) {
+        fprintf(stderr, "muriel: cannot write the profile to %s\n", file);
+        return;
+    }
+    size_t depth = 0;
+    for (mur_profile_node *node = mur_profile.root.children; node; node = node->next) {
+        size_t node_depth = mur_profile_depth(node) + 1;
+        depth = node_depth > depth ? node_depth : depth;
+    }
+    mur_profile_node **path = malloc((depth + 1) * sizeof(mur_profile_node *));
+    if (path) {
+        for (mur_profile_node *node = mur_profile.root.children; node; node = node->next) {
+            mur_profile_write_stacks(stream, node, path, 0);
+        }
+        free(path);
+    }
+    fclose(stream);
+
+    size_t length = strlen(file);
+    char *table_file = malloc(length + 5);
+    if (!table_file) {
+        return;
+    }
+    memcpy(table_file, file, length);
+    memcpy(table_file + length, ".txt", 5);
+    stream = fopen(table_file, "w");
+    free(table_file);
+    if (!stream) {
+        return;
+    }
+    fprintf(stream, "%12s %14s %14s  %s\n", "calls", "total (ms)", "self (ms)", "function");
+    for (size_t i = 0; i < mur_profile_function_count; i++) {
+        mur_profile_function *function = &mur_profile_functions[i];
+        if (function->calls) {
+            fprintf(stream, "%12llu %14.3f %14.3f  %s\n", function->calls, function->total_ns / 1e6, function->self_ns / 1e6, function->name);
+        }
+    }
+    fprintf(stream, "\n%12s  %s\n", "iterations", "loop");
+    for (size_t i = 0; i < mur_profile_loop_count; i++) {
+        if (mur_profile_loops[i].iterations) {
+            fprintf(stream, "%12llu  %s\n", mur_profile_loops[i].iterations, mur_profile_loops[i].name);
+        }
+    }
+    fclose(stream);
+}
+
+static inline void mur_profile_start(void) {
+    mur_profile.node = &mur_profile.root;
+    atexit(mur_profile_write);
+}
+
+#endif
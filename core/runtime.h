@@ -0,0 +1,846 @@
+/* runtime of the C programs generated by muriel.py, the compiler copies this
+   header into every generated file */
+#ifndef MURIEL_RUNTIME_H
+#define MURIEL_RUNTIME_H
+
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef enum mur_type {
+    MUR_NIL,
+    MUR_INT,
+    MUR_FLOAT,
+    MUR_STRING,
+    MUR_ARRAY,
+    MUR_OBJECT,
+    MUR_FUNCTION
+} mur_type;
+
+typedef struct mur_value mur_value;
+typedef struct mur_array mur_array;
+typedef struct mur_object mur_object;
+typedef struct mur_shape mur_shape;
+typedef struct mur_function mur_function;
+
+struct mur_value {
+    mur_type type;
+    union {
+        int64_t i;
+        double f;
+        const char *s;
+        mur_array *a;
+        mur_object *o;
+        const mur_function *fn;
+    } as;
+};
+
+/* every function of a program has one of these so it can be used as a value */
+struct mur_function {
+    const char *name;
+    int arity;
+    mur_value (*call)(const mur_value *args);
+};
+
+struct mur_array {
+    int64_t length;
+    int64_t capacity;
+    mur_value *items;
+};
+
+/* the layout shared by every object built by one {{ }} literal, the keys and
+   method flags are static tables of the generated program and a constant slot
+   holds the function the literal stored there */
+struct mur_shape {
+    int count;
+    const char *const *keys;
+    const unsigned char *methods;
+    const unsigned char *constants;
+};
+
+/* fields are looked up by name, a method field receives the object as its
+   first argument when it is called through the object, an object leaves its
+   shape when a field is added or a constant slot is overwritten and owns its
+   keys from then on */
+struct mur_object {
+    const mur_shape *shape;
+    int count;
+    int capacity;
+    const char *const *keys;
+    const unsigned char *methods;
+    mur_value *values;
+};
+
+/* the shape and slot a field access or method call site last resolved */
+typedef struct mur_cache {
+    const mur_shape *shape;
+    int slot;
+} mur_cache;
+
+static inline void mur_fatal(const char *message, const char *detail) {
+    fprintf(stderr, "runtime error: %s%s\n", message, detail ? detail : "");
+    exit(1);
+}
+
+static inline void *mur_allocate(size_t size) {
+    void *memory = malloc(size ? size : 1);
+    if (!memory) {
+        mur_fatal("out of memory", NULL);
+    }
+    return memory;
+}
+
+static inline mur_value mur_nil(void) {
+    mur_value value;
+    value.type = MUR_NIL;
+    value.as.i = 0;
+    return value;
+}
+
+static inline mur_value mur_int(int64_t i) {
+    mur_value value;
+    value.type = MUR_INT;
+    value.as.i = i;
+    return value;
+}
+
+static inline mur_value mur_float(double f) {
+    mur_value value;
+    value.type = MUR_FLOAT;
+    value.as.f = f;
+    return value;
+}
+
+static inline mur_value mur_string(const char *s) {
+    mur_value value;
+    value.type = MUR_STRING;
+    value.as.s = s;
+    return value;
+}
+
+static inline mur_value mur_bool(int condition) {
+    return mur_int(condition != 0);
+}
+
+static inline mur_value mur_function_value(const mur_function *fn) {
+    mur_value value;
+    value.type = MUR_FUNCTION;
+    value.as.fn = fn;
+    return value;
+}
+
+static inline int mur_truthy(mur_value value) {
+    switch (value.type) {
+    case MUR_NIL:
+        return 0;
+    case MUR_INT:
+        return value.as.i != 0;
+    case MUR_FLOAT:
+        return value.as.f != 0.0;
+    case MUR_STRING:
+        return value.as.s[0] != '\0';
+    default:
+        return 1;
+    }
+}
+
+static inline const char *mur_type_name(mur_value value) {
+    static const char *names[] = {"nil", "int", "float", "string", "array", "object", "function"};
+    return names[value.type];
+}
+
+/* arrays */
+
+static inline mur_value mur_array_new(int64_t count, const mur_value *items) {
+    mur_array *array = mur_allocate(sizeof(mur_array));
+    array->length = count;
+    array->capacity = count > 4 ? count : 4;
+    array->items = mur_allocate(sizeof(mur_value) * array->capacity);
+    if (count) {
+        memcpy(array->items, items, sizeof(mur_value) * count);
+    }
+    mur_value value;
+    value.type = MUR_ARRAY;
+    value.as.a = array;
+    return value;
+}
+
+static inline void mur_array_push(mur_array *array, mur_value item) {
+    if (array->length == array->capacity) {
+        array->capacity *= 2;
+        array->items = realloc(array->items, sizeof(mur_value) * array->capacity);
+        if (!array->items) {
+            mur_fatal("out of memory", NULL);
+        }
+    }
+    array->items[array->length++] = item;
+}
+
+static inline mur_value *mur_array_slot(mur_value array, mur_value index) {
+    if (array.type != MUR_ARRAY) {
+        mur_fatal("cannot index a value of type ", mur_type_name(array));
+    }
+    if (index.type != MUR_INT) {
+        mur_fatal("array index must be an int, not ", mur_type_name(index));
+    }
+    int64_t i = index.as.i < 0 ? index.as.i + array.as.a->length : index.as.i;
+    if (i < 0 || i >= array.as.a->length) {
+        mur_fatal("array index out of range", NULL);
+    }
+    return &array.as.a->items[i];
+}
+
+static inline mur_value mur_get_index(mur_value array, mur_value index) {
+    if (array.type == MUR_STRING && index.type == MUR_INT) {
+        int64_t length = (int64_t)strlen(array.as.s);
+        int64_t i = index.as.i < 0 ? index.as.i + length : index.as.i;
+        if (i < 0 || i >= length) {
+            mur_fatal("string index out of range", NULL);
+        }
+        return mur_int((unsigned char)array.as.s[i]);
+    }
+    return *mur_array_slot(array, index);
+}
+
+static inline mur_value mur_set_index(mur_value array, mur_value index, mur_value item) {
+    *mur_array_slot(array, index) = item;
+    return item;
+}
+
+/* arenas, objects that cannot outlive a call are bump allocated in an arena
+   the call releases when it returns, a NULL arena allocates on the heap */
+
+#define MUR_ARENA_BLOCK 65536
+#define MUR_ARENA_INIT {NULL, NULL, NULL}
+
+typedef struct mur_arena_block mur_arena_block;
+
+struct mur_arena_block {
+    mur_arena_block *next;
+};
+
+typedef struct mur_arena {
+    char *top;
+    char *end;
+    mur_arena_block *blocks;
+} mur_arena;
+
+static void *mur_arena_grow(mur_arena *arena, size_t size) {
+    size_t capacity = size > MUR_ARENA_BLOCK ? size : MUR_ARENA_BLOCK;
+    mur_arena_block *block = mur_allocate(sizeof(mur_arena_block) + capacity);
+    block->next = arena->blocks;
+    arena->blocks = block;
+    arena->top = (char *)(block + 1) + size;
+    arena->end = (char *)(block + 1) + capacity;
+    return block + 1;
+}
+
+static inline void *mur_arena_allocate(mur_arena *arena, size_t size) {
+    if (!arena) {
+        return mur_allocate(size);
+    }
+    size = (size + 7) & ~(size_t)7;
+    if (!arena->top || size > (size_t)(arena->end - arena->top)) {
+        return mur_arena_grow(arena, size);
+    }
+    void *memory = arena->top;
+    arena->top += size;
+    return memory;
+}
+
+static inline void mur_arena_release(mur_arena *arena) {
+    while (arena->blocks) {
+        mur_arena_block *block = arena->blocks;
+        arena->blocks = block->next;
+        free(block);
+    }
+}
+
+/* objects */
+
+/* the values of a shaped object follow it in the same allocation, which is
+   on the heap, in an arena or a struct on the stack of the generated code */
+static inline mur_value mur_object_init(mur_object *object, const mur_shape *shape, const mur_value *values) {
+    object->shape = shape;
+    object->count = shape->count;
+    object->capacity = shape->count;
+    object->keys = shape->keys;
+    object->methods = shape->methods;
+    object->values = (mur_value *)(object + 1);
+    if (shape->count) {
+        memcpy(object->values, values, sizeof(mur_value) * shape->count);
+    }
+    mur_value value;
+    value.type = MUR_OBJECT;
+    value.as.o = object;
+    return value;
+}
+
+static inline mur_value mur_object_shaped(const mur_shape *shape, const mur_value *values) {
+    return mur_object_init(mur_allocate(sizeof(mur_object) + sizeof(mur_value) * shape->count), shape, values);
+}
+
+static inline mur_value mur_object_in(mur_arena *arena, const mur_shape *shape, const mur_value *values) {
+    return mur_object_init(mur_arena_allocate(arena, sizeof(mur_object) + sizeof(mur_value) * shape->count), shape, values);
+}
+
+static inline int mur_object_find(const mur_object *object, const char *key) {
+    for (int i = 0; i < object->count; i++) {
+        if (object->keys[i] == key || strcmp(object->keys[i], key) == 0) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+/* copies the keys and method flags out of the shape, with room for capacity
+   fields */
+static inline void mur_object_unshape(mur_object *o, int capacity) {
+    const char **keys = mur_allocate(sizeof(const char *) * capacity);
+    unsigned char *methods = mur_allocate(capacity);
+    mur_value *values = mur_allocate(sizeof(mur_value) * capacity);
+    if (o->count) {
+        memcpy(keys, o->keys, sizeof(const char *) * o->count);
+        memcpy(methods, o->methods, o->count);
+        memcpy(values, o->values, sizeof(mur_value) * o->count);
+    }
+    if (!o->shape) {
+        free((void *)o->keys);
+        free((void *)o->methods);
+        free(o->values);
+    }
+    o->shape = NULL;
+    o->capacity = capacity;
+    o->keys = keys;
+    o->methods = methods;
+    o->values = values;
+}
+
+static inline mur_value mur_get_field(mur_value object, const char *key) {
+    if (object.type == MUR_ARRAY && strcmp(key, "length") == 0) {
+        return mur_int(object.as.a->length);
+    }
+    if (object.type != MUR_OBJECT) {
+        mur_fatal("cannot read a field of a value of type ", mur_type_name(object));
+    }
+    int i = mur_object_find(object.as.o, key);
+    if (i < 0) {
+        mur_fatal("no field named ", key);
+    }
+    return object.as.o->values[i];
+}
+
+static inline mur_value mur_set_field(mur_value object, const char *key, mur_value item) {
+    if (object.type != MUR_OBJECT) {
+        mur_fatal("cannot set a field of a value of type ", mur_type_name(object));
+    }
+    mur_object *o = object.as.o;
+    int i = mur_object_find(o, key);
+    if (i < 0) {
+        if (o->shape || o->count == o->capacity) {
+            mur_object_unshape(o, o->count < 2 ? 4 : o->count * 2);
+        }
+        i = o->count++;
+        ((const char **)o->keys)[i] = key;
+        ((unsigned char *)o->methods)[i] = 0;
+    } else if (o->shape && o->shape->constants[i]) {
+        mur_object_unshape(o, o->count);
+    }
+    o->values[i] = item;
+    return item;
+}
+
+/* the slot of key in a shaped object, remembered in the cache of the site */
+static inline int mur_cache_lookup(mur_value object, const char *key, mur_cache *cache) {
+    if (object.type != MUR_OBJECT || !object.as.o->shape) {
+        return -1;
+    }
+    int i = mur_object_find(object.as.o, key);
+    if (i >= 0) {
+        cache->shape = object.as.o->shape;
+        cache->slot = i;
+    }
+    return i;
+}
+
+static inline int mur_cache_hit(mur_value object, const mur_cache *cache) {
+    return object.type == MUR_OBJECT && object.as.o->shape && object.as.o->shape == cache->shape;
+}
+
+/* the cached accesses keep their misses out of line so the hits inline */
+static mur_value mur_get_field_miss(mur_value object, const char *key, mur_cache *cache) {
+    if (mur_cache_lookup(object, key, cache) >= 0) {
+        return object.as.o->values[cache->slot];
+    }
+    return mur_get_field(object, key);
+}
+
+static inline mur_value mur_get_field_cached(mur_value object, const char *key, mur_cache *cache) {
+    if (mur_cache_hit(object, cache)) {
+        return object.as.o->values[cache->slot];
+    }
+    return mur_get_field_miss(object, key, cache);
+}
+
+static mur_value mur_set_field_miss(mur_value object, const char *key, mur_value item, mur_cache *cache) {
+    if (mur_cache_lookup(object, key, cache) >= 0 && !cache->shape->constants[cache->slot]) {
+        object.as.o->values[cache->slot] = item;
+        return item;
+    }
+    cache->shape = NULL;
+    return mur_set_field(object, key, item);
+}
+
+static inline mur_value mur_set_field_cached(mur_value object, const char *key, mur_value item, mur_cache *cache) {
+    if (mur_cache_hit(object, cache)) {
+        object.as.o->values[cache->slot] = item;
+        return item;
+    }
+    return mur_set_field_miss(object, key, item, cache);
+}
+
+/* accesses through a shape known when the program was compiled */
+static inline mur_value mur_shape_get_field(mur_value object, const mur_shape *shape, int slot, const char *key) {
+    if (object.type == MUR_OBJECT && object.as.o->shape == shape) {
+        return object.as.o->values[slot];
+    }
+    return mur_get_field(object, key);
+}
+
+static inline mur_value mur_shape_set_field(mur_value object, const mur_shape *shape, int slot, const char *key, mur_value item) {
+    if (object.type == MUR_OBJECT && object.as.o->shape == shape) {
+        object.as.o->values[slot] = item;
+        return item;
+    }
+    return mur_set_field(object, key, item);
+}
+
+/* calls */
+
+static inline mur_value mur_call(mur_value callee, int argc, const mur_value *args) {
+    if (callee.type != MUR_FUNCTION) {
+        mur_fatal("cannot call a value of type ", mur_type_name(callee));
+    }
+    if (callee.as.fn->arity != argc) {
+        mur_fatal("wrong number of arguments for ", callee.as.fn->name);
+    }
+    return callee.as.fn->call(args);
+}
+
+static inline mur_value mur_call_with_self(mur_value callee, mur_value self, int argc, const mur_value *args) {
+    mur_value buffer[8];
+    mur_value *arguments = argc < 8 ? buffer : mur_allocate(sizeof(mur_value) * (argc + 1));
+    arguments[0] = self;
+    if (argc) {
+        memcpy(arguments + 1, args, sizeof(mur_value) * argc);
+    }
+    mur_value result = mur_call(callee, argc + 1, arguments);
+    if (arguments != buffer) {
+        free(arguments);
+    }
+    return result;
+}
+
+static inline mur_value mur_call_slot(mur_value self, int slot, int argc, const mur_value *args) {
+    if (self.as.o->methods[slot]) {
+        return mur_call_with_self(self.as.o->values[slot], self, argc, args);
+    }
+    return mur_call(self.as.o->values[slot], argc, args);
+}
+
+static inline mur_value mur_call_method(mur_value self, const char *name, int argc, const mur_value *args) {
+    if (self.type == MUR_ARRAY) {
+        if (strcmp(name, "push") == 0 && argc == 1) {
+            mur_array_push(self.as.a, args[0]);
+            return self;
+        }
+        if (strcmp(name, "pop") == 0 && argc == 0) {
+            if (self.as.a->length == 0) {
+                mur_fatal("pop from an empty array", NULL);
+            }
+            return self.as.a->items[--self.as.a->length];
+        }
+        mur_fatal("arrays have no method named ", name);
+    }
+    if (self.type != MUR_OBJECT) {
+        mur_fatal("cannot call a method of a value of type ", mur_type_name(self));
+    }
+    int i = mur_object_find(self.as.o, name);
+    if (i < 0) {
+        mur_fatal("no method named ", name);
+    }
+    return mur_call_slot(self, i, argc, args);
+}
+
+static mur_value mur_call_method_miss(mur_value self, const char *name, int argc, const mur_value *args, mur_cache *cache) {
+    if (mur_cache_lookup(self, name, cache) >= 0) {
+        return mur_call_slot(self, cache->slot, argc, args);
+    }
+    return mur_call_method(self, name, argc, args);
+}
+
+static inline mur_value mur_call_method_cached(mur_value self, const char *name, int argc, const mur_value *args, mur_cache *cache) {
+    if (mur_cache_hit(self, cache)) {
+        return mur_call_slot(self, cache->slot, argc, args);
+    }
+    return mur_call_method_miss(self, name, argc, args, cache);
+}
+
+/* operators, objects overload them with __add__ style fields, everything but
+   the arithmetic on numbers is kept out of line so the operators inline */
+
+static mur_value mur_operator_field(mur_value left, mur_value right, const char *name, const char *symbol) {
+    if (left.type == MUR_OBJECT) {
+        int i = mur_object_find(left.as.o, name);
+        if (i >= 0) {
+            mur_value args[2] = {left, right};
+            return mur_call(left.as.o->values[i], 2, args);
+        }
+    }
+    fprintf(stderr, "runtime error: unsupported operand types for %s: %s and %s\n", symbol, mur_type_name(left), mur_type_name(right));
+    exit(1);
+}
+
+static inline double mur_number(mur_value value) {
+    return value.type == MUR_INT ? (double)value.as.i : value.as.f;
+}
+
+static inline int mur_numbers(mur_value left, mur_value right) {
+    return (left.type == MUR_INT || left.type == MUR_FLOAT) && (right.type == MUR_INT || right.type == MUR_FLOAT);
+}
+
+static mur_value mur_add_other(mur_value left, mur_value right) {
+    if (left.type == MUR_STRING && right.type == MUR_STRING) {
+        size_t left_length = strlen(left.as.s);
+        size_t right_length = strlen(right.as.s);
+        char *s = mur_allocate(left_length + right_length + 1);
+        memcpy(s, left.as.s, left_length);
+        memcpy(s + left_length, right.as.s, right_length + 1);
+        return mur_string(s);
+    }
+    return mur_operator_field(left, right, "__add__", "+");
+}
+
+static inline mur_value mur_add(mur_value left, mur_value right) {
+    if (left.type == MUR_INT && right.type == MUR_INT) {
+        return mur_int((int64_t)((uint64_t)left.as.i + (uint64_t)right.as.i));
+    }
+    if (mur_numbers(left, right)) {
+        return mur_float(mur_number(left) + mur_number(right));
+    }
+    return mur_add_other(left, right);
+}
+
+static inline mur_value mur_sub(mur_value left, mur_value right) {
+    if (left.type == MUR_INT && right.type == MUR_INT) {
+        return mur_int((int64_t)((uint64_t)left.as.i - (uint64_t)right.as.i));
+    }
+    if (mur_numbers(left, right)) {
+        return mur_float(mur_number(left) - mur_number(right));
+    }
+    return mur_operator_field(left, right, "__sub__", "-");
+}
+
+static inline mur_value mur_mul(mur_value left, mur_value right) {
+    if (left.type == MUR_INT && right.type == MUR_INT) {
+        return mur_int((int64_t)((uint64_t)left.as.i * (uint64_t)right.as.i));
+    }
+    if (mur_numbers(left, right)) {
+        return mur_float(mur_number(left) * mur_number(right));
+    }
+    return mur_operator_field(left, right, "__mul__", "*");
+}
+
+static inline mur_value mur_div(mur_value left, mur_value right) {
+    if (left.type == MUR_INT && right.type == MUR_INT) {
+        if (right.as.i == 0) {
+            mur_fatal("division by zero", NULL);
+        }
+        if (left.as.i == INT64_MIN && right.as.i == -1) {
+            return left;
+        }
+        return mur_int(left.as.i / right.as.i);
+    }
+    if (mur_numbers(left, right)) {
+        return mur_float(mur_number(left) / mur_number(right));
+    }
+    return mur_operator_field(left, right, "__div__", "/");
+}
+
+static inline mur_value mur_mod(mur_value left, mur_value right) {
+    if (left.type == MUR_INT && right.type == MUR_INT) {
+        if (right.as.i == 0) {
+            mur_fatal("division by zero", NULL);
+        }
+        if (right.as.i == -1) {
+            return mur_int(0);
+        }
+        return mur_int(left.as.i % right.as.i);
+    }
+    return mur_operator_field(left, right, "__mod__", "%");
+}
+
+static inline mur_value mur_integer_operands(mur_value left, mur_value right, const char *symbol) {
+    if (left.type != MUR_INT || right.type != MUR_INT) {
+        fprintf(stderr, "runtime error: unsupported operand types for %s: %s and %s\n", symbol, mur_type_name(left), mur_type_name(right));
+        exit(1);
+    }
+    return left;
+}
+
+static inline mur_value mur_bit_and(mur_value left, mur_value right) {
+    mur_integer_operands(left, right, "&");
+    return mur_int(left.as.i & right.as.i);
+}
+
+static inline mur_value mur_bit_or(mur_value left, mur_value right) {
+    mur_integer_operands(left, right, "|");
+    return mur_int(left.as.i | right.as.i);
+}
+
+static inline mur_value mur_bit_xor(mur_value left, mur_value right) {
+    mur_integer_operands(left, right, "^");
+    return mur_int(left.as.i ^ right.as.i);
+}
+
+static inline mur_value mur_shl(mur_value left, mur_value right) {
+    mur_integer_operands(left, right, "<<");
+    return mur_int((int64_t)((uint64_t)left.as.i << (right.as.i & 63)));
+}
+
+static inline mur_value mur_shr(mur_value left, mur_value right) {
+    mur_integer_operands(left, right, ">>");
+    return mur_int(left.as.i >> (right.as.i & 63));
+}
+
+static inline mur_value mur_neg(mur_value value) {
+    if (value.type == MUR_INT) {
+        return mur_int((int64_t)(0 - (uint64_t)value.as.i));
+    }
+    if (value.type == MUR_FLOAT) {
+        return mur_float(-value.as.f);
+    }
+    mur_fatal("cannot negate a value of type ", mur_type_name(value));
+    return value;
+}
+
+static inline mur_value mur_not(mur_value value) {
+    return mur_bool(!mur_truthy(value));
+}
+
+static inline mur_value mur_invert(mur_value value) {
+    if (value.type != MUR_INT) {
+        mur_fatal("cannot invert a value of type ", mur_type_name(value));
+    }
+    return mur_int(~value.as.i);
+}
+
+static inline int mur_equals(mur_value left, mur_value right) {
+    if (mur_numbers(left, right)) {
+        if (left.type == MUR_INT && right.type == MUR_INT) {
+            return left.as.i == right.as.i;
+        }
+        return mur_number(left) == mur_number(right);
+    }
+    if (left.type != right.type) {
+        return 0;
+    }
+    switch (left.type) {
+    case MUR_NIL:
+        return 1;
+    case MUR_STRING:
+        return left.as.s == right.as.s || strcmp(left.as.s, right.as.s) == 0;
+    case MUR_ARRAY:
+        return left.as.a == right.as.a;
+    case MUR_OBJECT:
+        return left.as.o == right.as.o;
+    default:
+        return left.as.fn == right.as.fn;
+    }
+}
+
+static inline int mur_compare(mur_value left, mur_value right, const char *symbol) {
+    if (left.type == MUR_INT && right.type == MUR_INT) {
+        return (left.as.i > right.as.i) - (left.as.i < right.as.i);
+    }
+    if (mur_numbers(left, right)) {
+        double l = mur_number(left);
+        double r = mur_number(right);
+        return (l > r) - (l < r);
+    }
+    if (left.type == MUR_STRING && right.type == MUR_STRING) {
+        return strcmp(left.as.s, right.as.s);
+    }
+    fprintf(stderr, "runtime error: unsupported operand types for %s: %s and %s\n", symbol, mur_type_name(left), mur_type_name(right));
+    exit(1);
+}
+
+static inline mur_value mur_eq(mur_value left, mur_value right) {
+    return mur_bool(mur_equals(left, right));
+}
+
+static inline mur_value mur_ne(mur_value left, mur_value right) {
+    return mur_bool(!mur_equals(left, right));
+}
+
+static inline mur_value mur_lt(mur_value left, mur_value right) {
+    return mur_bool(mur_compare(left, right, "<") < 0);
+}
+
+static inline mur_value mur_le(mur_value left, mur_value right) {
+    return mur_bool(mur_compare(left, right, "<=") <= 0);
+}
+
+static inline mur_value mur_gt(mur_value left, mur_value right) {
+    return mur_bool(mur_compare(left, right, ">") > 0);
+}
+
+static inline mur_value mur_ge(mur_value left, mur_value right) {
+    return mur_bool(mur_compare(left, right, ">=") >= 0);
+}
+
+/* switch dispatch, the int key of a value is only defined when the value
+   can equal an int case, floats only up to 2^53 where doubles are exact */
+
+static inline int mur_int_key(mur_value value, int64_t *key) {
+    if (value.type == MUR_INT) {
+        *key = value.as.i;
+        return 1;
+    }
+    if (value.type == MUR_FLOAT && value.as.f >= -9007199254740992.0 && value.as.f <= 9007199254740992.0 && (double)(int64_t)value.as.f == value.as.f) {
+        *key = (int64_t)value.as.f;
+        return 1;
+    }
+    return 0;
+}
+
+static inline int mur_search_int(const int64_t *keys, int count, int64_t key) {
+    int low = 0;
+    int high = count - 1;
+    while (low <= high) {
+        int middle = low + (high - low) / 2;
+        if (keys[middle] < key) {
+            low = middle + 1;
+        } else if (keys[middle] > key) {
+            high = middle - 1;
+        } else {
+            return middle;
+        }
+    }
+    return -1;
+}
+
+/* 64 bit FNV-1a, the compiler hashes string cases the same way */
+static inline uint64_t mur_hash_string(const char *s) {
+    uint64_t hash = UINT64_C(14695981039346656037);
+    for (; *s; s++) {
+        hash ^= (unsigned char)*s;
+        hash *= UINT64_C(1099511628211);
+    }
+    return hash;
+}
+
+static inline int mur_search_hash(const uint64_t *hashes, int count, uint64_t hash) {
+    int low = 0;
+    int high = count - 1;
+    while (low <= high) {
+        int middle = low + (high - low) / 2;
+        if (hashes[middle] < hash) {
+            low = middle + 1;
+        } else if (hashes[middle] > hash) {
+            high = middle - 1;
+        } else {
+            return middle;
+        }
+    }
+    return -1;
+}
+
+/* builtins and the conversions used by calls to extern functions */
+
+static inline void mur_write(FILE *stream, mur_value value) {
+    switch (value.type) {
+    case MUR_NIL:
+        fputs("nil", stream);
+        break;
+    case MUR_INT:
+        fprintf(stream, "%lld", (long long)value.as.i);
+        break;
+    case MUR_FLOAT:
+        fprintf(stream, "%g", value.as.f);
+        break;
+    case MUR_STRING:
+        fputs(value.as.s, stream);
+        break;
+    case MUR_ARRAY:
+        fputc('[', stream);
+        for (int64_t i = 0; i < value.as.a->length; i++) {
+            if (i) {
+                fputs(", ", stream);
+            }
+            mur_write(stream, value.as.a->items[i]);
+        }
+        fputc(']', stream);
+        break;
+    case MUR_OBJECT:
+        fputs("{{", stream);
+        for (int i = 0; i < value.as.o->count; i++) {
+            fprintf(stream, "%s%s%s: ", i ? ", " : " ", value.as.o->methods[i] ? "@" : "", value.as.o->keys[i]);
+            mur_write(stream, value.as.o->values[i]);
+        }
+        fputs(" }}", stream);
+        break;
+    case MUR_FUNCTION:
+        fprintf(stream, "<function %s>", value.as.fn->name);
+        break;
+    }
+}
+
+static inline mur_value mur_print(mur_value value) {
+    mur_write(stdout, value);
+    fputc('\n', stdout);
+    return mur_nil();
+}
+
+static inline mur_value mur_len(mur_value value) {
+    if (value.type == MUR_ARRAY) {
+        return mur_int(value.as.a->length);
+    }
+    if (value.type == MUR_STRING) {
+        return mur_int((int64_t)strlen(value.as.s));
+    }
+    if (value.type == MUR_OBJECT) {
+        return mur_int(value.as.o->count);
+    }
+    mur_fatal("len() of a value of type ", mur_type_name(value));
+    return value;
+}
+
+static inline int64_t mur_to_int(mur_value value) {
+    if (value.type == MUR_INT) {
+        return value.as.i;
+    }
+    if (value.type == MUR_FLOAT) {
+        return (int64_t)value.as.f;
+    }
+    mur_fatal("expected a number, not ", mur_type_name(value));
+    return 0;
+}
+
+static inline double mur_to_float(mur_value value) {
+    if (value.type == MUR_INT || value.type == MUR_FLOAT) {
+        return mur_number(value);
+    }
+    mur_fatal("expected a number, not ", mur_type_name(value));
+    return 0;
+}
+
+static inline const char *mur_to_string(mur_value value) {
+    if (value.type != MUR_STRING) {
+        mur_fatal("expected a string, not ", mur_type_name(value));
+    }
+    return value.as.s;
+}
+
+#endif
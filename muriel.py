@@ -1,16 +1,47 @@
+import argparse
+import codecs
+import copy
+import concurrent.futures
+import contextlib
+import cProfile
+import hashlib
+import io
+import json
+import math
+import mmap
 import os
+import pickle
+import pstats
+import re
+import shlex
+import shutil
+import socket
+import socketserver
+import struct
+import subprocess
 import sys
-import tokenize
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
+
+COMPILER_VERSION = "0.1.0"
+# bumped whenever the pickled trees change shape, old cache entries then miss
+PARSE_CACHE_FORMAT = 5
 
 INCLUDE_PATHS = ["."]
 
-def print_compiler_error(message, token, moduleName):
+def report_compiler_error(message, token, moduleName):
     if token is None:
         print("Error: " + message + " in module " + moduleName)
     else:
         print(f"{token.line}")
         print(" " * (token.start[1] - 1) + "^")
         print("Error: " + message + " at line " + str(token.start[0]) + " column " + str(token.start[1]) + " in module " + moduleName)
+
+def print_compiler_error(message, token, moduleName):
+    report_compiler_error(message, token, moduleName)
     sys.exit(1)
 
 
@@ -18,44 +49,506 @@ def print_help_and_exit(message = None):
     if message:
         print(message)
     
-    print("Usage: python muriel.py <input_file> [output_file]")
+    print("Usage: python muriel.py [options] <input_file> [output_file]")
     sys.exit(1)    
 
-def search_for_include_file(module_info):
-    for include_path in INCLUDE_PATHS:
-        file = os.path.join(include_path, *module_info) + ".mur"
-        if os.path.isfile(file):
+def search_for_include_file(module_info, resolver = None):
+    if resolver is None:
+        resolver = IncludeResolver(INCLUDE_PATHS)
+    return resolver.find(module_info)
+
+def include_paths_from_environment(include_paths = None):
+    # -I paths first, then $MURIEL_INCLUDE_PATH, then the default paths
+    paths = list(include_paths or [])
+    environment_paths = os.environ.get("MURIEL_INCLUDE_PATH")
+    if environment_paths:
+        paths.extend(path for path in environment_paths.split(os.pathsep) if path)
+    paths.extend(INCLUDE_PATHS)
+    return paths
+
+
+# answers include lookups from directory listings, every directory under an
+# include root is listed at most once with os.scandir instead of stat-ing a
+# candidate file per root and include, a listing is thrown away when the mtime
+# of its directory changes, a fresh precompiled module is preferred to its
+# source, next to it or in the directory of precompiled modules
+class IncludeResolver:
+    def __init__(self, include_paths, precompiled_dir = None):
+        self.include_paths = include_paths
+        self.precompiled_dir = precompiled_dir
+        self.listings = {}
+        self.resolved = {}
+
+    def list_directory(self, directory):
+        listing = self.listings.get(directory)
+        if listing is not None:
+            return listing[1]
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as it:
+                names = frozenset(entry.name for entry in it if entry.name.endswith((".mur", PRECOMPILED_SUFFIX)) and entry.is_file())
+        except OSError:
+            mtime = None
+            names = frozenset()
+        self.listings[directory] = (mtime, names)
+        return names
+
+    def find(self, module_info):
+        key = tuple(module_info)
+        file = self.resolved.get(key)
+        if file is not None:
             return file
-    return None
 
+        file_name = module_info[-1] + ".mur"
+        for include_path in self.include_paths:
+            directory = os.path.join(include_path, *module_info[:-1])
+            names = self.list_directory(directory)
+            source = os.path.join(directory, file_name) if file_name in names else None
+            file = self.find_precompiled(module_info, directory, names, source) or source
+            if file is not None:
+                self.resolved[key] = file
+                return file
 
-def extract_block_tokens(tokens, token_index, block_start_char, block_end_char):
-    if tokens[token_index].string != block_start_char:
-        print_compiler_error(f"expected '{block_start_char}'", tokens[token_index])
-    
-    block_tokens = []
-    block_token_count = 0
-    
-    while token_index < len(tokens):
-        token = tokens[token_index]
-        if token.string == block_start_char:
-            block_token_count += 1
-        elif token.string == block_end_char:
-            block_token_count -= 1
-            if block_token_count == 0:
-                break
-        block_tokens.append(token)
+        # a miss may be a module created since its directory was listed
+        if self.refresh():
+            return self.find(module_info)
+        return None
+
+    def find_precompiled(self, module_info, directory, names, source):
+        precompiled_name = module_info[-1] + PRECOMPILED_SUFFIX
+        if precompiled_name in names:
+            file = os.path.join(directory, precompiled_name)
+            if precompiled_is_fresh(file, source):
+                return file
+        if self.precompiled_dir and source is not None:
+            file = os.path.join(self.precompiled_dir, *module_info[:-1], precompiled_name)
+            if os.path.isfile(file) and precompiled_is_fresh(file, source):
+                return file
+        return None
+
+    def refresh(self):
+        # drops the listings of directories that changed, returns True if any did
+        stale = []
+        for directory, (mtime, _) in self.listings.items():
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                stale.append(directory)
+        for directory in stale:
+            del self.listings[directory]
+        if stale:
+            self.resolved.clear()
+        return len(stale) > 0
+
+
+TOKEN_ENDMARKER = 0
+TOKEN_NAME = 1
+TOKEN_NUMBER = 2
+TOKEN_STRING = 3
+TOKEN_NEWLINE = 4
+TOKEN_OP = 5
+TOKEN_LPAREN = 6
+TOKEN_RPAREN = 7
+TOKEN_LBRACKET = 8
+TOKEN_RBRACKET = 9
+TOKEN_LBRACE = 10
+TOKEN_RBRACE = 11
+TOKEN_LOBJECT = 12
+TOKEN_ROBJECT = 13
+TOKEN_ARROW = 14
+TOKEN_COLON = 15
+TOKEN_COMMA = 16
+TOKEN_DOT = 17
+TOKEN_AT = 18
+TOKEN_INCLUDE = 19
+TOKEN_AS = 20
+TOKEN_EXTERN = 21
+TOKEN_IF = 22
+TOKEN_ELIF = 23
+TOKEN_ELSE = 24
+TOKEN_WHILE = 25
+TOKEN_LOOP = 26
+TOKEN_SWITCH = 27
+TOKEN_DEFAULT = 28
+
+TOKEN_NAMES = [
+    "ENDMARKER", "NAME", "NUMBER", "STRING", "NEWLINE", "OP",
+    "LPAREN", "RPAREN", "LBRACKET", "RBRACKET", "LBRACE", "RBRACE", "LOBJECT", "ROBJECT",
+    "ARROW", "COLON", "COMMA", "DOT", "AT",
+    "INCLUDE", "AS", "EXTERN", "IF", "ELIF", "ELSE", "WHILE", "LOOP", "SWITCH", "DEFAULT",
+]
+
+KEYWORDS = {
+    b"include": TOKEN_INCLUDE,
+    b"as": TOKEN_AS,
+    b"extern": TOKEN_EXTERN,
+    b"if": TOKEN_IF,
+    b"elif": TOKEN_ELIF,
+    b"else": TOKEN_ELSE,
+    b"while": TOKEN_WHILE,
+    b"loop": TOKEN_LOOP,
+    b"switch": TOKEN_SWITCH,
+    b"default": TOKEN_DEFAULT,
+}
+
+PUNCTUATION = {
+    b"(": TOKEN_LPAREN,
+    b")": TOKEN_RPAREN,
+    b"[": TOKEN_LBRACKET,
+    b"]": TOKEN_RBRACKET,
+    b"{": TOKEN_LBRACE,
+    b"}": TOKEN_RBRACE,
+    b"{{": TOKEN_LOBJECT,
+    b"}}": TOKEN_ROBJECT,
+    b"->": TOKEN_ARROW,
+    b":": TOKEN_COLON,
+    b",": TOKEN_COMMA,
+    b".": TOKEN_DOT,
+    b"@": TOKEN_AT,
+}
+
+# the text of every kind that always has the same spelling, used in messages
+TOKEN_TEXT = {kind: text.decode() for text, kind in PUNCTUATION.items()}
+TOKEN_TEXT.update({kind: text.decode() for text, kind in KEYWORDS.items()})
+
+LEXER_PATTERN = re.compile(rb"""
+     (?P<space>[ \t\f]+)
+    |(?P<comment>\#[^\r\n]*)
+    |(?P<newline>\r\n|\r|\n)
+    |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<number>0[xX][0-9a-fA-F]+|(?:[0-9]+\.[0-9]*|\.[0-9]+|[0-9]+)(?:[eE][+-]?[0-9]+)?)
+    |(?P<string>"(?:[^"\\\r\n]|\\.)*"|'(?:[^'\\\r\n]|\\.)*')
+    |(?P<punctuation>\{\{|\}\}|->|[()\[\]{}:,.@])
+    |(?P<op>==|!=|<=|>=|&&|\|\||<<|>>|\+=|-=|\*=|/=|%=|[-+*/%<>=!&|^~?;])
+    |(?P<error>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+# a read-only view of one row of a TokenTable, exposing the TokenInfo fields
+# the parsers use, the line text is only rebuilt when an error is reported
+class Token:
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def type(self):
+        return self.table.types[self.index]
+
+    @property
+    def string(self):
+        return self.table.string(self.index)
+
+    @property
+    def start(self):
+        return (self.table.lines[self.index], self.table.columns[self.index])
+
+    @property
+    def line(self):
+        return self.table.line_text(self.table.offsets[self.index])
+
+    def __str__(self):
+        return f"Token(type={self.type} ({TOKEN_NAMES[self.type]}), string={self.string!r}, start={self.start})"
+
+
+# columnar token storage for a whole module, every token is a row in the
+# parallel arrays and its text is a slice of the single source buffer
+class TokenTable:
+    def __init__(self, source):
+        self.source = source
+        self.types = array('B')
+        self.offsets = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+        self.columns = array('I')
+
+    @classmethod
+    def from_file(cls, file, moduleName):
+        return cls.from_source(cls.map_file(file), moduleName)
+
+    @staticmethod
+    def map_file(file):
+        # the lexer runs straight over a read-only map of the file, which is
+        # kept as the source buffer, empty files cannot be mapped
+        with open(file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+    @classmethod
+    def from_source(cls, source, moduleName):
+        if isinstance(source, str):
+            source = source.encode()
+        table = cls(source)
+        table.lex(moduleName)
+        return table
+
+    def lex(self, moduleName):
+        types = self.types
+        offsets = self.offsets
+        lengths = self.lengths
+        lines = self.lines
+        columns = self.columns
+        keywords = KEYWORDS
+        punctuation = PUNCTUATION
+        line = 1
+        line_start = 0
+        # '{{' and '}}' only delimit object literals, so a '}}' that closes two
+        # ordinary blocks is split back into two '}' tokens
+        braces = []
+        for match in LEXER_PATTERN.finditer(self.source):
+            group = match.lastgroup
+            if group == "space" or group == "comment":
+                continue
+            offset = match.start()
+            if group == "newline":
+                kind = TOKEN_NEWLINE
+            elif group == "name":
+                kind = keywords.get(match.group(), TOKEN_NAME)
+            elif group == "punctuation":
+                kind = punctuation[match.group()]
+                if kind == TOKEN_LBRACE or kind == TOKEN_LOBJECT:
+                    braces.append(kind)
+                elif kind == TOKEN_RBRACE:
+                    if braces:
+                        braces.pop()
+                elif kind == TOKEN_ROBJECT and (not braces or braces[-1] != TOKEN_LOBJECT):
+                    for brace_offset in (offset, offset + 1):
+                        if braces:
+                            braces.pop()
+                        types.append(TOKEN_RBRACE)
+                        offsets.append(brace_offset)
+                        lengths.append(1)
+                        lines.append(line)
+                        columns.append(brace_offset - line_start)
+                    continue
+                elif kind == TOKEN_ROBJECT:
+                    braces.pop()
+            elif group == "number":
+                kind = TOKEN_NUMBER
+            elif group == "string":
+                kind = TOKEN_STRING
+            elif group == "op":
+                kind = TOKEN_OP
+            else:
+                types.append(TOKEN_OP)
+                offsets.append(offset)
+                lengths.append(1)
+                lines.append(line)
+                columns.append(offset - line_start)
+                print_compiler_error(f"unexpected character {match.group().decode('latin-1')!r}", Token(self, len(types) - 1), moduleName)
+
+            types.append(kind)
+            offsets.append(offset)
+            lengths.append(match.end() - offset)
+            lines.append(line)
+            columns.append(offset - line_start)
+            if kind == TOKEN_NEWLINE:
+                line += 1
+                line_start = match.end()
+
+        types.append(TOKEN_ENDMARKER)
+        offsets.append(len(self.source))
+        lengths.append(0)
+        lines.append(line)
+        columns.append(len(self.source) - line_start)
+
+    def detach(self):
+        # copies the source out of the file map, long running sessions must
+        # not keep reading a file that may be rewritten under them
+        if isinstance(self.source, mmap.mmap):
+            source = self.source
+            self.source = bytes(source)
+            source.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["source"] = bytes(self.source)
+        return state
+
+    def span_source(self, start, end):
+        if start >= end:
+            return b""
+        return self.source[self.offsets[start]:self.offsets[end - 1] + self.lengths[end - 1]]
+
+    def string(self, index):
+        # interned, the names a tree holds share one string per spelling
+        offset = self.offsets[index]
+        return sys.intern(self.source[offset:offset + self.lengths[index]].decode())
+
+    def line_text(self, offset):
+        source = self.source
+        line_start = source.rfind(b"\n", 0, offset) + 1
+        line_end = source.find(b"\n", offset)
+        line = source[line_start:] if line_end < 0 else source[line_start:line_end + 1]
+        return line.decode(errors = "replace")
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        # out of range rows raise IndexError when a field is read
+        return Token(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield Token(self, index)
+
+
+# a (start, end) window into a shared token array, blocks are handed down the
+# parser as spans so nested blocks never copy the tokens of their parents
+class TokenSpan:
+    __slots__ = ("tokens", "start", "end", "brackets")
+
+    def __init__(self, tokens, start = 0, end = None, brackets = None):
+        self.tokens = tokens
+        self.start = start
+        self.end = len(tokens) if end is None else end
+        self.brackets = brackets
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        tokens = self.tokens
+        for token_index in range(self.start, self.end):
+            yield tokens[token_index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, end, _ = index.indices(self.end - self.start)
+            return TokenSpan(self.tokens, self.start + start, self.start + max(start, end), self.brackets)
+        if index < 0:
+            index += self.end - self.start
+        if index < 0 or index >= self.end - self.start:
+            raise IndexError("token span index out of range")
+        return self.tokens[self.start + index]
+
+    def __repr__(self):
+        return f"TokenSpan({self.start}, {self.end})"
+
+
+BRACKET_PAIRS = {
+    TOKEN_LPAREN: TOKEN_RPAREN,
+    TOKEN_LBRACKET: TOKEN_RBRACKET,
+    TOKEN_LBRACE: TOKEN_RBRACE,
+    TOKEN_LOBJECT: TOKEN_ROBJECT,
+}
+CLOSING_BRACKETS = {closing: opening for opening, closing in BRACKET_PAIRS.items()}
+
+def build_bracket_index(tokens, start, moduleName):
+    # one pass over the module that maps every bracket token to the index of
+    # its partner (-1 for everything else), all mismatches are reported at once
+    types = tokens.types
+    brackets = array('i', [-1]) * len(tokens)
+    open_brackets = []
+    errors = []
+    for token_index in range(start, len(tokens)):
+        kind = types[token_index]
+        if kind in BRACKET_PAIRS:
+            open_brackets.append(token_index)
+        elif kind in CLOSING_BRACKETS:
+            opening = CLOSING_BRACKETS[kind]
+            if open_brackets and types[open_brackets[-1]] == opening:
+                open_index = open_brackets.pop()
+                brackets[open_index] = token_index
+                brackets[token_index] = open_index
+                continue
+            if any(types[open_index] == opening for open_index in open_brackets):
+                while types[open_brackets[-1]] != opening:
+                    unclosed = open_brackets.pop()
+                    errors.append((f"unclosed '{TOKEN_TEXT[types[unclosed]]}'", tokens[unclosed]))
+                open_index = open_brackets.pop()
+                brackets[open_index] = token_index
+                brackets[token_index] = open_index
+            else:
+                errors.append((f"unmatched '{TOKEN_TEXT[kind]}'", tokens[token_index]))
+    for open_index in open_brackets:
+        errors.append((f"unclosed '{TOKEN_TEXT[types[open_index]]}'", tokens[open_index]))
+
+    if errors:
+        errors.sort(key = lambda error: error[1].start)
+        for message, token in errors:
+            report_compiler_error(message, token, moduleName)
+        sys.exit(1)
+    return brackets
+
+def module_token_span(tokens, moduleName):
+    return TokenSpan(tokens, 0, len(tokens), build_bracket_index(tokens, 0, moduleName))
+
+def skip_to_token(span, token_index, kind):
+    # advances to the next token of this kind at this bracket depth, jumping
+    # over bracketed groups with the bracket index, returns span.end if not found
+    types = span.tokens.types
+    brackets = span.brackets
+    while token_index < span.end:
+        current = types[token_index]
+        if current == kind:
+            return token_index
+        if current in BRACKET_PAIRS:
+            token_index = brackets[token_index]
         token_index += 1
-    
-    if token_index >= len(tokens):
-        print_compiler_error(f"expected '{block_end_char}'", tokens[token_index - 1])
-    
-    if block_token_count != 0:
-        print_compiler_error(f"mismatched '{block_start_char}' and '{block_end_char}'", tokens[token_index])
-    
-    return token_index, block_tokens[1:]
+    return token_index
+
+def extract_block_tokens(span, token_index, block_start_kind, module_name):
+    # returns the index of the closing bracket and a span over the tokens between the brackets
+    tokens = span.tokens
+    if tokens.types[token_index] != block_start_kind:
+        print_compiler_error(f"expected '{TOKEN_TEXT[block_start_kind]}'", tokens[token_index], module_name)
+
+    block_end = span.brackets[token_index]
+    if block_end < 0 or block_end >= span.end:
+        print_compiler_error(f"expected '{TOKEN_TEXT[BRACKET_PAIRS[block_start_kind]]}'", tokens[span.end - 1], module_name)
+
+    return block_end, TokenSpan(tokens, token_index + 1, block_end, span.brackets)
 
+# the walks over nested blocks do not recurse, like the parser a block yields
+# the generator of each block in it in place and the generators are driven
+# from an explicit stack, so the nesting depth is not bound by the Python stack
+
+# the strings of chunks, a generator yielded among them is run in its place
+def flatten_chunks(chunks):
+    stack = [chunks]
+    while stack:
+        chunk = next(stack[-1], None)
+        if chunk is None:
+            stack.pop()
+        elif isinstance(chunk, str):
+            yield chunk
+        else:
+            stack.append(chunk)
+
+# runs steps, each generator it yields is run in turn and what it returns is
+# sent back, returns what steps returns
+def run_steps(steps):
+    stack = [steps]
+    result = None
+    while stack:
+        try:
+            nested = stack[-1].send(result)
+        except StopIteration as stop:
+            stack.pop()
+            result = stop.value
+        else:
+            stack.append(nested)
+            result = None
+    return result
+
+# the indentation of generated C stops growing past C_INDENT_LIMIT blocks, the
+# output of deeply nested code would grow with the square of the depth
+C_INDENT_LIMIT = 32
+
+def c_indent(depth):
+    return "    " * min(depth, C_INDENT_LIMIT)
+
+# the nodes of the tree keep their fields in slots, without a dict per node
 class ExternalFunctionAst:
+    __slots__ = ("parent_ast", "name", "parameters", "return_type")
+
     def __init__(self, parent_ast, name, parameters, return_type):
         self.parent_ast = parent_ast
         self.name = name
@@ -66,41 +559,43 @@ class ExternalFunctionAst:
         return f"function(name={self.name}, parameters={self.parameters}, return_type={self.return_type})"
 
 class ExternBlockAst:
+    __slots__ = ("parent_ast", "functions")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.functions = []
 
     
-    def parse_function(self, tokens, token_index):
+    def parse_function(self, span, token_index):
+        tokens = span.tokens
+        types = tokens.types
         function_name = tokens[token_index].string
-        if token_index + 2 >= len(tokens) or tokens[token_index + 1].string != "(":
+        if token_index + 2 >= span.end or types[token_index + 1] != TOKEN_LPAREN:
             print_compiler_error("expected '('", tokens[token_index], self.parent_ast.module_name)
+        parameters_end = span.brackets[token_index + 1]
         token_index += 2
         parameter_tokens = []
-        while tokens[token_index].string != ")":
-            if tokens[token_index].type == tokenize.NAME:
+        while token_index < parameters_end:
+            if types[token_index] == TOKEN_NAME:
                 parameter_tokens.append(tokens[token_index])
-            elif tokens[token_index].string == "," or tokens[token_index].type == tokenize.COMMENT or tokens[token_index].type == tokenize.NL or tokens[token_index].type == tokenize.NEWLINE:
+            elif types[token_index] == TOKEN_COMMA or types[token_index] == TOKEN_NEWLINE:
                 pass
             else:
                 print_compiler_error(f"unexpected token '{tokens[token_index].string}'", tokens[token_index], self.parent_ast.module_name)
-
             token_index += 1
-            if token_index >= len(tokens):
-                print_compiler_error("expected ')'", tokens[token_index - 1])
 
         token_index += 1
-        if token_index >= len(tokens) or tokens[token_index].string != "->":
+        if token_index >= span.end or types[token_index] != TOKEN_ARROW:
             print_compiler_error("expected '->'", tokens[token_index - 1], self.parent_ast.module_name)
 
         token_index += 1
-        if token_index >= len(tokens) or tokens[token_index].type != tokenize.NAME:
+        if token_index >= span.end or types[token_index] != TOKEN_NAME:
             print_compiler_error("expected return type", tokens[token_index - 1], self.parent_ast.module_name)
         return_type = tokens[token_index].string
 
 
         token_index += 1
-        if token_index >= len(tokens) or (tokens[token_index].type != tokenize.NEWLINE and tokens[token_index].type != tokenize.NL):
+        if token_index >= span.end or types[token_index] != TOKEN_NEWLINE:
             print_compiler_error("expected newline", tokens[token_index - 1], self.parent_ast.module_name)
         
         function = ExternalFunctionAst(self.parent_ast, function_name, parameter_tokens, return_type)
@@ -108,36 +603,55 @@ class ExternBlockAst:
 
         return token_index 
     
-    def parse(self, tokens):
-        token_index = 0
-        while token_index < len(tokens):
-            token = tokens[token_index]
-            if token.type == tokenize.NAME:
-                token_index = self.parse_function(tokens, token_index)
-            elif token.type == tokenize.NEWLINE or token.type == tokenize.NL or token.type == tokenize.COMMENT:
+    def parse(self, span):
+        tokens = span.tokens
+        types = tokens.types
+        token_index = span.start
+        while token_index < span.end:
+            kind = types[token_index]
+            if kind == TOKEN_NAME:
+                token_index = self.parse_function(span, token_index)
+            elif kind == TOKEN_NEWLINE:
                 pass
-            elif token.type == tokenize.ENDMARKER:
+            elif kind == TOKEN_ENDMARKER:
                 break
             else:
-                print_compiler_error(f"unexpected token '{token.string}'", token, self.parent_ast.module_name)
+                print_compiler_error(f"unexpected token '{tokens[token_index].string}'", tokens[token_index], self.parent_ast.module_name)
             token_index += 1
 
 class LoopBlockAst:
+    __slots__ = ("parent_ast", "module_name", "line", "body")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
+        self.line = None
         self.body = None
 
-    def parse(self, tokens):
+    def parse(self, line, span):
+        self.line = line
         self.body = ScopeBlockAst(self)
-        self.body.parse(tokens)
+        yield self.body, span
+
+    def emit_c(self, generator, depth):
+        indent = c_indent(depth)
+        yield f"{indent}for (;;) {{\n"
+        if generator.profile:
+            yield f"{indent}    mur_profile_loops[{generator.profile_loop('loop', self.line)}].iterations++;\n"
+        yield self.body.emit_c(generator, depth + 1)
+        yield f"{indent}}}\n"
+
+    def describe(self):
+        yield "loop:\n"
+        yield self.body.describe()
+        yield "\n"
 
     def __str__(self):
-        result = f"loop:\n"
-        result += f"{self.body}\n"
-        return result        
+        return "".join(flatten_chunks(self.describe()))
 
 class IfBlockAst:
+    __slots__ = ("parent_ast", "module_name", "expression", "body", "elif_blocks", "else_block")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
@@ -147,51 +661,89 @@ class IfBlockAst:
         self.else_block = None
 
 
+    # like every block, yields each scope it opens with its tokens and
+    # resumes once ScopeBlockAst.parse has parsed that scope
     def parse(self, if_expression_tokens, if_block_tokens, elif_blocks, else_block_tokens):
-        self.expression = if_expression_tokens
+        self.expression = ExpressionAst(self)
+        self.expression.parse(if_expression_tokens)
         self.body = ScopeBlockAst(self)
-        self.body.parse(if_block_tokens)
+        yield self.body, if_block_tokens
         
         for elif_expression_tokens, elif_block_tokens in elif_blocks:
-            elif_expression = elif_expression_tokens
+            elif_expression = ExpressionAst(self)
+            elif_expression.parse(elif_expression_tokens)
             elif_body = ScopeBlockAst(self)
-            elif_body.parse(elif_block_tokens)
+            yield elif_body, elif_block_tokens
             self.elif_blocks.append((elif_expression, elif_body))
         
         if else_block_tokens:
             self.else_block = ScopeBlockAst(self)
-            self.else_block.parse(else_block_tokens)
+            yield self.else_block, else_block_tokens
 
+    def emit_c(self, generator, depth):
+        indent = c_indent(depth)
+        yield f"{indent}if ({generator.condition(self.expression)}) {{\n"
+        yield self.body.emit_c(generator, depth + 1)
+        for elif_expression, elif_body in self.elif_blocks:
+            yield f"{indent}}} else if ({generator.condition(elif_expression)}) {{\n"
+            yield elif_body.emit_c(generator, depth + 1)
+        if self.else_block:
+            yield f"{indent}}} else {{\n"
+            yield self.else_block.emit_c(generator, depth + 1)
+        yield f"{indent}}}\n"
 
-    def __str__(self):
-        result = f"if:\n"
-        result += f"{self.body}\n"
+    def describe(self):
+        yield "if:\n"
+        yield self.body.describe()
+        yield "\n"
         for _, elif_body in self.elif_blocks:
-            result += f"elif:\n"
-            result += f"{elif_body}\n"
+            yield "elif:\n"
+            yield elif_body.describe()
+            yield "\n"
         if self.else_block:
-            result += f"else:\n"
-            result += f"{self.else_block}\n"
-        return result
+            yield "else:\n"
+            yield self.else_block.describe()
+            yield "\n"
+
+    def __str__(self):
+        return "".join(flatten_chunks(self.describe()))
 
 class WhileBlockAst:
+    __slots__ = ("parent_ast", "module_name", "line", "expression", "body")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
+        self.line = None
         self.expression = None
         self.body = None
 
-    def parse(self, expression_tokens, body_tokens):
+    def parse(self, line, expression_tokens, body_tokens):
+        self.line = line
         self.body = ScopeBlockAst(self)
-        self.body.parse(body_tokens)
-        self.expression = expression_tokens
+        yield self.body, body_tokens
+        self.expression = ExpressionAst(self)
+        self.expression.parse(expression_tokens)
+
+    def emit_c(self, generator, depth):
+        indent = c_indent(depth)
+        yield f"{indent}while ({generator.condition(self.expression)}) {{\n"
+        if generator.profile:
+            yield f"{indent}    mur_profile_loops[{generator.profile_loop('while', self.line)}].iterations++;\n"
+        yield self.body.emit_c(generator, depth + 1)
+        yield f"{indent}}}\n"
+
+    def describe(self):
+        yield "while:\n"
+        yield self.body.describe()
+        yield "\n"
 
     def __str__(self):
-        result = f"while:\n"
-        result += f"{self.body}\n"
-        return result
+        return "".join(flatten_chunks(self.describe()))
 
 class SwitchBlockAst:
+    __slots__ = ("parent_ast", "module_name", "variable_name", "cases", "default_case", "vname")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
@@ -200,337 +752,1596 @@ class SwitchBlockAst:
         self.default_case = None
         self.vname = None
     
-    def parse(self, vname, tokens):
+    def parse(self, vname, span):
         self.vname = vname
-        token_index = 0
-        tokens = tokens[1:]
+        tokens = span.tokens
+        types = tokens.types
+        token_index = span.start
         while True:
-            if token_index >= len(tokens):
+            if token_index >= span.end:
                 break
-            while tokens[token_index].type == tokenize.NL or tokens[token_index].type == tokenize.NEWLINE or tokens[token_index].type == tokenize.COMMENT:
+            while types[token_index] == TOKEN_NEWLINE:
                 token_index += 1
-                if token_index >= len(tokens):
+                if token_index >= span.end:
                     break
-            if token_index >= len(tokens) or tokens[token_index].string == "}":
-                break            
-            expr_tokens = []
-            while tokens[token_index].string != ":":
-                if tokens[token_index].type == tokenize.NL or tokens[token_index].type == tokenize.NEWLINE:
+            if token_index >= span.end:
+                break
+            expr_start = token_index
+            while types[token_index] != TOKEN_COLON:
+                if types[token_index] == TOKEN_NEWLINE:
                     print_compiler_error("expected ':'", tokens[token_index - 1], self.module_name)
-                if tokens[token_index].type == tokenize.NAME and tokens[token_index].string != "default":
+                if types[token_index] == TOKEN_NAME:
                     print_compiler_error("expected case value to be a constant or constant expression", tokens[token_index], self.module_name)
-                if tokens[token_index].string == "{":
-                    print_compiler_error("expected ':'", tokens[token_index], self.module_name)                
-                expr_tokens.append(tokens[token_index])
+                if types[token_index] == TOKEN_LBRACE:
+                    print_compiler_error("expected ':'", tokens[token_index], self.module_name)
                 token_index += 1
-                if token_index >= len(tokens):
+                if token_index >= span.end:
                     print_compiler_error("expected ':'", tokens[token_index - 1], self.module_name)
-            if len(expr_tokens) == 0:
+            if token_index == expr_start:
                 print_compiler_error("expected case value", tokens[token_index], self.module_name)
-            if token_index + 1 >= len(tokens) or tokens[token_index + 1].string != "{":
+            expr_tokens = TokenSpan(tokens, expr_start, token_index, span.brackets)
+            if token_index + 1 >= span.end or types[token_index + 1] != TOKEN_LBRACE:
                 print_compiler_error("expected '{'", tokens[token_index], self.module_name)
             token_index += 1
-            token_index, block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
-            expr_block = ExpressionAst(self)
-            expr_block.parse(expr_tokens)
+            token_index, block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
             body_block = ScopeBlockAst(self)
-            body_block.parse(block_tokens)
-            self.cases.append((expr_block, body_block))           
+            yield body_block, block_tokens
+            if expr_tokens.end == expr_start + 1 and types[expr_start] == TOKEN_DEFAULT:
+                if self.default_case is not None:
+                    print_compiler_error("duplicate default case", tokens[expr_start], self.module_name)
+                self.default_case = body_block
+            else:
+                expr_block = ExpressionAst(self)
+                expr_block.parse(expr_tokens)
+                if expr_block.expression[0] > EXPR_STRING:
+                    print_compiler_error("expected case value to be a constant or constant expression", tokens[expr_start], self.module_name)
+                self.cases.append((expr_block, body_block))
             token_index += 1
 
-            
+    def emit_c(self, generator, depth):
+        indent = c_indent(depth)
+        value = generator.variable(self.vname)
+        strategy, cases = generator.switch_strategy(self)
+        if strategy == SWITCH_CHAIN:
+            # cases are tested in order, the first equal one runs
+            keyword = "if"
+            for case_expression, case_body in self.cases:
+                yield f"{indent}{keyword} (mur_equals({value}, {generator.expression(case_expression)})) {{\n"
+                yield case_body.emit_c(generator, depth + 1)
+                keyword = "} else if"
+            if self.default_case is not None:
+                yield f"{indent}{'} else {' if self.cases else '{'}\n"
+                yield self.default_case.emit_c(generator, depth + 1)
+            if self.cases or self.default_case is not None:
+                yield f"{indent}}}\n"
+            return
+
+        # the dispatch only jumps to the case bodies, which follow it outside
+        # of the C switch so break and continue still reach the loop around
+        label = generator.new_label("mur_switch")
+        yield f"{indent}{{\n"
+        if strategy == SWITCH_DENSE:
+            yield f"{indent}    int64_t mur_key;\n"
+            yield f"{indent}    if (mur_int_key({value}, &mur_key)) {{\n"
+            yield f"{indent}        switch (mur_key) {{\n"
+            for case_index, (key, _) in enumerate(cases):
+                yield f"{indent}        case {generator.c_integer(key)}: goto {label}_{case_index};\n"
+            yield f"{indent}        }}\n"
+            yield f"{indent}    }}\n"
+        else:
+            yield f"{indent}    int mur_case = -1;\n"
+            if strategy == SWITCH_SEARCH:
+                keys = ", ".join(generator.c_integer(key) for key, _ in cases)
+                yield f"{indent}    static const int64_t mur_keys[] = {{{keys}}};\n"
+                yield f"{indent}    int64_t mur_key;\n"
+                yield f"{indent}    if (mur_int_key({value}, &mur_key)) {{\n"
+                yield f"{indent}        mur_case = mur_search_int(mur_keys, {len(cases)}, mur_key);\n"
+                yield f"{indent}    }}\n"
+            else:
+                hashes = ", ".join(f"UINT64_C({string_hash(key)})" for key, _ in cases)
+                strings = ", ".join(generator.c_string(key) for key, _ in cases)
+                yield f"{indent}    static const uint64_t mur_hashes[] = {{{hashes}}};\n"
+                yield f"{indent}    static const char *const mur_strings[] = {{{strings}}};\n"
+                yield f"{indent}    if ({value}.type == MUR_STRING) {{\n"
+                yield f"{indent}        mur_case = mur_search_hash(mur_hashes, {len(cases)}, mur_hash_string({value}.as.s));\n"
+                yield f"{indent}        if (mur_case >= 0 && strcmp(mur_strings[mur_case], {value}.as.s) != 0) {{\n"
+                yield f"{indent}            mur_case = -1;\n"
+                yield f"{indent}        }}\n"
+                yield f"{indent}    }}\n"
+            yield f"{indent}    switch (mur_case) {{\n"
+            for case_index in range(len(cases)):
+                yield f"{indent}    case {case_index}: goto {label}_{case_index};\n"
+            yield f"{indent}    }}\n"
+        yield f"{indent}}}\n"
+        yield f"{indent}goto {label}_{'default' if self.default_case is not None else 'end'};\n"
+        for case_index, (_, case_body) in enumerate(cases):
+            yield f"{indent}{label}_{case_index}: {{\n"
+            yield case_body.emit_c(generator, depth + 1)
+            yield f"{indent}}}\n"
+            yield f"{indent}goto {label}_end;\n"
+        if self.default_case is not None:
+            yield f"{indent}{label}_default: {{\n"
+            yield self.default_case.emit_c(generator, depth + 1)
+            yield f"{indent}}}\n"
+        yield f"{indent}{label}_end:;\n"
+
+    def describe(self):
+        yield f"switch({self.vname}):\n"
+        yield f"num_cases: {len(self.cases)}\n"
 
     def __str__(self):
-        result = f"switch({self.vname}):\n"
-        result += f"num_cases: {len(self.cases)}\n"
-        return result
+        return "".join(flatten_chunks(self.describe()))
     
+# kinds of expression nodes, a node is a tuple starting with its kind:
+#   (EXPR_NIL,) (EXPR_INT, value) (EXPR_FLOAT, value) (EXPR_STRING, bytes)
+#   (EXPR_NAME, name, token) (EXPR_UNARY, operator, operand)
+#   (EXPR_BINARY, operator, left, right) (EXPR_CALL, callee, arguments, token)
+#   (EXPR_INDEX, value, key) (EXPR_FIELD, value, name, token)
+#   (EXPR_ARRAY, items) (EXPR_OBJECT, keys, methods, values)
+#   (EXPR_REFERENCE, reference) a static path the inliner already resolved
+# the kinds up to EXPR_STRING are constants
+EXPR_NIL = 0
+EXPR_INT = 1
+EXPR_FLOAT = 2
+EXPR_STRING = 3
+EXPR_NAME = 4
+EXPR_UNARY = 5
+EXPR_BINARY = 6
+EXPR_CALL = 7
+EXPR_INDEX = 8
+EXPR_FIELD = 9
+EXPR_ARRAY = 10
+EXPR_OBJECT = 11
+EXPR_REFERENCE = 12
+
+STATEMENT_EXPRESSION = 0
+STATEMENT_ASSIGNMENT = 1
+STATEMENT_RETURN = 2
+STATEMENT_BREAK = 3
+STATEMENT_CONTINUE = 4
+
+# binding power of every binary operator, operators of equal power group left
+BINARY_PRECEDENCE = {
+    "||": 1,
+    "&&": 2,
+    "|": 3,
+    "^": 4,
+    "&": 5,
+    "==": 6,
+    "!=": 6,
+    "<": 7,
+    "<=": 7,
+    ">": 7,
+    ">=": 7,
+    "<<": 8,
+    ">>": 8,
+    "+": 9,
+    "-": 9,
+    "*": 10,
+    "/": 10,
+    "%": 10,
+}
+UNARY_OPERATORS = {"-", "!", "~", "+"}
+# compound assignments name the binary operator they apply
+ASSIGNMENT_OPERATORS = {"=": None, "+=": "+", "-=": "-", "*=": "*", "/=": "/", "%=": "%"}
+CONSTANT_NAMES = {"true": (EXPR_INT, 1), "false": (EXPR_INT, 0), "nil": (EXPR_NIL,)}
+
+EXPR_TRUE = (EXPR_INT, 1)
+EXPR_FALSE = (EXPR_INT, 0)
+
+
+def wrap_int64(value):
+    return (value + 0x8000000000000000) % 0x10000000000000000 - 0x8000000000000000
+
+def constant_truthy(node):
+    kind = node[0]
+    if kind == EXPR_NIL:
+        return False
+    if kind == EXPR_STRING:
+        return node[1][:1] not in (b"", b"\0")
+    return bool(node[1])
+
+def constant_equals(left, right):
+    if EXPR_INT <= left[0] <= EXPR_FLOAT and EXPR_INT <= right[0] <= EXPR_FLOAT:
+        if left[0] != right[0]:
+            return float(left[1]) == float(right[1])
+        return left[1] == right[1]
+    if left[0] != right[0]:
+        return False
+    return left[0] == EXPR_NIL or left[1] == right[1]
+
+def fold_unary(operator, operand):
+    # constant operands are folded with the semantics of the runtime
+    kind = operand[0]
+    if operator == "+":
+        return operand
+    if operator == "!" and kind <= EXPR_STRING:
+        return EXPR_FALSE if constant_truthy(operand) else EXPR_TRUE
+    if operator == "-" and kind == EXPR_INT:
+        return (EXPR_INT, wrap_int64(-operand[1]))
+    if operator == "-" and kind == EXPR_FLOAT:
+        return (EXPR_FLOAT, -operand[1])
+    if operator == "~" and kind == EXPR_INT:
+        return (EXPR_INT, ~operand[1])
+    return (EXPR_UNARY, operator, operand)
+
+def fold_binary(operator, left, right):
+    left_kind = left[0]
+    right_kind = right[0]
+    if operator == "&&" or operator == "||":
+        # a constant left side decides whether the right side runs at all
+        if left_kind <= EXPR_STRING:
+            if constant_truthy(left) != (operator == "&&"):
+                return EXPR_TRUE if operator == "||" else EXPR_FALSE
+            if right_kind <= EXPR_STRING:
+                return EXPR_TRUE if constant_truthy(right) else EXPR_FALSE
+        return (EXPR_BINARY, operator, left, right)
+    if left_kind > EXPR_STRING or right_kind > EXPR_STRING:
+        return (EXPR_BINARY, operator, left, right)
+    # C strings end at the first NUL, those are left to the runtime
+    if (left_kind == EXPR_STRING and b"\0" in left[1]) or (right_kind == EXPR_STRING and b"\0" in right[1]):
+        return (EXPR_BINARY, operator, left, right)
+
+    if operator == "==":
+        return EXPR_TRUE if constant_equals(left, right) else EXPR_FALSE
+    if operator == "!=":
+        return EXPR_FALSE if constant_equals(left, right) else EXPR_TRUE
+
+    a = left[1] if left_kind != EXPR_NIL else None
+    b = right[1] if right_kind != EXPR_NIL else None
+    if left_kind == EXPR_INT and right_kind == EXPR_INT:
+        if operator == "+":
+            return (EXPR_INT, wrap_int64(a + b))
+        if operator == "-":
+            return (EXPR_INT, wrap_int64(a - b))
+        if operator == "*":
+            return (EXPR_INT, wrap_int64(a * b))
+        if operator == "/" and b != 0:
+            # C division truncates towards zero
+            quotient = abs(a) // abs(b)
+            return (EXPR_INT, wrap_int64(quotient if (a < 0) == (b < 0) else -quotient))
+        if operator == "%" and b != 0:
+            remainder = abs(a) % abs(b)
+            return (EXPR_INT, remainder if a >= 0 else -remainder)
+        if operator == "&":
+            return (EXPR_INT, a & b)
+        if operator == "|":
+            return (EXPR_INT, a | b)
+        if operator == "^":
+            return (EXPR_INT, a ^ b)
+        if operator == "<<":
+            return (EXPR_INT, wrap_int64(a << (b & 63)))
+        if operator == ">>":
+            return (EXPR_INT, a >> (b & 63))
+    numbers = EXPR_INT <= left_kind <= EXPR_FLOAT and EXPR_INT <= right_kind <= EXPR_FLOAT
+    if numbers and operator in ("+", "-", "*", "/"):
+        a = float(a)
+        b = float(b)
+        if operator == "+":
+            value = a + b
+        elif operator == "-":
+            value = a - b
+        elif operator == "*":
+            value = a * b
+        elif b != 0.0:
+            value = a / b
+        else:
+            value = math.inf
+        # infinities and NaN are left to the C compiler
+        if math.isfinite(value):
+            return (EXPR_FLOAT, value)
+    elif left_kind == EXPR_STRING and right_kind == EXPR_STRING and operator == "+":
+        return (EXPR_STRING, a + b)
+    if (numbers or (left_kind == EXPR_STRING and right_kind == EXPR_STRING)) and operator in ("<", "<=", ">", ">="):
+        if numbers and left_kind != right_kind:
+            a = float(a)
+            b = float(b)
+        if operator == "<":
+            result = a < b
+        elif operator == "<=":
+            result = a <= b
+        elif operator == ">":
+            result = a > b
+        else:
+            result = a >= b
+        return EXPR_TRUE if result else EXPR_FALSE
+    return (EXPR_BINARY, operator, left, right)
+
+def skip_newlines(span, index):
+    types = span.tokens.types
+    while index < span.end and types[index] == TOKEN_NEWLINE:
+        index += 1
+    return index
+
 class ExpressionAst:
+    __slots__ = ("parent_ast", "module_name", "expression", "tokens", "kind", "target", "operator")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
         self.expression = None
+        self.tokens = None
+        # a statement line is an expression, an assignment to target or one
+        # of return, break and continue
+        self.kind = STATEMENT_EXPRESSION
+        self.target = None
+        self.operator = None
 
-    def parse(self, tokens):
-        pass
+    def error(self, message, token_index):
+        tokens = self.tokens.tokens
+        print_compiler_error(message, tokens[min(token_index, len(tokens) - 1)], self.module_name)
+
+    def parse(self, span):
+        self.tokens = span
+        self.expression = self.parse_complete(span)
+
+    def parse_statement(self, span):
+        self.tokens = span
+        tokens = span.tokens
+        types = tokens.types
+        start = span.start
+        keyword = tokens.string(start)
+        if keyword == "return":
+            self.kind = STATEMENT_RETURN
+            if span.end > start + 1:
+                self.expression = self.parse_complete(TokenSpan(tokens, start + 1, span.end, span.brackets))
+            return
+        if (keyword == "break" or keyword == "continue") and span.end == start + 1:
+            self.kind = STATEMENT_BREAK if keyword == "break" else STATEMENT_CONTINUE
+            return
+        if keyword == "var":
+            if start + 1 >= span.end or types[start + 1] != TOKEN_NAME:
+                self.error("expected variable name", start)
+            start += 1
+            if span.end == start + 1:
+                self.kind = STATEMENT_ASSIGNMENT
+                self.target = (EXPR_NAME, tokens.string(start), start)
+                self.expression = (EXPR_NIL,)
+                return
+
+        # the first assignment operator outside of brackets splits the line
+        brackets = span.brackets
+        assignment = start
+        while assignment < span.end:
+            kind = types[assignment]
+            if kind in BRACKET_PAIRS:
+                assignment = brackets[assignment]
+            elif kind == TOKEN_OP and tokens.string(assignment) in ASSIGNMENT_OPERATORS:
+                break
+            assignment += 1
+
+        if assignment == span.end:
+            if keyword == "var":
+                self.error("expected '='", start + 1)
+            self.expression = self.parse_complete(TokenSpan(tokens, start, span.end, brackets))
+            return
+        if keyword == "var" and assignment != start + 1:
+            self.error("expected '='", start + 1)
+        if assignment + 1 >= span.end:
+            self.error("expected expression", assignment)
+        target = self.parse_complete(TokenSpan(tokens, start, assignment, brackets))
+        if target[0] != EXPR_NAME and target[0] != EXPR_FIELD and target[0] != EXPR_INDEX:
+            self.error("cannot assign to this expression", start)
+        self.kind = STATEMENT_ASSIGNMENT
+        self.target = target
+        self.operator = ASSIGNMENT_OPERATORS[tokens.string(assignment)]
+        self.expression = self.parse_complete(TokenSpan(tokens, assignment + 1, span.end, brackets))
+
+    def parse_complete(self, span):
+        index = skip_newlines(span, span.start)
+        if index >= span.end:
+            self.error("expected expression", max(span.start - 1, 0))
+        node, index = self.parse_expression(span, index, 0)
+        index = skip_newlines(span, index)
+        if index < span.end:
+            self.error(f"unexpected token '{span.tokens.string(index)}'", index)
+        return node
+
+    def parse_expression(self, span, index, min_precedence):
+        # Pratt parser, the loop takes every binary operator that binds
+        # tighter than the operator on the left of this operand
+        tokens = span.tokens
+        types = tokens.types
+        end = span.end
+        left, index = self.parse_prefix(span, index)
+        while True:
+            while index < end and types[index] == TOKEN_NEWLINE:
+                index += 1
+            if index >= end or types[index] != TOKEN_OP:
+                return left, index
+            operator = tokens.string(index)
+            precedence = BINARY_PRECEDENCE.get(operator)
+            if precedence is None or precedence <= min_precedence:
+                return left, index
+            right, index = self.parse_expression(span, index + 1, precedence)
+            left = fold_binary(operator, left, right)
+
+    def parse_prefix(self, span, index):
+        tokens = span.tokens
+        types = tokens.types
+        while index < span.end and types[index] == TOKEN_NEWLINE:
+            index += 1
+        if index >= span.end:
+            self.error("expected expression", index - 1)
+        kind = types[index]
+        if kind == TOKEN_OP:
+            operator = tokens.string(index)
+            if operator not in UNARY_OPERATORS:
+                self.error(f"unexpected token '{operator}'", index)
+            operand, index = self.parse_prefix(span, index + 1)
+            return fold_unary(operator, operand), index
+
+        brackets = span.brackets
+        if kind == TOKEN_NAME:
+            name = tokens.string(index)
+            node = CONSTANT_NAMES.get(name) or (EXPR_NAME, name, index)
+            index += 1
+        elif kind == TOKEN_NUMBER:
+            text = tokens.string(index)
+            if text[:2] in ("0x", "0X"):
+                node = (EXPR_INT, int(text, 16))
+            elif "." in text or "e" in text or "E" in text:
+                node = (EXPR_FLOAT, float(text))
+            else:
+                node = (EXPR_INT, int(text))
+            if node[0] == EXPR_INT and node[1] > 0xFFFFFFFFFFFFFFFF:
+                self.error("integer constant is too large", index)
+            if node[0] == EXPR_INT:
+                node = (EXPR_INT, wrap_int64(node[1]))
+            index += 1
+        elif kind == TOKEN_STRING:
+            text = tokens.string(index)
+            node = (EXPR_STRING, codecs.escape_decode(text[1:-1].encode())[0])
+            index += 1
+        elif kind == TOKEN_LPAREN:
+            close = brackets[index]
+            node = self.parse_complete(TokenSpan(tokens, index + 1, close, brackets))
+            index = close + 1
+        elif kind == TOKEN_LBRACKET:
+            items, index = self.parse_list(span, index)
+            node = (EXPR_ARRAY, items)
+        elif kind == TOKEN_LOBJECT:
+            node = self.parse_object(span, index)
+            index = brackets[index] + 1
+        else:
+            self.error(f"unexpected token '{tokens.string(index)}'", index)
+
+        while index < span.end:
+            kind = types[index]
+            if kind == TOKEN_LPAREN:
+                call_index = index
+                arguments, index = self.parse_list(span, index)
+                node = (EXPR_CALL, node, arguments, call_index)
+            elif kind == TOKEN_LBRACKET:
+                close = brackets[index]
+                node = (EXPR_INDEX, node, self.parse_complete(TokenSpan(tokens, index + 1, close, brackets)))
+                index = close + 1
+            elif kind == TOKEN_DOT:
+                if index + 1 >= span.end or types[index + 1] != TOKEN_NAME:
+                    self.error("expected field name after '.'", index)
+                node = (EXPR_FIELD, node, tokens.string(index + 1), index + 1)
+                index += 2
+            else:
+                break
+        return node, index
+
+    def parse_list(self, span, open_index):
+        # comma separated expressions between a pair of brackets
+        tokens = span.tokens
+        types = tokens.types
+        close = span.brackets[open_index]
+        inner = TokenSpan(tokens, open_index + 1, close, span.brackets)
+        items = []
+        index = skip_newlines(inner, inner.start)
+        while index < close:
+            item, index = self.parse_expression(inner, index, 0)
+            items.append(item)
+            index = skip_newlines(inner, index)
+            if index < close:
+                if types[index] != TOKEN_COMMA:
+                    self.error("expected ','", index)
+                index = skip_newlines(inner, index + 1)
+        return tuple(items), close + 1
+
+    def parse_object(self, span, open_index):
+        tokens = span.tokens
+        types = tokens.types
+        close = span.brackets[open_index]
+        inner = TokenSpan(tokens, open_index + 1, close, span.brackets)
+        keys = []
+        methods = []
+        values = []
+        index = skip_newlines(inner, inner.start)
+        while index < close:
+            method = types[index] == TOKEN_AT
+            if method:
+                index += 1
+            if index >= close or types[index] != TOKEN_NAME:
+                self.error("expected field name", index)
+            key = tokens.string(index)
+            if key in keys:
+                self.error(f"duplicate field '{key}'", index)
+            index += 1
+            if index >= close or types[index] != TOKEN_COLON:
+                self.error("expected ':'", index)
+            value, index = self.parse_expression(inner, index + 1, 0)
+            keys.append(key)
+            methods.append(method)
+            values.append(value)
+            index = skip_newlines(inner, index)
+            if index < close:
+                if types[index] != TOKEN_COMMA:
+                    self.error("expected ','", index)
+                index = skip_newlines(inner, index + 1)
+        return (EXPR_OBJECT, tuple(keys), tuple(methods), tuple(values))
+
+    def emit_c(self, generator, depth):
+        yield f"{c_indent(depth)}{generator.statement(self)}\n"
+
+    def describe(self):
+        yield "expression:\n"
 
     def __str__(self):
-        result = f"expression:\n"
-        return result
+        return "".join(flatten_chunks(self.describe()))
 
 class ScopeBlockAst:
+    __slots__ = ("parent_ast", "module_name", "statements")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
         self.statements = []
     
-    def parse_if_statement(self, tokens, token_index):
+    def parse_if_statement(self, span, token_index):
+        tokens = span.tokens
+        types = tokens.types
         token_index += 1
-        if_expression_tokens = []
-        while tokens[token_index].string != "{":
-            if_expression_tokens.append(tokens[token_index])
-            token_index += 1
-            if token_index >= len(tokens):
-                print_compiler_error("expected '{'", tokens[token_index - 1], self.parent_ast.module_name)
-        token_index, if_block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
+        expression_start = token_index
+        token_index = skip_to_token(span, token_index, TOKEN_LBRACE)
+        if token_index >= span.end:
+            print_compiler_error("expected '{'", tokens[token_index - 1], self.parent_ast.module_name)
+        if_expression_tokens = TokenSpan(tokens, expression_start, token_index, span.brackets)
+        token_index, if_block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
 
         elif_blocks = []
-        while token_index + 1 < len(tokens) and tokens[token_index + 1].string == "elif":
+        while token_index + 1 < span.end and types[token_index + 1] == TOKEN_ELIF:
             token_index += 2
-            elif_expression_tokens = []
-            while tokens[token_index].string != "{":
-                elif_expression_tokens.append(tokens[token_index])
-                token_index += 1
-                if token_index >= len(tokens):
-                    print_compiler_error("expected '{'", tokens[token_index - 1], self.parent_ast.module_name)
-            token_index, elif_block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
-            elif_blocks.append((elif_expression_tokens, elif_block_tokens))          
-                
+            expression_start = token_index
+            token_index = skip_to_token(span, token_index, TOKEN_LBRACE)
+            if token_index >= span.end:
+                print_compiler_error("expected '{'", tokens[token_index - 1], self.parent_ast.module_name)
+            elif_expression_tokens = TokenSpan(tokens, expression_start, token_index, span.brackets)
+            token_index, elif_block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
+            elif_blocks.append((elif_expression_tokens, elif_block_tokens))
 
         else_block_tokens = None
-        if token_index + 1 < len(tokens) and tokens[token_index + 1].string == "else":
-            if token_index + 2 >= len(tokens) or tokens[token_index + 2].string != "{":
+        if token_index + 1 < span.end and types[token_index + 1] == TOKEN_ELSE:
+            if token_index + 2 >= span.end or types[token_index + 2] != TOKEN_LBRACE:
                 print_compiler_error("expected '{'", tokens[token_index + 1], self.parent_ast.module_name)
-            token_index += 2                
-            token_index, else_block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
+            token_index += 2
+            token_index, else_block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
 
         # self.statements.append(("if", if_expression_tokens, if_block_tokens, elif_blocks, else_block_tokens))
         if_block = IfBlockAst(self)
-        if_block.parse(if_expression_tokens, if_block_tokens, elif_blocks, else_block_tokens)
         self.statements.append(if_block)
-        return token_index
+        return token_index, if_block.parse(if_expression_tokens, if_block_tokens, elif_blocks, else_block_tokens)
 
-    def parse_while_statement(self, tokens, token_index):
+    def parse_while_statement(self, span, token_index):
+        tokens = span.tokens
+        line = tokens.lines[token_index]
         token_index += 1
-        while_expression_tokens = []
-        while tokens[token_index].string != "{":
-            while_expression_tokens.append(tokens[token_index])
-            token_index += 1
-            if token_index >= len(tokens):
-                print_compiler_error("expected '{'", tokens[token_index - 1], self.parent_ast.module_name)
-        token_index, while_block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
+        expression_start = token_index
+        token_index = skip_to_token(span, token_index, TOKEN_LBRACE)
+        if token_index >= span.end:
+            print_compiler_error("expected '{'", tokens[token_index - 1], self.parent_ast.module_name)
+        while_expression_tokens = TokenSpan(tokens, expression_start, token_index, span.brackets)
+        token_index, while_block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
         while_block = WhileBlockAst(self)
-        while_block.parse(while_expression_tokens, while_block_tokens)
         self.statements.append(while_block)
-        return token_index
-        
-    def parse_loop_statement(self, tokens, token_index):
-        if token_index + 1 > len(tokens) or tokens[token_index + 1].string != "{":
+        return token_index, while_block.parse(line, while_expression_tokens, while_block_tokens)
+
+    def parse_loop_statement(self, span, token_index):
+        tokens = span.tokens
+        if token_index + 1 >= span.end or tokens.types[token_index + 1] != TOKEN_LBRACE:
             print_compiler_error("expected '{'", tokens[token_index], self.parent_ast.module_name)
+        line = tokens.lines[token_index]
         token_index += 1
-        token_index, loop_block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
+        token_index, loop_block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
         loop_block = LoopBlockAst(self)
-        loop_block.parse(loop_block_tokens)
         self.statements.append(loop_block)
-        return token_index
+        return token_index, loop_block.parse(line, loop_block_tokens)
 
-    def parse_switch_statement(self, tokens, token_index):
-        if token_index + 1 >= len(tokens) or tokens[token_index + 1].type != tokenize.NAME:
+    def parse_switch_statement(self, span, token_index):
+        tokens = span.tokens
+        types = tokens.types
+        if token_index + 1 >= span.end or types[token_index + 1] != TOKEN_NAME:
             print_compiler_error("expected switch variable", tokens[token_index], self.parent_ast.module_name)
 
-        if token_index + 2 >= len(tokens) or tokens[token_index + 2].string != "{":
+        if token_index + 2 >= span.end or types[token_index + 2] != TOKEN_LBRACE:
             print_compiler_error("expected '{'", tokens[token_index], self.parent_ast.module_name)
         token_index += 2
 
-        variable_name = tokens[token_index - 2].string
-        token_index, switch_block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
+        variable_name = tokens[token_index - 1].string
+        token_index, switch_block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
         switch_block = SwitchBlockAst(self)
-        switch_block.parse(variable_name, switch_block_tokens)
         self.statements.append(switch_block)
-        return token_index
+        return token_index, switch_block.parse(variable_name, switch_block_tokens)
+
+    # nested blocks do not recurse, every open scope keeps its parse steps on
+    # an explicit stack, so the nesting depth is not bound by the Python stack
+    def parse(self, span):
+        stack = [self.parse_steps(span)]
+        while stack:
+            opened = next(stack[-1], None)
+            if opened is None:
+                stack.pop()
+            else:
+                scope, scope_span = opened
+                stack.append(scope.parse_steps(scope_span))
 
-    def parse(self, tokens):
-        token_index = 0
-        while token_index < len(tokens):
-            token = tokens[token_index]
-            if token.type == tokenize.NEWLINE or token.type == tokenize.NL or token.type == tokenize.COMMENT:
+    # yields every scope opened by a block statement, which is parsed before
+    # the statements after it
+    def parse_steps(self, span):
+        tokens = span.tokens
+        types = tokens.types
+        brackets = span.brackets
+        token_index = span.start
+        while token_index < span.end:
+            kind = types[token_index]
+            if kind == TOKEN_NEWLINE:
                 pass
-            elif token.type == tokenize.ENDMARKER:
+            elif kind == TOKEN_ENDMARKER:
                 break
-            elif token.type == tokenize.NAME:
-                if token.string == "if":
-                    token_index = self.parse_if_statement(tokens, token_index)
-                elif token.string == "while":
-                    token_index = self.parse_while_statement(tokens, token_index)
-                elif token.string == "loop":
-                    token_index = self.parse_loop_statement(tokens, token_index)
-                elif token.string == "switch":
-                    token_index = self.parse_switch_statement(tokens, token_index)
-                else:
-                    expression_tokens = []
-                    while tokens[token_index].type != tokenize.NEWLINE and tokens[token_index].type != tokenize.NL:
-                        expression_tokens.append(tokens[token_index])
-                        token_index += 1
-                        if token_index >= len(tokens):
-                            print_compiler_error("expected newline", tokens[token_index - 1], self.parent_ast.module_name)
-                    token_index -= 1
-                    expression = ExpressionAst(self)
-                    expression.parse(expression_tokens)
-                    self.statements.append(expression)
+            elif kind == TOKEN_IF:
+                token_index, steps = self.parse_if_statement(span, token_index)
+                yield from steps
+            elif kind == TOKEN_WHILE:
+                token_index, steps = self.parse_while_statement(span, token_index)
+                yield from steps
+            elif kind == TOKEN_LOOP:
+                token_index, steps = self.parse_loop_statement(span, token_index)
+                yield from steps
+            elif kind == TOKEN_SWITCH:
+                token_index, steps = self.parse_switch_statement(span, token_index)
+                yield from steps
+            elif kind == TOKEN_NAME:
+                expression_start = token_index
+                while types[token_index] != TOKEN_NEWLINE:
+                    # a bracketed group may span several lines
+                    if types[token_index] in BRACKET_PAIRS:
+                        token_index = brackets[token_index]
+                    token_index += 1
+                    if token_index >= span.end:
+                        print_compiler_error("expected newline", tokens[token_index - 1], self.parent_ast.module_name)
+                expression = ExpressionAst(self)
+                expression.parse_statement(TokenSpan(tokens, expression_start, token_index, brackets))
+                self.statements.append(expression)
+                token_index -= 1
             else:
-                print_compiler_error(f"unexpected token '{token.string}'", token, self.parent_ast.module_name)
+                print_compiler_error(f"unexpected token '{tokens[token_index].string}'", tokens[token_index], self.parent_ast.module_name)
             token_index += 1
 
-    def __str__(self):
-        result = f"scope:\n"
+    def emit_c(self, generator, depth):
         for statement in self.statements:
-            result += f"{statement}\n"
-        return result
+            yield statement.emit_c(generator, depth)
+
+    def describe(self):
+        yield "scope:\n"
+        for statement in self.statements:
+            yield statement.describe()
+            yield "\n"
+
+    def __str__(self):
+        return "".join(flatten_chunks(self.describe()))
 
 class FunctionBlockAst:
+    __slots__ = ("parent_ast", "module_name", "name", "parameters", "span", "parsed_body")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
         self.name = None
         self.parameters = []
-        self.body = None
+        # the tokens of the body, parsed into parsed_body on first use when
+        # the function is parsed lazily
+        self.span = None
+        self.parsed_body = None
 
 
-    def parse(self, name, parameters, tokens):
+    def parse(self, name, parameters, span, lazy = False):
         self.name = name
         self.parameters = parameters
-        self.body = ScopeBlockAst(self)
-        self.body.parse(tokens)
+        self.span = span
+        if not lazy:
+            self.parse_body()
+
+    def parse_body(self):
+        body = ScopeBlockAst(self)
+        body.parse(self.span)
+        self.parsed_body = body
+
+    @property
+    def body(self):
+        if self.parsed_body is None:
+            with self.parent_ast.parent_ast.session.phase("lazy parse body", self.module_name):
+                self.parse_body()
+        return self.parsed_body
+
+    def emit_c(self, generator):
+        generator.begin_function(self)
+        # the body decides the inline caches declared ahead of it
+        body = list(flatten_chunks(generator.function_body(self).emit_c(generator, 1)))
+        yield f"{generator.function_signature(self)} {{\n"
+        if generator.caches:
+            yield f"    static mur_cache {', '.join(generator.caches)};\n"
+        for index, shape in enumerate(generator.storages):
+            yield f"    {generator.shape_name(shape)}_object mur_storage_{index};\n"
+        if id(self) in generator.arena_functions:
+            yield "    mur_arena mur_frame = MUR_ARENA_INIT;\n"
+        for local in generator.locals:
+            if local not in self.parameters:
+                yield f"    mur_value {generator.variable(local)} = mur_nil();\n"
+        if generator.profile:
+            yield "    mur_profile_frame mur_profile_call;\n"
+            yield f"    mur_profile_enter(&mur_profile_call, {generator.profile_functions[id(self)]});\n"
+        yield from body
+        if id(self) in generator.arena_functions:
+            yield "    mur_arena_release(&mur_frame);\n"
+        if generator.profile:
+            yield "    mur_profile_leave(&mur_profile_call);\n"
+        yield "    return mur_nil();\n}\n\n"
+
+    def describe(self):
+        yield f"function({self.name}):\n"
+        yield f"parameters: {self.parameters}\n"
+        yield "body:\n"
+        yield self.parsed_body.describe() if self.parsed_body is not None else "not parsed"
+        yield "\n"
 
-    
     def __str__(self) -> str:
-        result = f"function({self.name}):\n"
-        result += f"parameters: {self.parameters}\n"
-        result += f"body:\n"
-        result += f"{self.body}\n"
-        return result
+        return "".join(flatten_chunks(self.describe()))
 
 class NamespaceBlockAst:
+    __slots__ = ("parent_ast", "module_name", "functions", "name", "span")
+
     def __init__(self, parent_ast):
         self.parent_ast = parent_ast
         self.module_name = parent_ast.module_name
         self.functions = {}
         self.name = None
+        self.span = None
+
+    def source(self):
+        return self.span.tokens.span_source(self.span.start, self.span.end)
 
-    def parse_function(self, tokens, token_index):
+    def relocate(self, span):
+        # moves the block onto span, the same source in a new token table, the
+        # spans, token indices and lines in the tree are shifted to match it
+        shift = span.start - self.span.start
+        line_shift = span.tokens.lines[span.start] - self.span.tokens.lines[self.span.start]
+        moved = lambda old: TokenSpan(span.tokens, old.start + shift, old.end + shift, span.brackets)
+        self.span = span
+        for function in self.functions.values():
+            function.span = moved(function.span)
+            if function.parsed_body is None:
+                continue
+            expressions = []
+            for statement in scope_statements(function.parsed_body):
+                if isinstance(statement, ExpressionAst):
+                    expressions.append(statement)
+                elif isinstance(statement, SwitchBlockAst):
+                    expressions.extend(case_expression for case_expression, _ in statement.cases)
+                elif isinstance(statement, (WhileBlockAst, LoopBlockAst)):
+                    statement.line += line_shift
+            for expression in expressions:
+                expression.tokens = moved(expression.tokens)
+                if expression.expression is not None:
+                    expression.expression = shift_tokens(expression.expression, shift)
+                if expression.target is not None:
+                    expression.target = shift_tokens(expression.target, shift)
+
+    def parse_function(self, span, token_index):
+        tokens = span.tokens
+        types = tokens.types
         function_name = tokens[token_index].string
 
-        if token_index + 2 >= len(tokens) or tokens[token_index + 1].string != "(":            
+        if token_index + 2 >= span.end or types[token_index + 1] != TOKEN_LPAREN:
             print_compiler_error("expected '('", tokens[token_index], self.parent_ast.module_name)
+        parameters_end = span.brackets[token_index + 1]
         token_index += 2
-    
+
         parameter_tokens = []
-        while tokens[token_index].string != ")":
-            if tokens[token_index].type == tokenize.NAME:
+        while token_index < parameters_end:
+            if types[token_index] == TOKEN_NAME:
                 parameter_tokens.append(tokens[token_index].string)
-            elif tokens[token_index].string == "," or tokens[token_index].type == tokenize.COMMENT or tokens[token_index].type == tokenize.NL or tokens[token_index].type == tokenize.NEWLINE:
+            elif types[token_index] == TOKEN_COMMA or types[token_index] == TOKEN_NEWLINE:
                 pass
             else:
                 print_compiler_error(f"unexpected token '{tokens[token_index].string}'", tokens[token_index], self.parent_ast.module_name)
-
             token_index += 1
-            if token_index >= len(tokens):
-                print_compiler_error("expected ')'", tokens[token_index - 1])
-            
+
         token_index += 1
 
-        while token_index < len(tokens) and tokens[token_index].string != "{":
-            token_index += 1
-        
-        if token_index >= len(tokens) or tokens[token_index].string != "{":
+        token_index = skip_to_token(span, token_index, TOKEN_LBRACE)
+
+        if token_index >= span.end:
             print_compiler_error("expected '{'", tokens[token_index - 1], self.parent_ast.module_name)
-        
-        token_index, block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
+
+        token_index, block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
         functionBlock = FunctionBlockAst(self)
-        functionBlock.parse(function_name, parameter_tokens, block_tokens)
+        functionBlock.parse(function_name, parameter_tokens, block_tokens, self.parent_ast.session.lazy_bodies)
         self.functions[function_name] = functionBlock
         return token_index
         
-    def parse(self, namespace_name, tokens):
+    def parse(self, namespace_name, span):
         self.name = namespace_name
+        self.span = span
 
-        token_index = 0
-        while token_index < len(tokens):
-            token = tokens[token_index]
-            if token.type == tokenize.NAME:
-                token_index = self.parse_function(tokens, token_index)
-            elif token.type == tokenize.NEWLINE or token.type == tokenize.NL:
+        tokens = span.tokens
+        types = tokens.types
+        token_index = span.start
+        while token_index < span.end:
+            kind = types[token_index]
+            if kind == TOKEN_NAME:
+                token_index = self.parse_function(span, token_index)
+            elif kind == TOKEN_NEWLINE:
                 pass
             else:
-                print_compiler_error(f"unexpected token '{token.string}'", token, self.parent_ast.module_name)
+                print_compiler_error(f"unexpected token '{tokens[token_index].string}'", tokens[token_index], self.parent_ast.module_name)
             token_index += 1
     
-    def __str__(self) -> str:
-        result = f"namespace({self.name}):\n"
+    def emit_c(self, generator):
+        generator.namespace = self
+        for function in self.functions.values():
+            if id(function) in generator.live:
+                yield from function.emit_c(generator)
+
+    def describe(self):
+        yield f"namespace({self.name}):\n"
         for function_name in self.functions:
-            result += f"{function_name}:\n"
-            result += f"{self.functions[function_name]}\n"
-        return result
+            yield f"{function_name}:\n"
+            yield self.functions[function_name].describe()
+            yield "\n"
+
+    def __str__(self) -> str:
+        return "".join(flatten_chunks(self.describe()))
+
+
+# on-disk cache of parsed modules, entries are keyed on the module's path,
+# mtime, size and the compiler version and hold the pickled MurielAst with its
+# token table, writers go through a temporary file and an atomic rename so
+# concurrent compilers never see a partial entry
+class ParseCache:
+    def __init__(self, directory, max_size = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok = True)
+
+    def entry_path(self, file, lazy_bodies = False):
+        # the parse options that change the tree are part of the key
+        stat = os.stat(file)
+        key = f"{os.path.realpath(file)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{COMPILER_VERSION}\0{PARSE_CACHE_FORMAT}\0lazy={lazy_bodies}"
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".murcache")
+
+    def load(self, file, lazy_bodies = False):
+        entry = self.entry_path(file, lazy_bodies)
+        try:
+            with open(entry, 'rb') as f:
+                ast = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # a corrupt or incompatible entry is dropped and parsed again
+            self.remove(entry)
+            return None
+        # the mtime of an entry is its last use, eviction drops the oldest
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return ast
+
+    def store(self, file, ast, lazy_bodies = False):
+        entry = self.entry_path(file, lazy_bodies)
+        try:
+            data = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return
+        handle, temporary = tempfile.mkstemp(dir = self.directory, suffix = ".tmp")
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, entry)
+        except OSError:
+            self.remove(temporary)
+            return
+        self.evict()
+
+    def evict(self):
+        evict_cache_entries(self.directory, ".murcache", self.max_size)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def evict_cache_entries(directory, suffix, max_size):
+    # drops the least recently used entries until the cache fits in max_size
+    entries = []
+    total_size = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.endswith(suffix):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total_size += stat.st_size
+    if total_size <= max_size:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_size -= size
+        if total_size <= max_size:
+            break
+
+# the objects of compiled C units by the hash of everything that went into
+# them, the C of the unit and of its header and the compiler and its flags, so
+# a unit is only compiled again when its generated C changed
+class ObjectCache:
+    def __init__(self, directory, max_size = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok = True)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + ".o")
+
+    def lookup(self, key):
+        entry = self.entry_path(key)
+        try:
+            os.utime(entry)
+        except OSError:
+            return None
+        return entry
+
+    def evict(self):
+        evict_cache_entries(self.directory, ".o", self.max_size)
+
+
+# precompiled modules, a .murc holds everything a module is linked from so it
+# is loaded without lexing or parsing, the header, then a table of the offset
+# and size of every section:
+#   strings   every name of the module, an u32 count, an u32 offset and size
+#             per string into the UTF-8 text that follows
+#   module    u32 records: name, includes (parts, alias), extern functions
+#             (name, return type, parameter tokens), namespaces (name, token
+#             span, functions (name, token span, parameters))
+#   hashes    the SHA-256 of the source of every include when it was compiled
+#   types ... brackets   the columns of the token table, each in the
+#             narrowest integer type its values fit, named in the header
+#   source    the source, last, after a newline, so the token offsets point
+#             straight into the map and the lines of errors end at the file
+# integers are little endian, function bodies are parsed from their tokens on
+# first use like lazily parsed ones
+PRECOMPILED_SUFFIX = ".murc"
+PRECOMPILED_MAGIC = b"MURC"
+PRECOMPILED_FORMAT = 1
+# magic, format, compiler version, the SHA-256 of the source and the type
+# code of every token column
+PRECOMPILED_COLUMNS = ["types", "offsets", "lengths", "lines", "columns", "brackets"]
+PRECOMPILED_HEADER = struct.Struct(f"<4sI16s32s{len(PRECOMPILED_COLUMNS)}s")
+PRECOMPILED_SECTIONS = ["strings", "module", "hashes"] + PRECOMPILED_COLUMNS + ["source"]
+PRECOMPILED_TABLE = struct.Struct(f"<{2 * len(PRECOMPILED_SECTIONS)}I")
+PRECOMPILED_NONE = 0xFFFFFFFF
+
+def narrowest_array(values):
+    # the values in the smallest array type that holds all of them
+    low = min(values, default = 0)
+    high = max(values, default = 0)
+    for typecode in ("BH" if low >= 0 else "bh"):
+        bits = 8 * array(typecode).itemsize
+        if (0 if low >= 0 else -(1 << bits - 1)) <= low and high < 1 << (bits if low >= 0 else bits - 1):
+            return array(typecode, values)
+    return array('I' if low >= 0 else 'i', values)
+
+def little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def source_hash(file):
+    with open(file, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+def precompiled_sections(data):
+    # (source hash, {section: (offset, size)}) of a .murc this compiler can
+    # load, or None
+    if len(data) < PRECOMPILED_HEADER.size + PRECOMPILED_TABLE.size:
+        return None
+    magic, format, version, digest, typecodes = PRECOMPILED_HEADER.unpack_from(data)
+    if magic != PRECOMPILED_MAGIC or format != PRECOMPILED_FORMAT or version.rstrip(b"\0").decode(errors = "replace") != COMPILER_VERSION:
+        return None
+    table = PRECOMPILED_TABLE.unpack_from(data, PRECOMPILED_HEADER.size)
+    sections = {name: (table[2 * index], table[2 * index + 1]) for index, name in enumerate(PRECOMPILED_SECTIONS)}
+    return digest, sections, dict(zip(PRECOMPILED_COLUMNS, typecodes.decode()))
+
+def read_precompiled_header(file):
+    try:
+        with open(file, 'rb') as f:
+            return precompiled_sections(f.read(PRECOMPILED_HEADER.size + PRECOMPILED_TABLE.size))
+    except OSError:
+        return None
+
+def precompiled_is_fresh(file, source = None):
+    # a .murc is used when this compiler reads it and it was compiled from
+    # the source as it is now, a .murc without a source is used as it is
+    header = read_precompiled_header(file)
+    if header is None:
+        return False
+    if source is None or not os.path.isfile(source):
+        return True
+    return header[0] == source_hash(source)
+
+def write_precompiled(ast, file, include_hashes):
+    tokens = ast.tokens
+    strings = {}
+
+    def string(value):
+        return strings.setdefault(value, len(strings))
+
+    record = array('I')
+    record.append(string(ast.module_name))
+    record.append(len(ast.includes))
+    for module_info, module_alias in ast.includes:
+        record.append(len(module_info))
+        record.extend(string(part) for part in module_info)
+        record.append(PRECOMPILED_NONE if module_alias is None else string(module_alias))
+    record.append(len(ast.external_functions))
+    for function in ast.external_functions.values():
+        record.extend([string(function.name), string(function.return_type), len(function.parameters)])
+        record.extend(parameter.index for parameter in function.parameters)
+    record.append(len(ast.namespaces))
+    for namespace in ast.namespaces.values():
+        record.extend([string(namespace.name), namespace.span.start, namespace.span.end, len(namespace.functions)])
+        for function in namespace.functions.values():
+            record.extend([string(function.name), function.span.start, function.span.end, len(function.parameters)])
+            record.extend(string(parameter) for parameter in function.parameters)
+
+    encoded = [value.encode() for value in strings]
+    string_table = array('I', [len(encoded)])
+    position = 0
+    for value in encoded:
+        string_table.extend([position, len(value)])
+        position += len(value)
+    source = bytes(tokens.source)
+    sections = [little_endian(string_table) + b"".join(encoded), little_endian(record), b"".join(include_hashes)]
+    # the offsets stay 32 bit like the lexer keeps them, they are filled in
+    # once the position of the source in the file is known
+    columns = [narrowest_array(tokens.types), array('I', bytes(4 * len(tokens))), narrowest_array(tokens.lengths), narrowest_array(tokens.lines), narrowest_array(tokens.columns), narrowest_array(build_bracket_index(tokens, 0, ast.module_name))]
+    sections.extend(little_endian(column) for column in columns)
+
+    # sections start on 4 byte boundaries
+    table = []
+    position = PRECOMPILED_HEADER.size + PRECOMPILED_TABLE.size
+    for data in sections:
+        table.extend([position, len(data)])
+        position += (len(data) + 3) & ~3
+    source_offset = position + 1
+    offsets = array('I', (offset + source_offset for offset in tokens.offsets))
+    sections[PRECOMPILED_SECTIONS.index("offsets")] = little_endian(offsets)
+    table.extend([source_offset, len(source)])
+
+    handle, temporary = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(file)), suffix = ".tmp")
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(PRECOMPILED_HEADER.pack(PRECOMPILED_MAGIC, PRECOMPILED_FORMAT, COMPILER_VERSION.encode(), source_hash(ast.file), "".join(column.typecode for column in columns).encode()))
+            f.write(PRECOMPILED_TABLE.pack(*table))
+            for data in sections:
+                f.write(data)
+                f.write(b"\0" * (-len(data) & 3))
+            f.write(b"\n")
+            f.write(source)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, file)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary)
+        raise
+
+def load_precompiled(file, session):
+    # the module, its namespaces and function signatures straight from one
+    # read-only map of the .murc, the token columns are views of the map,
+    # persistent sessions read the file instead as it may be rewritten
+    with open(file, 'rb') as f:
+        data = f.read() if session.persistent else mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    header = precompiled_sections(data)
+    if header is None:
+        print_compiler_error(f"'{file}' is not a precompiled module of this compiler, precompile it again", None, os.path.splitext(os.path.basename(file))[0])
+    _, sections, typecodes = header
+
+    def column(name, typecode):
+        offset, size = sections[name]
+        view = memoryview(data)[offset:offset + size]
+        if sys.byteorder == "little":
+            return view.cast(typecode)
+        values = array(typecode)
+        values.frombytes(view)
+        values.byteswap()
+        return values
+
+    offset, _ = sections["strings"]
+    count = struct.unpack_from("<I", data, offset)[0]
+    text = offset + 4 + 8 * count
+    positions = struct.unpack_from(f"<{2 * count}I", data, offset + 4)
+    strings = [sys.intern(str(data[text + positions[index]:text + positions[index] + positions[index + 1]], "utf-8")) for index in range(0, 2 * count, 2)]
+    record = column("module", "I")
+
+    tokens = TokenTable(data)
+    for name in PRECOMPILED_COLUMNS[:-1]:
+        setattr(tokens, name, column(name, typecodes[name]))
+    brackets = column("brackets", typecodes["brackets"])
+
+    position = 0
+    def read():
+        nonlocal position
+        position += 1
+        return record[position - 1]
+
+    ast = MurielAst(strings[read()], session)
+    ast.file = file
+    ast.tokens = tokens
+    for _ in range(read()):
+        module_info = [strings[read()] for _ in range(read())]
+        alias = read()
+        ast.includes.append((module_info, None if alias == PRECOMPILED_NONE else strings[alias]))
+    for _ in range(read()):
+        name, return_type = strings[read()], strings[read()]
+        parameters = [tokens[read()] for _ in range(read())]
+        ast.external_functions[name] = ExternalFunctionAst(ast, name, parameters, return_type)
+    for _ in range(read()):
+        namespace = NamespaceBlockAst(ast)
+        namespace.name = strings[read()]
+        namespace.span = TokenSpan(tokens, read(), read(), brackets)
+        for _ in range(read()):
+            function = FunctionBlockAst(namespace)
+            name = strings[read()]
+            span = TokenSpan(tokens, read(), read(), brackets)
+            function.parse(name, [strings[read()] for _ in range(read())], span, lazy = True)
+            namespace.functions[name] = function
+        ast.namespaces[namespace.name] = namespace
+    return ast
+
+def precompiled_include_hashes(ast):
+    # the hash of the source of every include of the module, as it resolves now
+    hashes = []
+    for module_info, _ in ast.includes:
+        file = search_for_include_file(module_info, ast.session.resolver)
+        if not file:
+            print_compiler_error(f"could not find module '{'.'.join(module_info)}'", None, ast.module_name)
+        if file.endswith(PRECOMPILED_SUFFIX):
+            hashes.append(read_precompiled_header(file)[0])
+        else:
+            hashes.append(source_hash(file))
+    return hashes
+
+def read_precompiled_include_hashes(file):
+    header = read_precompiled_header(file)
+    if header is None:
+        return None
+    offset, size = header[1]["hashes"]
+    with open(file, 'rb') as f:
+        f.seek(offset)
+        data = f.read(size)
+    return [data[index:index + 32] for index in range(0, len(data), 32)]
+
+
+# wall time and allocations of the phases of a compilation as a tree, a phase
+# is timed as a whole with the phases it runs inside it, and the same phase of
+# the same subject run again under the same parent adds to its row,
+# allocations are traced with tracemalloc, which slows everything down, so
+# they are only kept when asked for
+class CompilerStats:
+    def __init__(self, trace_allocations = False):
+        self.trace_allocations = trace_allocations
+        # rows are [phase, subject, calls, seconds, allocated bytes, peak
+        # bytes, {(phase, subject): row}], the root row only holds children
+        self.root = [None, None, 0, 0.0, 0, 0, {}]
+        # [row, traced bytes at entry, peak bytes so far] of the open phases
+        self.active = []
+        # (phase, subject or None, hook) of every hook
+        self.hooks = []
+        self.started = False
+
+    def add_hook(self, phase, hook, subject = None):
+        # hook(phase, subject) returns a context manager that is entered
+        # around the outermost run of the phase, of one subject or of every
+        # subject, a cProfile.Profile or a sampling profiler with __enter__
+        # and __exit__ can be returned as it is
+        self.hooks.append((phase, subject, hook))
+
+    def start(self):
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.started = True
+
+    def stop(self):
+        if self.trace_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name, subject = None):
+        if not self.started:
+            self.start()
+        parent = self.active[-1][0] if self.active else self.root
+        row = parent[6].get((name, subject))
+        if row is None:
+            row = [name, subject, 0, 0.0, 0, 0, {}]
+            parent[6][(name, subject)] = row
+        outermost = all(frame[0][0] != name for frame in self.active)
+        # the peak of the phase above is folded into it before this phase
+        # resets the peak for itself
+        current = 0
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.active:
+                self.active[-1][2] = max(self.active[-1][2], peak)
+            tracemalloc.reset_peak()
+        frame = [row, current, current]
+        self.active.append(frame)
+        with contextlib.ExitStack() as hooks:
+            if outermost:
+                for phase, hook_subject, hook in self.hooks:
+                    if phase == name and (hook_subject is None or hook_subject == subject):
+                        hooks.enter_context(hook(name, subject))
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - start
+                self.active.pop()
+                row[2] += 1
+                row[3] += elapsed
+                if self.trace_allocations:
+                    end, peak = tracemalloc.get_traced_memory()
+                    peak = max(frame[2], peak)
+                    row[4] += end - current
+                    row[5] = max(row[5], peak - current)
+                    if self.active:
+                        self.active[-1][2] = max(self.active[-1][2], peak)
+                    tracemalloc.reset_peak()
+
+    def phase_report(self, row):
+        name, subject, calls, seconds, allocated, peak, children = row
+        phase = {"phase": name, "subject": subject, "calls": calls, "ms": round(seconds * 1000, 3)}
+        if self.trace_allocations:
+            phase["allocated_bytes"] = allocated
+            phase["peak_bytes"] = peak
+        phase["phases"] = [self.phase_report(child) for child in children.values()]
+        return phase
+
+    def report(self, session, largest = 10):
+        phases = [self.phase_report(row) for row in self.root[6].values()]
+        modules = []
+        functions = []
+        for ast in session.module_graph.values():
+            modules.append({"module": ast.module_name, "file": ast.file, "tokens": len(ast.tokens) if ast.tokens is not None else None, "namespaces": len(ast.namespaces)})
+            for namespace in ast.namespaces.values():
+                for function in namespace.functions.values():
+                    span = function.span
+                    functions.append({"function": f"{ast.module_name}.{namespace.name}.{function.name}", "tokens": len(span), "line": span.tokens.lines[span.start] if len(span) else None})
+        functions.sort(key = lambda function: function["tokens"], reverse = True)
+        return {"phases": phases, "modules": modules, "largest_functions": functions[:largest]}
+
+    def report_lines(self, session, largest = 10):
+        report = self.report(session, largest)
+        memory = self.trace_allocations
+        header = f"{'phase':<44} {'calls':>6} {'time (ms)':>10}"
+        if memory:
+            header += f" {'allocated (KiB)':>16} {'peak (KiB)':>11}"
+        yield header
+        pending = [(phase, 0) for phase in reversed(report["phases"])]
+        while pending:
+            phase, depth = pending.pop()
+            name = "  " * depth + phase["phase"]
+            if phase["subject"] is not None:
+                name += f" {phase['subject']}"
+            line = f"{name:<44} {phase['calls']:>6} {phase['ms']:>10.2f}"
+            if memory:
+                line += f" {phase['allocated_bytes'] / 1024:>16.1f} {phase['peak_bytes'] / 1024:>11.1f}"
+            yield line
+            pending.extend((child, depth + 1) for child in reversed(phase["phases"]))
+        if not memory:
+            return
+        yield ""
+        yield f"{'module':<30} {'namespaces':>11} {'tokens':>10}"
+        for module in report["modules"]:
+            yield f"{module['module']:<30} {module['namespaces']:>11} {module['tokens'] if module['tokens'] is not None else '-':>10}"
+        yield ""
+        yield f"{'largest functions':<44} {'tokens':>8} {'line':>6}"
+        for function in report["largest_functions"]:
+            yield f"{function['function']:<44} {function['tokens']:>8} {function['line'] if function['line'] is not None else '-':>6}"
+
+NULL_PHASE = contextlib.nullcontext()
+
+# include lines are only allowed at the top level of a module, the parallel
+# loader finds them with this pattern without lexing the whole file
+INCLUDE_LINE_PATTERN = re.compile(rb"^[ \t]*include[ \t]*\(([^)\r\n]*)\)", re.MULTILINE)
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def parse_module_file(path, parse_cache = None, lazy_bodies = False):
+    # lexes and parses one module without following its includes, this is the
+    # unit of work of the parallel loader and runs in a worker process
+    ast = parse_cache.load(path, lazy_bodies) if parse_cache else None
+    if ast is None:
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        tokens = TokenTable.from_file(path, module_name)
+        ast = MurielAst(module_name, CompilationSession(lazy_bodies = lazy_bodies))
+        ast.file = path
+        ast.tokens = tokens
+        ast.parse(module_token_span(tokens, module_name), process_includes = False)
+        if parse_cache:
+            parse_cache.store(path, ast, lazy_bodies)
+    return ast
+
+# the state shared by every module of one compilation: the module graph keyed
+# on the resolved path of each module file, so an include is deduplicated
+# before its file is read and every importer links the same MurielAst
+class CompilationSession:
+    def __init__(self, parse_cache = None, parse_jobs = 1, include_paths = None, persistent = False, lazy_bodies = False, stats = None, precompiled_dir = None):
+        self.parse_cache = parse_cache
+        # a CompilerStats timing the phases of the compilation, or None
+        self.stats = stats
+        self.parse_jobs = parse_jobs
+        # function bodies are only parsed once something reads them
+        self.lazy_bodies = lazy_bodies
+        # persistent sessions outlive the files they read and are rebuilt
+        # from the trees they keep
+        self.persistent = persistent
+        self.resolver = IncludeResolver(include_paths_from_environment(include_paths), precompiled_dir)
+        self.module_graph = {}
+        self.loading = set()
+        # modules parsed ahead of time whose includes are not linked yet
+        self.parsed_modules = {}
+        self.rebuild_stats = {"relexed": 0, "reparsed": 0, "reused": 0}
+
+    def phase(self, name, subject = None):
+        return self.stats.phase(name, subject) if self.stats else NULL_PHASE
+
+    def load_program(self, file):
+        # modules parsed in worker processes are timed as a whole
+        if self.parse_jobs != 1:
+            with self.phase("parallel parse"):
+                self.parse_in_parallel(file)
+        return self.load_module(file)
+
+    def discover_modules(self, file):
+        # walks the include lines of every reachable module, in include order
+        paths = []
+        seen = set()
+        pending = [os.path.realpath(file)]
+        while pending:
+            path = pending.pop()
+            if path in seen or path in self.module_graph:
+                continue
+            seen.add(path)
+            includes = []
+            if path.endswith(PRECOMPILED_SUFFIX):
+                # loading a precompiled module is cheaper than a worker
+                ast = self.parsed_modules.get(path) or self.open_precompiled(path)
+                self.parsed_modules[path] = ast
+                module_infos = [module_info for module_info, _ in ast.includes]
+            else:
+                paths.append(path)
+                with open(path, 'rb') as f:
+                    source = f.read()
+                module_infos = [[part.strip() for part in match.group(1).decode().split(".")] for match in INCLUDE_LINE_PATTERN.finditer(source)]
+            for module_info in module_infos:
+                include_file = search_for_include_file(module_info, self.resolver)
+                if include_file:
+                    includes.append(os.path.realpath(include_file))
+            pending.extend(reversed(includes))
+        return paths
+
+    def parse_in_parallel(self, file):
+        # modules are parsed in a process pool and only linked here, in the
+        # same order as the serial path, so both produce the same tree
+        paths = self.discover_modules(file)
+        jobs = self.parse_jobs if self.parse_jobs > 0 else os.cpu_count()
+        chunksize = max(1, len(paths) // (jobs * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as executor:
+            results = executor.map(parse_module_file, paths, [self.parse_cache] * len(paths), [self.lazy_bodies] * len(paths), chunksize = chunksize)
+            for path, ast in zip(paths, results):
+                self.parsed_modules[path] = ast
+
+    def load_module(self, file):
+        path = os.path.realpath(file)
+        ast = self.module_graph.get(path)
+        if ast is not None:
+            return ast
+
+        ast = self.parsed_modules.pop(path, None)
+        if ast is None and path.endswith(PRECOMPILED_SUFFIX):
+            ast = self.open_precompiled(path)
+        elif ast is None and self.parse_cache:
+            with self.phase("parse cache load", os.path.splitext(os.path.basename(path))[0]):
+                ast = self.parse_cache.load(path, self.lazy_bodies)
+        self.loading.add(path)
+        if ast is None:
+            module_name = os.path.splitext(os.path.basename(path))[0]
+            signature = file_signature(path)
+            # the pages of the map are only read as the lexer reaches them, so
+            # most of the reading is timed with the tokenizing
+            with self.phase("read", module_name):
+                source = TokenTable.map_file(path)
+            with self.phase("tokenize", module_name):
+                tokens = TokenTable.from_source(source, module_name)
+            if self.persistent:
+                tokens.detach()
+            ast = MurielAst(module_name, self)
+            ast.file = path
+            ast.tokens = tokens
+            self.module_graph[path] = ast
+            ast.parse(module_token_span(tokens, module_name))
+            ast.file_signature = signature
+            if self.parse_cache:
+                self.parse_cache.store(path, ast, self.lazy_bodies)
+        else:
+            if ast.file_signature is None:
+                ast.file_signature = file_signature(path)
+            ast.session = self
+            self.module_graph[path] = ast
+            for module_info, module_alias in ast.includes:
+                ast.process_include(module_info, module_alias)
+        self.loading.discard(path)
+        return ast
+
+    def open_precompiled(self, path):
+        with self.phase("load precompiled", os.path.splitext(os.path.basename(path))[0]):
+            return load_precompiled(path, self)
+
+    def is_loading(self, ast):
+        return ast.file in self.loading
+
+    def rebuild(self, file):
+        # links the program again from the trees kept in memory, only modules
+        # whose file changed since they were parsed are lexed again and only
+        # their namespace blocks whose source changed are parsed again
+        modules = self.parsed_modules
+        modules.update(self.module_graph)
+        self.module_graph = {}
+        self.loading = set()
+        stats = {"relexed": 0, "reparsed": 0, "reused": 0}
+        self.rebuild_stats = stats
+        for path, ast in list(modules.items()):
+            signature = file_signature(path)
+            if signature is None:
+                del modules[path]
+                continue
+            if signature == ast.file_signature:
+                continue
+            # a precompiled module that changed is loaded again
+            if path.endswith(PRECOMPILED_SUFFIX):
+                del modules[path]
+                continue
+            # a module that fails to parse is parsed again on the next rebuild
+            ast.file_signature = None
+            tokens = TokenTable.from_file(path, ast.module_name)
+            tokens.detach()
+            reparsed, reused = ast.reparse(tokens)
+            ast.file_signature = signature
+            stats["relexed"] += 1
+            stats["reparsed"] += reparsed
+            stats["reused"] += reused
+        for ast in modules.values():
+            ast.modules = {}
+            ast.alias_map = {}
+        # an edited source turns its precompiled module stale
+        self.resolver.refresh()
+        self.resolver.resolved.clear()
+        return self.load_module(file)
+
+    def file_signatures(self):
+        paths = list(self.module_graph) + list(self.parsed_modules)
+        return {path: file_signature(path) for path in paths}
 
 
 class MurielAst:
-    def __init__(self, module_name, modules_added = []):
-        self.modules_added = modules_added
+    def __init__(self, module_name, session = None):
+        self.session = session if session is not None else CompilationSession()
         self.module_name = module_name
+        self.file = None
+        self.file_signature = None
+        self.tokens = None
         self.modules = {}
         self.alias_map = {}
         self.external_functions = {}
         self.namespaces = {}
+        self.includes = []
+
+    def __getstate__(self):
+        # included modules are linked by the importer, not stored with the module
+        state = self.__dict__.copy()
+        state["modules"] = {}
+        state["session"] = None
+        return state
 
-    def parse_include(self, tokens, token_index):
+    def parse_include(self, span, token_index):
+        tokens = span.tokens
+        types = tokens.types
         # include (core.stdio) as stdio
-        if token_index + 2 >= len(tokens):
+        if token_index + 2 >= span.end:
             print_compiler_error("expected module name", tokens[token_index - 1], self.module_name)
-        
-        if tokens[token_index + 1].string != "(":
+
+        if types[token_index + 1] != TOKEN_LPAREN:
             print_compiler_error("expected '('", tokens[token_index + 1], self.module_name)
-        
-        if tokens[token_index + 2].type != tokenize.NAME:
+
+        if types[token_index + 2] != TOKEN_NAME:
             print_compiler_error("expected module name after '('", tokens[token_index + 2], self.module_name)
-        
+
         token_index += 2
         module_tokens = []
-        while tokens[token_index].string != ")":
-            if tokens[token_index].type == tokenize.NAME:
+        while types[token_index] != TOKEN_RPAREN:
+            if types[token_index] == TOKEN_NAME:
                 module_tokens.append(tokens[token_index].string)
-            elif tokens[token_index].string == ".":
+            elif types[token_index] == TOKEN_DOT:
                 pass
             else:
                 print_compiler_error(f"unexpected token '{tokens[token_index].string}'", tokens[token_index], self.module_name)
             token_index += 1
-            if token_index >= len(tokens):
-                print_compiler_error("expected ')'", tokens[token_index - 1])
+            if token_index >= span.end:
+                print_compiler_error("expected ')'", tokens[token_index - 1], self.module_name)
 
         module_alias = None
-        if token_index + 1 < len(tokens) and tokens[token_index + 1].string == "as":
-            if token_index + 2 >= len(tokens):
+        if token_index + 1 < span.end and types[token_index + 1] == TOKEN_AS:
+            if token_index + 2 >= span.end:
                 print_compiler_error("expected module alias", tokens[token_index + 1], self.module_name)
-            if tokens[token_index + 2].type != tokenize.NAME:
+            if types[token_index + 2] != TOKEN_NAME:
                 print_compiler_error("expected module alias", tokens[token_index + 2], self.module_name)
             module_alias = tokens[token_index + 2].string
             token_index += 3
+        else:
+            token_index += 1
 
-        if token_index >= len(tokens) or tokens[token_index].type != tokenize.NEWLINE:
+        if token_index >= span.end or types[token_index] != TOKEN_NEWLINE:
             print_compiler_error("expected newline", tokens[token_index - 1], self.module_name)
 
-        return token_index, module_tokens, module_alias            
+        return token_index, module_tokens, module_alias
 
 
     def process_include(self, module_info, module_alias):
-        file = search_for_include_file(module_info)
+        with self.session.phase("process_include", ".".join(module_info)):
+            self.link_include(module_info, module_alias)
+
+    def link_include(self, module_info, module_alias):
+        with self.session.phase("include resolution", self.module_name):
+            file = search_for_include_file(module_info, self.session.resolver)
         if not file:
             print_compiler_error(f"could not find module '{'.'.join(module_info)}'", None, self.module_name)
-        
-        tokens = []
-        with open(file, 'rb') as f:
-            tokens = list(tokenize.tokenize(f.readline))
-        
-        module_name = os.path.splitext(os.path.basename(file))[0]
-        if module_alias:
-            self.alias_map[module_alias] = module_name
-        
-        if module_name in self.modules_added:
-            return
 
-        self.modules_added.append(module_name)
+        sub_ast = self.session.load_module(file)
+        if module_alias:
+            self.alias_map[module_alias] = sub_ast.module_name
 
-        sub_ast = MurielAst(module_name, self.modules_added)
-        sub_ast.parse(tokens[1:])
+        # a module that is still being parsed further up the include chain is
+        # already owned by its importers
+        if self.session.is_loading(sub_ast):
+            return
 
         self.modules[".".join(module_info)] = sub_ast
 
@@ -542,54 +2353,94 @@ class MurielAst:
         # for sub_ast_alias in sub_ast_alias_map:
         #     self.alias_map[sub_ast_alias] = sub_ast_alias_map[sub_ast_alias]
 
-    def parse_extern_block(self, tokens):       
+    def parse_extern_block(self, span):
         externBlock = ExternBlockAst(self)
-        externBlock.parse(tokens)
+        externBlock.parse(span)
         for function in externBlock.functions:
             self.external_functions[function.name] = function
 
-    def parse_namespace_block(self, namespace_name, tokens):
+    def reparse(self, tokens):
+        # parses a new version of the module, namespace blocks whose source is
+        # unchanged keep their trees from the previous version
+        previous_namespaces = self.namespaces
+        self.tokens = tokens
+        self.external_functions = {}
+        self.namespaces = {}
+        self.includes = []
+        try:
+            self.parse(module_token_span(tokens, self.module_name), False, previous_namespaces)
+        except SystemExit:
+            # the blocks of the last good version are kept for the next attempt
+            self.namespaces = previous_namespaces
+            raise
+        reused = sum(1 for name, block in self.namespaces.items() if previous_namespaces.get(name) is block)
+        return len(self.namespaces) - reused, reused
+
+    def parse_namespace_block(self, namespace_name, span, previous_namespaces = None):
         if namespace_name in self.namespaces:
             print_compiler_error(f"namespace '{namespace_name}' already defined", None, self.module_name)
+        previous = previous_namespaces.get(namespace_name) if previous_namespaces else None
+        if previous is not None and previous.source() == span.tokens.span_source(span.start, span.end):
+            previous.relocate(span)
+            self.namespaces[namespace_name] = previous
+            return
         namespaceBlock = NamespaceBlockAst(self)
-        namespaceBlock.parse(namespace_name, tokens)
+        with self.session.phase("parse namespace", f"{self.module_name}.{namespace_name}"):
+            namespaceBlock.parse(namespace_name, span)
         self.namespaces[namespace_name] = namespaceBlock
 
-    def parse(self, tokens):
-        token_index = 0
-        while token_index < len(tokens):        
-            token = tokens[token_index]
-            if token.type == tokenize.COMMENT:
-                pass
-            elif token.type == tokenize.NAME:
-                if token.string == "include":
-                    token_index, module_info, mopdule_alias = self.parse_include(tokens, token_index)
+    def parse(self, span, process_includes = True, previous_namespaces = None):
+        tokens = span.tokens
+        types = tokens.types
+        token_index = span.start
+        while token_index < span.end:
+            kind = types[token_index]
+            if kind == TOKEN_INCLUDE:
+                token_index, module_info, mopdule_alias = self.parse_include(span, token_index)
+                self.includes.append((module_info, mopdule_alias))
+                if process_includes:
                     self.process_include(module_info, mopdule_alias)
-                elif token.string == "extern":
-                    if token_index + 2 >= len(tokens) or tokens[token_index + 1].string != '{':
-                        print_compiler_error("expected a block after after extern", tokens[token_index], self.module_name)
-                    token_index += 1
-                    token_index, block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
-                    self.parse_extern_block(block_tokens)
-                else:
-                    namespace_name = token.string
-                    if token_index + 1 >= len(tokens) or tokens[token_index + 1].string != '{':
-                        print_compiler_error("expected a block after namespace", tokens[token_index], self.module_name)
-                    token_index += 1
-                    token_index, block_tokens = extract_block_tokens(tokens, token_index, '{', '}')
-                    self.parse_namespace_block(namespace_name, block_tokens)
-            elif token.type == tokenize.NEWLINE or token.type == tokenize.NL:
+            elif kind == TOKEN_EXTERN:
+                if token_index + 2 >= span.end or types[token_index + 1] != TOKEN_LBRACE:
+                    print_compiler_error("expected a block after after extern", tokens[token_index], self.module_name)
+                token_index += 1
+                token_index, block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
+                self.parse_extern_block(block_tokens)
+            elif kind == TOKEN_NAME:
+                namespace_name = tokens[token_index].string
+                if token_index + 1 >= span.end or types[token_index + 1] != TOKEN_LBRACE:
+                    print_compiler_error("expected a block after namespace", tokens[token_index], self.module_name)
+                token_index += 1
+                token_index, block_tokens = extract_block_tokens(span, token_index, TOKEN_LBRACE, self.module_name)
+                self.parse_namespace_block(namespace_name, block_tokens, previous_namespaces)
+            elif kind == TOKEN_NEWLINE:
                 pass
-            elif token.type == tokenize.ENDMARKER:
+            elif kind == TOKEN_ENDMARKER:
                 break
             else:
-                print_compiler_error(f"unexpected token '{token.string}'", token, self.module_name)          
+                print_compiler_error(f"unexpected token '{tokens[token_index].string}'", tokens[token_index], self.module_name)
             token_index += 1
         
         if "global" not in self.namespaces:
             print_compiler_error("expected namespace 'global'", None, self.module_name)
 
 
+    def parse_bodies(self):
+        # parses every function body a lazy parse left for later
+        with self.session.phase("parse bodies", self.module_name):
+            self.parse_all_bodies()
+
+    def parse_all_bodies(self):
+        for namespace in self.namespaces.values():
+            for function in namespace.functions.values():
+                if function.parsed_body is None:
+                    function.parse_body()
+
+    def emit_c(self, generator):
+        generator.module = self
+        for namespace in self.namespaces.values():
+            yield from namespace.emit_c(generator)
+
     def __str__(self) -> str:
         result = f"module({self.module_name}):\n"
 
@@ -617,32 +2468,2020 @@ class MurielAst:
         
     
 
+RUNTIME_HEADER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "core", "runtime.h")
+PROFILE_HEADER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "core", "profile.h")
+# the headers of a program split into units next to the one of every module,
+# module prefixes have no '-' so the names never clash
+UNITS_RUNTIME_HEADER = "mur-runtime.h"
+UNITS_SHAPES_HEADER = "mur-shapes.h"
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# runtime functions of the operators, && and || are left to C so they keep
+# short-circuiting
+BINARY_FUNCTIONS = {
+    "|": "mur_bit_or",
+    "^": "mur_bit_xor",
+    "&": "mur_bit_and",
+    "==": "mur_eq",
+    "!=": "mur_ne",
+    "<": "mur_lt",
+    "<=": "mur_le",
+    ">": "mur_gt",
+    ">=": "mur_ge",
+    "<<": "mur_shl",
+    ">>": "mur_shr",
+    "+": "mur_add",
+    "-": "mur_sub",
+    "*": "mur_mul",
+    "/": "mur_div",
+    "%": "mur_mod",
+}
+UNARY_FUNCTIONS = {"-": "mur_neg", "!": "mur_not", "~": "mur_invert"}
+
+# switch lowerings: an if chain, a C switch over dense int cases, a binary
+# search over sorted sparse int cases and a hash search over string cases
+SWITCH_CHAIN = "chain"
+SWITCH_DENSE = "dense"
+SWITCH_SEARCH = "search"
+SWITCH_HASH = "hash"
+SWITCH_MIN_CASES = 4
+# dense switches may leave at most this share of their key range empty
+SWITCH_MAX_HOLES = 0.5
+# ints above this magnitude cannot be compared with floats through a key
+SWITCH_MAX_KEY = 2 ** 53
+
+def string_hash(value):
+    # 64 bit FNV-1a up to the first NUL, as mur_hash_string in core/runtime.h
+    hash = 0xcbf29ce484222325
+    for byte in value.split(b"\0", 1)[0]:
+        hash = ((hash ^ byte) * 0x100000001b3) & 0xFFFFFFFFFFFFFFFF
+    return hash
+
+# object dispatch: through the shapes of object literals and inline caches at
+# every field access and method call, or by name lookups only
+OBJECT_SHAPES = "auto"
+OBJECT_DYNAMIC = "dynamic"
+# the object fields that overload the binary operators
+OPERATOR_FIELDS = {"+": "__add__", "-": "__sub__", "*": "__mul__", "/": "__div__", "%": "__mod__"}
+# shape of a local that is never assigned, None is any value
+SHAPE_UNSET = -1
+# object literals are allocated where escape analysis allows it, on the stack,
+# in an arena of the call or in the region of the caller, or on the heap
+OBJECT_ALLOCATION = "auto"
+OBJECT_HEAP = "heap"
+# how far a value travels from the call that made it, it stays in the call,
+# leaves it only as its result or may end up anywhere
+ESCAPE_NONE = 0
+ESCAPE_RETURN = 1
+ESCAPE_ALL = 2
+# calls of functions whose body is at most this large, counted in statements
+# and expression nodes, are replaced by the body, 0 inlines nothing
+INLINE_THRESHOLD = 40
+
+def join_shape(shape, other):
+    if shape == SHAPE_UNSET:
+        return other
+    if other == SHAPE_UNSET or shape == other:
+        return shape
+    return None
+
+def find_root(parents, key):
+    parents.setdefault(key, key)
+    while parents[key] != key:
+        parents[key] = parents[parents[key]]
+        key = parents[key]
+    return key
+
+def expression_children(node):
+    kind = node[0]
+    if kind == EXPR_UNARY:
+        return (node[2],)
+    if kind == EXPR_BINARY:
+        return (node[2], node[3])
+    if kind == EXPR_CALL:
+        return (node[1],) + node[2]
+    if kind == EXPR_INDEX:
+        return (node[1], node[2])
+    if kind == EXPR_FIELD:
+        return (node[1],)
+    if kind == EXPR_ARRAY:
+        return node[1]
+    if kind == EXPR_OBJECT:
+        return node[3]
+    return ()
+
+def map_children(node, function):
+    # node rebuilt with function applied to each of its operands
+    kind = node[0]
+    if kind == EXPR_UNARY:
+        return (kind, node[1], function(node[2]))
+    if kind == EXPR_BINARY:
+        return (kind, node[1], function(node[2]), function(node[3]))
+    if kind == EXPR_CALL:
+        return (kind, function(node[1]), tuple(function(argument) for argument in node[2]), node[3])
+    if kind == EXPR_INDEX:
+        return (kind, function(node[1]), function(node[2]))
+    if kind == EXPR_FIELD:
+        return (kind, function(node[1]), node[2], node[3])
+    if kind == EXPR_ARRAY:
+        return (kind, tuple(function(item) for item in node[1]))
+    if kind == EXPR_OBJECT:
+        return (kind, node[1], node[2], tuple(function(value) for value in node[3]))
+    return node
+
+def shift_tokens(node, shift):
+    # node with the token indices in it moved by shift
+    kind = node[0]
+    if kind == EXPR_NAME:
+        return (kind, node[1], node[2] + shift)
+    node = map_children(node, lambda child: shift_tokens(child, shift))
+    if kind == EXPR_CALL or kind == EXPR_FIELD:
+        return node[:3] + (node[3] + shift,)
+    return node
+
+def node_size(node):
+    return 1 + sum(node_size(child) for child in expression_children(node))
+
+def count_names(node, uses, conditional, in_condition):
+    # how often every name is read in node, and the names read in the right
+    # operand of && or ||, which may not be evaluated at all
+    kind = node[0]
+    if kind == EXPR_NAME:
+        uses[node[1]] = uses.get(node[1], 0) + 1
+        if in_condition:
+            conditional.add(node[1])
+    elif kind == EXPR_BINARY and (node[1] == "&&" or node[1] == "||"):
+        count_names(node[2], uses, conditional, in_condition)
+        count_names(node[3], uses, conditional, True)
+    else:
+        for child in expression_children(node):
+            count_names(child, uses, conditional, in_condition)
+
+def replace_names(node, mapping):
+    # node with the names in mapping replaced by their nodes, operators that
+    # end up with constant operands are folded again
+    if node[0] == EXPR_NAME:
+        return mapping.get(node[1], node)
+    node = map_children(node, lambda child: replace_names(child, mapping))
+    if node[0] == EXPR_UNARY:
+        return fold_unary(node[1], node[2])
+    if node[0] == EXPR_BINARY:
+        return fold_binary(node[1], node[2], node[3])
+    return node
+
+def block_parts(statement):
+    # the conditions and scopes of a block statement in order
+    if isinstance(statement, IfBlockAst):
+        parts = [statement.expression, statement.body]
+        for elif_expression, elif_body in statement.elif_blocks:
+            parts.extend((elif_expression, elif_body))
+        if statement.else_block:
+            parts.append(statement.else_block)
+        return parts
+    if isinstance(statement, SwitchBlockAst):
+        parts = [case_body for _, case_body in statement.cases]
+        if statement.default_case is not None:
+            parts.append(statement.default_case)
+        return parts
+    if isinstance(statement, WhileBlockAst):
+        return [statement.expression, statement.body]
+    if isinstance(statement, LoopBlockAst):
+        return [statement.body]
+    return []
+
+def walk_statements(scope, in_loop = False):
+    # (statement, in_loop) for every statement of scope and of the blocks in
+    # it in order, conditions included, in_loop tells if it runs in a loop
+    stack = [(iter(scope.statements), in_loop)]
+    while stack:
+        statements, in_loop = stack[-1]
+        statement = next(statements, None)
+        if statement is None:
+            stack.pop()
+        elif isinstance(statement, ScopeBlockAst):
+            stack.append((iter(statement.statements), in_loop))
+        else:
+            yield statement, in_loop
+            parts = block_parts(statement)
+            if parts:
+                stack.append((iter(parts), in_loop or isinstance(statement, (WhileBlockAst, LoopBlockAst))))
+
+def scope_statements(scope):
+    # every statement of scope and of the blocks in it, conditions included
+    for statement, _ in walk_statements(scope):
+        yield statement
+
+def clone_statement(statement, rewrite, clone_body):
+    # the steps that copy statement with rewrite applied to its expression
+    # nodes and switch variable and the steps of clone_body to the scopes in
+    # it, the parsed tree is shared by every compile of a session and never
+    # changes
+    clone = copy.copy(statement)
+    if isinstance(statement, ExpressionAst):
+        if statement.expression is not None:
+            clone.expression = rewrite(statement.expression)
+        if statement.target is not None:
+            clone.target = rewrite(statement.target)
+    elif isinstance(statement, IfBlockAst):
+        clone.expression = yield from clone_statement(statement.expression, rewrite, clone_body)
+        clone.body = yield clone_body(statement.body)
+        clone.elif_blocks = []
+        for elif_expression, elif_body in statement.elif_blocks:
+            elif_expression = yield from clone_statement(elif_expression, rewrite, clone_body)
+            clone.elif_blocks.append((elif_expression, (yield clone_body(elif_body))))
+        if statement.else_block:
+            clone.else_block = yield clone_body(statement.else_block)
+    elif isinstance(statement, SwitchBlockAst):
+        clone.vname = rewrite((EXPR_NAME, statement.vname, 0))[1]
+        clone.cases = []
+        for case_expression, case_body in statement.cases:
+            clone.cases.append((case_expression, (yield clone_body(case_body))))
+        if statement.default_case is not None:
+            clone.default_case = yield clone_body(statement.default_case)
+    elif isinstance(statement, WhileBlockAst):
+        clone.expression = yield from clone_statement(statement.expression, rewrite, clone_body)
+        clone.body = yield clone_body(statement.body)
+    elif isinstance(statement, LoopBlockAst):
+        clone.body = yield clone_body(statement.body)
+    return clone
+
+def clone_scope_steps(scope, rewrite):
+    clone = copy.copy(scope)
+    clone.statements = []
+    for statement in scope.statements:
+        clone.statements.append((yield from clone_statement(statement, rewrite, lambda body: clone_scope_steps(body, rewrite))))
+    return clone
+
+def clone_scope(scope, rewrite):
+    return run_steps(clone_scope_steps(scope, rewrite))
+
+BUILTIN_FUNCTIONS = {"print": ("mur_print", 1), "len": ("mur_len", 1)}
+C_ESCAPES = {ord("\""): "\\\"", ord("\\"): "\\\\", ord("\n"): "\\n", ord("\t"): "\\t"}
+# C type of every type name allowed in extern blocks, with the conversions of
+# arguments to it and of results from it
+EXTERN_TYPES = {
+    "void": ("void", None, None),
+    "int": ("int", "(int)mur_to_int", "mur_int"),
+    "long": ("long", "(long)mur_to_int", "mur_int"),
+    "char": ("char", "(char)mur_to_int", "mur_int"),
+    "bool": ("int", "mur_truthy", "mur_bool"),
+    "float": ("float", "(float)mur_to_float", "mur_float"),
+    "double": ("double", "mur_to_float", "mur_float"),
+    "string": ("const char *", "mur_to_string", "mur_string"),
+}
+
+# translates a linked program to C, the output is produced as a stream of
+# chunks by the emit_c generators of the tree and never exists as one string
+class CGenerator:
+    def __init__(self, ast, switch_lowering = "auto", object_dispatch = OBJECT_SHAPES, object_allocation = OBJECT_ALLOCATION, inline_threshold = INLINE_THRESHOLD, prune = True, profile = False):
+        self.ast = ast
+        self.prune = prune
+        self.switch_lowering = switch_lowering
+        self.object_dispatch = object_dispatch
+        self.object_allocation = object_allocation
+        # a profiled program times every function, so nothing is inlined
+        self.profile = profile
+        self.inline_threshold = 0 if profile else inline_threshold
+        # the index of every function in the profile tables by id and the
+        # name of every loop in them
+        self.profile_functions = {}
+        self.profile_loops = []
+        # set while emit_units splits the program into headers and one C
+        # unit per module, functions are then linked across units, and the
+        # headers the code emitted for a unit needs
+        self.units = False
+        self.unit_headers = None
+        self.labels = 0
+        # the body of every function after inlining by id, the template that
+        # inlines each function and the number of inlined calls
+        self.bodies = {}
+        self.templates = {}
+        self.inlines = 0
+        self.caches = []
+        self.storages = []
+        # shapes by (keys, methods, constant functions) and in order, the
+        # shape of every object literal and the function of every static call
+        self.shape_indices = {}
+        self.shapes = []
+        self.literal_shapes = {}
+        self.static_targets = {}
+        self.assigned_fields = set()
+        # ({local: shape}, result shape) of every function
+        self.function_shapes = {}
+        self.local_shapes = {}
+        # escape of every object literal and call by id and of the parameters
+        # of every function, the functions that take the region of their
+        # caller or have an arena, and the literals for --escape-report
+        self.escapes = {}
+        self.parameter_escapes = {}
+        self.escape_calls = {}
+        self.region_functions = set()
+        self.arena_functions = set()
+        self.allocation_sites = []
+        self.loop_literals = set()
+        self.session = ast.session
+        self.module = ast
+        self.namespace = None
+        self.function = None
+        self.locals = []
+        self.local_set = set()
+        self.imports = {}
+        self.prefixes = {}
+        self.modules = self.program_modules()
+        # the functions, externs and modules left in the program, all of them
+        # until prune_program drops the ones main cannot reach
+        self.functions = [function for module in self.modules for namespace in module.namespaces.values() for function in namespace.functions.values()]
+        self.externs = [(function, module) for module in self.modules for function in module.external_functions.values()]
+        self.live = {id(function) for function in self.functions}
+        self.totals = {}
+
+    def resolve_includes(self, ast):
+        # module by the name it is used with in the including module
+        imports = self.imports.get(id(ast))
+        if imports is None:
+            imports = {}
+            for module_info, module_alias in ast.includes:
+                file = search_for_include_file(module_info, self.session.resolver)
+                sub_ast = self.session.module_graph.get(os.path.realpath(file)) if file else None
+                if sub_ast is None:
+                    print_compiler_error(f"could not find module '{'.'.join(module_info)}'", None, ast.module_name)
+                imports[module_alias or module_info[-1]] = sub_ast
+            self.imports[id(ast)] = imports
+        return imports
+
+    def program_modules(self):
+        # every module reachable from the program, included modules first
+        order = []
+        seen = {id(self.ast)}
+        stack = [(self.ast, iter(self.resolve_includes(self.ast).values()))]
+        while stack:
+            ast, pending = stack[-1]
+            for sub_ast in pending:
+                if id(sub_ast) not in seen:
+                    seen.add(id(sub_ast))
+                    stack.append((sub_ast, iter(self.resolve_includes(sub_ast).values())))
+                    break
+            else:
+                stack.pop()
+                order.append(ast)
+
+        used = set()
+        for ast in order:
+            base = "mur_" + re.sub(r"[^A-Za-z0-9_]", "_", ast.module_name)
+            prefix = base
+            suffix = 1
+            while prefix in used:
+                suffix += 1
+                prefix = f"{base}{suffix}"
+            used.add(prefix)
+            self.prefixes[id(ast)] = prefix
+        return order
+
+    def emit_program(self):
+        yield from self.emit_declarations()
+        for module in self.modules:
+            yield from module.emit_c(self)
+        yield from self.emit_profile_tables()
+        yield from self.emit_main()
+
+    def emit_units(self):
+        # the program split into headers and one C unit per module: the
+        # runtime, a header for every module declaring its externs and
+        # functions and one with the shapes, every unit only includes the
+        # headers of the modules and shapes its code uses, so it is only
+        # compiled again when they change, the unit of the program also holds
+        # the shape tables and main, returns the text of every header by name
+        # and the text and included headers of every unit by its prefix
+        self.units = True
+        runtime = "".join(self.emit_runtime())
+        self.analyze_program()
+        headers = {UNITS_RUNTIME_HEADER: runtime}
+        for module in self.modules:
+            headers[f"{self.prefixes[id(module)]}.h"] = "".join(self.emit_module_declarations(module))
+        order = list(headers)
+        self.unit_headers = set()
+        shapes = "".join(self.emit_shapes())
+        includes = "".join(f"#include \"{name}\"\n" for name in order[1:] if name in self.unit_headers)
+        headers[UNITS_SHAPES_HEADER] = (includes + "\n" if includes else "") + shapes
+        order.append(UNITS_SHAPES_HEADER)
+        for name in order[1:]:
+            guard = re.sub(r"[^A-Za-z0-9]", "_", name).upper()
+            headers[name] = f"#ifndef {guard}\n#define {guard}\n\n#include \"{UNITS_RUNTIME_HEADER}\"\n\n{headers[name]}#endif\n"
+        guard = re.sub(r"[^A-Za-z0-9]", "_", UNITS_RUNTIME_HEADER).upper()
+        headers[UNITS_RUNTIME_HEADER] = f"#ifndef {guard}\n#define {guard}\n\n{runtime}\n#endif\n"
+
+        units = {}
+        for module in self.modules:
+            prefix = self.prefixes[id(module)]
+            # labels are numbered per unit, an edit elsewhere leaves them be
+            self.labels = 0
+            self.unit_headers = {UNITS_RUNTIME_HEADER, f"{prefix}.h"}
+            parts = []
+            for namespace in module.namespaces.values():
+                for function in namespace.functions.values():
+                    if id(function) in self.live:
+                        parts.extend(self.function_value(function))
+            parts.extend(module.emit_c(self))
+            if module is self.ast:
+                parts.extend(self.emit_shape_tables())
+                parts.extend(self.emit_profile_tables())
+                parts.extend(self.emit_main())
+            includes = [name for name in order if name in self.unit_headers]
+            text = "".join(f"#include \"{name}\"\n" for name in includes) + "\n" + "".join(parts)
+            units[prefix] = (text, includes)
+        self.unit_headers = None
+        return headers, units
+
+    def emit_runtime(self):
+        with open(RUNTIME_HEADER) as f:
+            yield f.read()
+        if self.profile:
+            yield "\n"
+            with open(PROFILE_HEADER) as f:
+                yield f.read()
+
+    def analyze_program(self):
+        # functions only called where they were inlined are pruned again
+        phase = self.session.phase
+        if self.prune:
+            with phase("prune"):
+                self.prune_program()
+        if self.inline_threshold > 0:
+            with phase("inline"):
+                self.inline_functions()
+            if self.prune:
+                with phase("prune"):
+                    self.prune_program()
+        if self.profile:
+            self.profile_functions = {id(function): index for index, function in enumerate(self.functions)}
+        with phase("shape analysis"):
+            self.analyze_shapes()
+        with phase("escape analysis"):
+            self.analyze_escapes()
+
+    def emit_declarations(self):
+        # everything ahead of the function definitions
+        yield from self.emit_runtime()
+        yield "\n"
+        self.analyze_program()
+        for function, module in self.externs:
+            yield self.extern_declaration(function, module)
+        yield "\n"
+        for function in self.functions:
+            yield f"{self.function_signature(function)};\n"
+        yield "\n"
+        for function in self.functions:
+            yield from self.function_value(function)
+        yield from self.emit_shapes()
+
+    def emit_module_declarations(self, module):
+        # the externs and functions of module that are left in the program,
+        # every function value is defined once, by the unit of its module
+        for function, extern_module in self.externs:
+            if extern_module is module:
+                yield self.extern_declaration(function, module)
+        yield "\n"
+        functions = [function for function in self.functions if function.parent_ast.parent_ast is module]
+        for function in functions:
+            yield f"{self.function_signature(function)};\n"
+        yield "\n"
+        for function in functions:
+            name = self.function_name(function)
+            yield f"mur_value {name}__call(const mur_value *args);\n"
+            yield f"const mur_function *{name}__function(void);\n"
+        yield "\n"
+
+    def function_value(self, function):
+        # functions used as values are called through these, their results
+        # always live on the heap
+        name = self.function_name(function)
+        linkage = "" if self.units else "static inline "
+        arguments = [f"args[{index}]" for index in range(len(function.parameters))]
+        yield f"{linkage}mur_value {name}__call(const mur_value *args) {{\n"
+        if not function.parameters:
+            yield "    (void)args;\n"
+        yield f"    return {self.direct_call(function, 'NULL', arguments)};\n}}\n"
+        yield f"{linkage}const mur_function *{name}__function(void) {{\n"
+        yield f"    static const mur_function function = {{\"{function.parent_ast.name}.{function.name}\", {len(function.parameters)}, {name}__call}};\n"
+        yield "    return &function;\n}\n\n"
+
+    def main_function(self):
+        global_namespace = self.ast.namespaces.get("global")
+        return global_namespace.functions.get("main") if global_namespace else None
+
+    def prune_program(self):
+        # keeps the functions global.main reaches through the static paths in
+        # their bodies, the externs they call and the modules left with any
+        # of them, a program without a main keeps everything
+        main = self.main_function()
+        if main is None:
+            return
+        if not self.totals:
+            self.totals = [(module, len(module.external_functions), sum(len(namespace.functions) for namespace in module.namespaces.values())) for module in self.modules]
+        reached = {id(main)}
+        externs = set()
+        stack = [main]
+        while stack:
+            self.enter_function(stack.pop())
+            for statement in scope_statements(self.function_body(self.function)):
+                if not isinstance(statement, ExpressionAst):
+                    continue
+                nodes = [node for node in (statement.expression, statement.target) if node is not None]
+                while nodes:
+                    node = nodes.pop()
+                    if node[0] not in (EXPR_NAME, EXPR_FIELD, EXPR_REFERENCE) or not self.is_static_path(node):
+                        nodes.extend(expression_children(node))
+                        continue
+                    # unknown paths are reported by the code of live functions
+                    kind, target = self.lookup_path(node)[:2]
+                    if kind == "function" and id(target) not in reached:
+                        reached.add(id(target))
+                        stack.append(target)
+                    elif kind == "extern":
+                        externs.add(id(target))
+        self.functions = [function for function in self.functions if id(function) in reached]
+        self.externs = [(function, module) for function, module in self.externs if id(function) in externs]
+        self.live = reached
+        modules = {id(self.ast)}
+        modules.update(id(function.parent_ast.parent_ast) for function in self.functions)
+        modules.update(id(module) for _, module in self.externs)
+        self.modules = [module for module in self.modules if id(module) in modules]
+
+    def prune_report(self):
+        # a line for every module that lost code and one for the program
+        if not self.totals:
+            return ["nothing pruned"]
+        kept = {id(module): [0, 0] for module in self.modules}
+        for _, module in self.externs:
+            kept[id(module)][0] += 1
+        for function in self.functions:
+            kept[id(function.parent_ast.parent_ast)][1] += 1
+        lines = []
+        for module, externs, functions in self.totals:
+            if id(module) not in kept:
+                lines.append(f"{module.module_name}: pruned the module, {functions} functions and {externs} extern declarations")
+            elif kept[id(module)] != [externs, functions]:
+                kept_externs, kept_functions = kept[id(module)]
+                lines.append(f"{module.module_name}: kept {kept_functions} of {functions} functions and {kept_externs} of {externs} extern declarations")
+        total_externs = sum(externs for _, externs, _ in self.totals)
+        total_functions = sum(functions for _, _, functions in self.totals)
+        lines.append(f"kept {len(self.functions)} of {total_functions} functions, {len(self.externs)} of {total_externs} extern declarations and {len(self.modules)} of {len(self.totals)} modules")
+        return lines
+
+    def emit_main(self):
+        main = self.main_function()
+        if main is None:
+            return
+        if len(main.parameters) > 1:
+            print_compiler_error("main takes at most one parameter", None, self.ast.module_name)
+        yield "int main(int argc, char **argv) {\n"
+        if self.profile:
+            yield "    mur_profile_start();\n"
+        if main.parameters:
+            yield "    mur_value args = mur_array_new(0, NULL);\n"
+            yield "    for (int i = 0; i < argc; i++) {\n"
+            yield "        mur_array_push(args.as.a, mur_string(argv[i]));\n"
+            yield "    }\n"
+            yield f"    mur_value result = {self.direct_call(main, 'NULL', ['args'])};\n"
+        else:
+            yield "    (void)argc;\n"
+            yield "    (void)argv;\n"
+            yield f"    mur_value result = {self.direct_call(main, 'NULL', [])};\n"
+        yield "    return result.type == MUR_INT ? (int)result.as.i : 0;\n}\n"
+
+    def profile_location(self, function, line):
+        # functions and loops are named after their .mur file and line
+        return f"{os.path.basename(function.parent_ast.parent_ast.file)}:{line}"
+
+    def profile_loop(self, kind, line):
+        function = self.function
+        self.profile_loops.append(f"{kind} ({self.profile_location(function, line)}) in {function.parent_ast.name}.{function.name}")
+        return len(self.profile_loops) - 1
+
+    def emit_profile_tables(self):
+        # the tables of the profile, after every function numbered its loops
+        if not self.profile:
+            return
+        functions = [None] * len(self.profile_functions)
+        for function in self.functions:
+            functions[self.profile_functions[id(function)]] = function
+        yield "mur_profile_function mur_profile_functions[] = {\n"
+        for function in functions:
+            name = f"{function.parent_ast.name}.{function.name} ({self.profile_location(function, function.span.tokens.lines[function.span.start])})"
+            yield f"    {{{self.c_string(name.encode())}, 0, 0, 0, 0}},\n"
+        if not functions:
+            yield "    {NULL, 0, 0, 0, 0},\n"
+        yield "};\n"
+        yield "mur_profile_loop mur_profile_loops[] = {\n"
+        for name in self.profile_loops:
+            yield f"    {{{self.c_string(name.encode())}, 0}},\n"
+        if not self.profile_loops:
+            yield "    {NULL, 0},\n"
+        yield "};\n"
+        yield f"const size_t mur_profile_function_count = {len(functions)};\n"
+        yield f"const size_t mur_profile_loop_count = {len(self.profile_loops)};\n"
+        yield "mur_profile_state mur_profile;\n\n"
+
+    def extern_declaration(self, function, module):
+        parameter_types = []
+        for parameter in function.parameters:
+            extern_type = EXTERN_TYPES.get(parameter.string)
+            if extern_type is None or extern_type[1] is None:
+                print_compiler_error(f"unknown parameter type '{parameter.string}'", parameter, module.module_name)
+            parameter_types.append(extern_type[0])
+        if function.return_type not in EXTERN_TYPES:
+            print_compiler_error(f"unknown return type '{function.return_type}' of '{function.name}'", None, module.module_name)
+        return f"extern {EXTERN_TYPES[function.return_type][0]} {function.name}({', '.join(parameter_types) or 'void'});\n"
+
+    def function_name(self, function):
+        namespace = function.parent_ast
+        prefix = self.prefixes[id(namespace.parent_ast)]
+        if self.unit_headers is not None:
+            self.unit_headers.add(f"{prefix}.h")
+        return f"{prefix}__{namespace.name}__{function.name}"
+
+    def shape_name(self, shape):
+        if self.unit_headers is not None:
+            self.unit_headers.add(UNITS_SHAPES_HEADER)
+        return f"mur_shape_{shape}"
+
+    def function_signature(self, function):
+        parameters = [f"mur_value v_{parameter}" for parameter in function.parameters]
+        if id(function) in self.region_functions:
+            parameters.insert(0, "mur_arena *mur_region")
+        linkage = "" if self.units else "static "
+        return f"{linkage}mur_value {self.function_name(function)}({', '.join(parameters) or 'void'})"
+
+    def direct_call(self, function, region, arguments):
+        # region is the arena the objects the function returns are made in
+        if id(function) in self.region_functions:
+            arguments = [region] + arguments
+        return f"{self.function_name(function)}({', '.join(arguments)})"
+
+    def begin_function(self, function):
+        # every assigned name is a local of the whole function, declared on entry
+        self.function = function
+        names = dict.fromkeys(function.parameters)
+        self.collect_locals(self.function_body(function), names)
+        self.locals = list(names)
+        self.local_set = set(names)
+        self.local_shapes = self.function_shapes.get(id(function), ({}, None))[0]
+        self.caches = []
+        self.storages = []
+
+    def collect_locals(self, scope, names):
+        for statement in scope_statements(scope):
+            if isinstance(statement, ExpressionAst) and statement.kind == STATEMENT_ASSIGNMENT and statement.target[0] == EXPR_NAME:
+                names[statement.target[1]] = None
+
+    def new_cache(self):
+        # an inline cache of the current function, declared static on entry
+        self.caches.append(f"mur_cache_{len(self.caches)}")
+        return f"&{self.caches[-1]}"
+
+    def function_body(self, function):
+        return self.bodies.get(id(function), function.body)
+
+    def enter_function(self, function):
+        self.namespace = function.parent_ast
+        self.module = self.namespace.parent_ast
+        self.begin_function(function)
+
+    def inline_functions(self):
+        # replaces calls of small functions by their bodies, the callees of a
+        # function are inlined into first and a call of a function that is
+        # already being inlined is left as it is
+        for function in self.functions:
+            if id(function) not in self.bodies:
+                self.inline_function(function, ())
+
+    def inline_function(self, function, stack):
+        stack = stack + (function,)
+        self.enter_function(function)
+        # the names inlined locals are renamed away from
+        taken = set(self.locals)
+        for statement in scope_statements(function.body):
+            if isinstance(statement, SwitchBlockAst):
+                taken.add(statement.vname)
+            elif isinstance(statement, ExpressionAst):
+                for node in (statement.expression, statement.target):
+                    nodes = [node] if node is not None else []
+                    while nodes:
+                        node = nodes.pop()
+                        if node[0] == EXPR_NAME:
+                            taken.add(node[1])
+                        nodes.extend(expression_children(node))
+        body = run_steps(self.inline_scope(function.body, stack, taken))
+        self.bodies[id(function)] = body
+        self.enter_function(function)
+        self.templates[id(function)] = self.inline_template(function, body)
+
+    def inline_scope(self, scope, stack, taken):
+        # the steps that clone scope with the calls in it inlined
+        clone = copy.copy(scope)
+        clone.statements = []
+        rewrite = lambda node: self.inline_node(node, stack, taken)
+        clone_body = lambda body: self.inline_scope(body, stack, taken)
+        for statement in scope.statements:
+            statement = yield from clone_statement(statement, rewrite, clone_body)
+            node = statement.expression if isinstance(statement, ExpressionAst) else None
+            template = None
+            # a call that is a whole statement, the value of an assignment to
+            # a local or a return value is replaced by the statements of its
+            # function when its arguments rule out substituting them
+            if node is not None and node[0] == EXPR_CALL:
+                if statement.kind != STATEMENT_ASSIGNMENT or statement.operator is None and statement.target[0] == EXPR_NAME:
+                    template = self.call_template(node, stack)
+            if template is None:
+                clone.statements.append(statement)
+            else:
+                clone.statements.extend(self.inline_statements(statement, template, node[2], taken))
+        return clone
+
+    def call_template(self, node, stack):
+        # the template that inlines a call, None if it is left as a call
+        callee = node[1]
+        if not self.is_static_path(callee):
+            return None
+        reference = self.lookup_path(callee)
+        if reference[0] != "function" or reference[1] in stack or len(node[2]) != len(reference[1].parameters):
+            return None
+        function = reference[1]
+        if id(function) not in self.bodies:
+            self.inline_function(function, stack)
+            self.enter_function(stack[-1])
+        return self.templates[id(function)]
+
+    def inline_node(self, node, stack, taken):
+        # node with the calls in it whose arguments can be substituted into
+        # the returned expression of their function replaced by it
+        node = map_children(node, lambda child: self.inline_node(child, stack, taken))
+        if node[0] != EXPR_CALL:
+            return node
+        template = self.call_template(node, stack)
+        if template is None or template[2]:
+            return node
+        parameters, _, _, result, uses, conditional = template
+        for parameter, argument in zip(parameters, node[2]):
+            # constants and names may be read any number of times, any other
+            # argument is evaluated exactly once
+            if argument[0] > EXPR_NAME and argument[0] != EXPR_REFERENCE and (uses.get(parameter) != 1 or parameter in conditional):
+                return node
+        self.inlines += 1
+        return replace_names(result, dict(zip(parameters, node[2])))
+
+    def inline_statements(self, statement, template, arguments, taken):
+        # the arguments are assigned to renamed parameters in order, the
+        # other locals start out nil and the returned expression takes the
+        # place of the call
+        parameters, names, statements, result, _, _ = template
+        mapping = {}
+        for name in names:
+            fresh = name
+            suffix = 1
+            while fresh in taken:
+                suffix += 1
+                fresh = f"{name}_{suffix}"
+            taken.add(fresh)
+            mapping[name] = (EXPR_NAME, fresh, 0)
+        self.inlines += 1
+        inlined = []
+        for name in names:
+            assignment = copy.copy(statement)
+            assignment.kind = STATEMENT_ASSIGNMENT
+            assignment.target = mapping[name]
+            assignment.operator = None
+            assignment.expression = arguments[parameters.index(name)] if name in parameters else (EXPR_NIL,)
+            inlined.append(assignment)
+        rewrite = lambda node: replace_names(node, mapping)
+        inlined.extend(run_steps(clone_statement(inner, rewrite, lambda body: clone_scope_steps(body, rewrite))) for inner in statements)
+        result = replace_names(result, mapping)
+        if statement.kind != STATEMENT_EXPRESSION or result[0] not in (EXPR_NIL, EXPR_INT, EXPR_FLOAT, EXPR_STRING, EXPR_NAME, EXPR_REFERENCE):
+            last = copy.copy(statement)
+            last.expression = result
+            inlined.append(last)
+        return inlined
+
+    def inline_template(self, function, body):
+        # (parameters, locals, statements, result, uses, conditional) that
+        # inline function, with every static path in it resolved in its own
+        # namespace, result is what it returns after its statements and uses
+        # and conditional are the reads of each name in result, None when it
+        # is too large, returns before its last statement or does not compile
+        statements = body.statements
+        size = 0
+        returns = 0
+        for statement in scope_statements(body):
+            size += 1
+            if isinstance(statement, ExpressionAst):
+                size += sum(node_size(node) for node in (statement.expression, statement.target) if node is not None)
+                returns += statement.kind == STATEMENT_RETURN
+        ends = bool(statements) and isinstance(statements[-1], ExpressionAst) and statements[-1].kind == STATEMENT_RETURN
+        if size > self.inline_threshold or returns != ends:
+            return None
+        problems = []
+        resolved = clone_scope(body, lambda node: self.resolve_static(node, problems))
+        if problems:
+            return None
+        result = (EXPR_NIL,)
+        if ends:
+            result = resolved.statements.pop().expression or result
+        uses = {}
+        conditional = set()
+        count_names(result, uses, conditional, False)
+        return (function.parameters, self.locals, resolved.statements, result, uses, conditional)
+
+    def resolve_static(self, node, problems):
+        # node with its static paths replaced by references, a path that does
+        # not compile is added to problems
+        kind = node[0]
+        if kind in (EXPR_NAME, EXPR_FIELD) and self.is_static_path(node):
+            reference = self.lookup_path(node)
+            if reference[0] != "function":
+                problems.append(node)
+            return (EXPR_REFERENCE, reference)
+        if kind == EXPR_CALL and node[1][0] in (EXPR_NAME, EXPR_FIELD) and self.is_static_path(node[1]):
+            reference = self.lookup_path(node[1])
+            if reference[0] == "error":
+                problems.append(node)
+            elif reference[0] == "builtin":
+                if len(node[2]) != BUILTIN_FUNCTIONS[reference[1]][1]:
+                    problems.append(node)
+            elif len(node[2]) != len(reference[1].parameters):
+                problems.append(node)
+            return (kind, (EXPR_REFERENCE, reference), tuple(self.resolve_static(argument, problems) for argument in node[2]), node[3])
+        return map_children(node, lambda child: self.resolve_static(child, problems))
+
+    def analyze_shapes(self):
+        # registers the shape of every object literal, then widens the shapes
+        # of locals and function results until they settle, a local or result
+        # keeps a shape only if no value of another shape can reach it
+        facts = []
+        for function in self.functions:
+            self.enter_function(function)
+            assignments = [(parameter, None) for parameter in function.parameters]
+            returns = []
+            self.collect_shape_facts(self.function_body(function), assignments, returns)
+            statements = self.function_body(function).statements
+            if not statements or not isinstance(statements[-1], ExpressionAst) or statements[-1].kind != STATEMENT_RETURN:
+                returns.append(None)
+            facts.append((function, assignments, returns))
+            self.function_shapes[id(function)] = ({}, SHAPE_UNSET)
+        if self.object_dispatch == OBJECT_DYNAMIC:
+            return
+
+        changed = True
+        while changed:
+            changed = False
+            for function, assignments, returns in facts:
+                local_shapes, result = self.function_shapes[id(function)]
+                for name, node in assignments:
+                    shape = local_shapes.get(name, SHAPE_UNSET)
+                    joined = join_shape(shape, None if node is None else self.node_shape(node, local_shapes))
+                    if joined != shape or name not in local_shapes:
+                        local_shapes[name] = joined
+                        changed = True
+                joined = result
+                for node in returns:
+                    joined = join_shape(joined, None if node is None else self.node_shape(node, local_shapes))
+                if joined != result:
+                    self.function_shapes[id(function)] = (local_shapes, joined)
+                    changed = True
+
+    def collect_shape_facts(self, scope, assignments, returns):
+        # conditions are expression statements of the walk too
+        for statement in scope_statements(scope):
+            if not isinstance(statement, ExpressionAst):
+                continue
+            if statement.expression is not None:
+                self.collect_literals(statement.expression)
+            if statement.kind == STATEMENT_ASSIGNMENT:
+                target = statement.target
+                self.collect_literals(target)
+                if target[0] == EXPR_FIELD:
+                    self.assigned_fields.add(target[2])
+                # every local starts out nil, assigning nil adds no shape
+                if target[0] == EXPR_NAME and (statement.operator is not None or statement.expression[0] != EXPR_NIL):
+                    assignments.append((target[1], statement.expression if statement.operator is None else None))
+            elif statement.kind == STATEMENT_RETURN:
+                returns.append(statement.expression)
+
+    def collect_literals(self, node):
+        # shapes of the object literals and targets of the static calls in node
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            kind = node[0]
+            if kind == EXPR_OBJECT:
+                functions = []
+                for value in node[3]:
+                    reference = self.lookup_path(value) if value[0] in (EXPR_NAME, EXPR_FIELD, EXPR_REFERENCE) and self.is_static_path(value) else None
+                    functions.append(reference[1] if reference and reference[0] == "function" else None)
+                key = (node[1], node[2], tuple(functions))
+                if key not in self.shape_indices:
+                    self.shape_indices[key] = len(self.shapes)
+                    self.shapes.append(key)
+                self.literal_shapes[id(node)] = self.shape_indices[key]
+            elif kind == EXPR_CALL and self.is_static_path(node[1]):
+                reference = self.lookup_path(node[1])
+                if reference[0] == "function":
+                    self.static_targets[id(node)] = reference[1]
+            stack.extend(expression_children(node))
+
+    def node_shape(self, node, local_shapes):
+        # shape of the objects node evaluates to, None if it is not known
+        kind = node[0]
+        if kind == EXPR_OBJECT:
+            return self.literal_shapes[id(node)]
+        if kind == EXPR_NAME:
+            return local_shapes.get(node[1])
+        # a receiver without a shape yet may still get one
+        function = None
+        if kind == EXPR_CALL:
+            function = self.static_targets.get(id(node))
+            if function is None and node[1][0] == EXPR_FIELD:
+                receiver = self.node_shape(node[1][1], local_shapes)
+                if receiver == SHAPE_UNSET:
+                    return SHAPE_UNSET
+                method = self.shape_method(receiver, node[1][2], len(node[2]))
+                function = method[1] if method else None
+        elif kind == EXPR_BINARY and node[1] in OPERATOR_FIELDS:
+            left = self.node_shape(node[2], local_shapes)
+            if left == SHAPE_UNSET:
+                return SHAPE_UNSET
+            operator = self.shape_operator(left, node[1])
+            function = operator[1] if operator else None
+        if function is None:
+            return None
+        return self.function_shapes[id(function)][1]
+
+    def shape_of(self, node):
+        if self.object_dispatch == OBJECT_DYNAMIC:
+            return None
+        shape = self.node_shape(node, self.local_shapes)
+        return None if shape == SHAPE_UNSET else shape
+
+    def shape_slot(self, shape, key):
+        if shape is None or shape == SHAPE_UNSET or key not in self.shapes[shape][0]:
+            return None
+        return self.shapes[shape][0].index(key)
+
+    def shape_method(self, shape, key, argc):
+        # slot and function a call of key with argc arguments reaches in every
+        # object of the shape, if the literal stored a function there
+        slot = self.shape_slot(shape, key)
+        if slot is None:
+            return None
+        _, methods, functions = self.shapes[shape]
+        function = functions[slot]
+        if function is None or len(function.parameters) != argc + methods[slot]:
+            return None
+        return slot, function
+
+    def shape_operator(self, shape, operator):
+        slot = self.shape_slot(shape, OPERATOR_FIELDS[operator])
+        if slot is None:
+            return None
+        function = self.shapes[shape][2][slot]
+        if function is None or len(function.parameters) != 2:
+            return None
+        return slot, function
+
+    def analyze_escapes(self):
+        # finds how far the value of every object literal and call travels,
+        # parameters start out staying in their call and widen until the
+        # escapes of every function settle
+        facts = []
+        for function in self.functions:
+            self.enter_function(function)
+            uses = []
+            self.collect_escape_uses(self.function_body(function), uses, False)
+            facts.append((function, uses))
+            self.parameter_escapes[id(function)] = [ESCAPE_NONE] * len(function.parameters)
+        if self.object_allocation == OBJECT_HEAP:
+            return
+
+        changed = True
+        while changed:
+            changed = False
+            for function, uses in facts:
+                escapes = self.resolve_escapes(uses)
+                parameters = [escapes.get(("local", parameter), ESCAPE_NONE) for parameter in function.parameters]
+                if parameters != self.parameter_escapes[id(function)]:
+                    self.parameter_escapes[id(function)] = parameters
+                    changed = True
+        for function, uses in facts:
+            for key, escape in self.resolve_escapes(uses).items():
+                if not isinstance(key, tuple):
+                    self.escapes[key] = escape
+
+        # a function takes the region of its caller if it returns an object
+        # it made, or the result of a call that takes its region
+        for function, _, node, _ in self.allocation_sites:
+            if self.escapes[id(node)] == ESCAPE_RETURN:
+                self.region_functions.add(id(function))
+        changed = True
+        while changed:
+            changed = False
+            for key, (target, function) in self.escape_calls.items():
+                if id(function) not in self.region_functions and id(target) in self.region_functions and self.escapes.get(key) == ESCAPE_RETURN:
+                    self.region_functions.add(id(function))
+                    changed = True
+        for function, _, node, in_loop in self.allocation_sites:
+            if self.escapes[id(node)] == ESCAPE_NONE and in_loop:
+                self.arena_functions.add(id(function))
+        for key, (target, function) in self.escape_calls.items():
+            if id(target) in self.region_functions and self.escapes.get(key) == ESCAPE_NONE:
+                self.arena_functions.add(id(function))
+
+    def resolve_escapes(self, uses):
+        # values that may be the same object share a group and the escape
+        # of the group is the widest use of any of them
+        parents = {}
+        for key, use in uses:
+            if use[0] == "alias" or (use[0] == "argument" and self.parameter_escapes[id(use[1])][use[2]] == ESCAPE_RETURN):
+                parents[find_root(parents, key)] = find_root(parents, use[-1])
+        groups = {}
+        for key, use in uses:
+            if use[0] == "use":
+                escape = use[1]
+            elif use[0] == "argument" and self.parameter_escapes[id(use[1])][use[2]] == ESCAPE_ALL:
+                escape = ESCAPE_ALL
+            else:
+                escape = ESCAPE_NONE
+            root = find_root(parents, key)
+            groups[root] = max(groups.get(root, ESCAPE_NONE), escape)
+        return {key: groups.get(find_root(parents, key), ESCAPE_NONE) for key in list(parents)}
+
+    def collect_escape_uses(self, scope, uses, in_loop):
+        # conditions are expression statements of the walk too, the one of a
+        # while runs in its loop
+        for statement, in_loop in walk_statements(scope, in_loop):
+            if not isinstance(statement, ExpressionAst):
+                continue
+            if statement.kind == STATEMENT_RETURN:
+                if statement.expression is not None:
+                    self.escape_node(statement.expression, ("use", ESCAPE_RETURN), uses, statement, in_loop)
+            elif statement.kind == STATEMENT_ASSIGNMENT:
+                target = statement.target
+                use = ("use", ESCAPE_ALL)
+                if target[0] == EXPR_NAME:
+                    if statement.operator is None:
+                        use = ("alias", ("local", target[1]))
+                    else:
+                        uses.append((("local", target[1]), use))
+                else:
+                    self.escape_node(target[1], ("use", ESCAPE_NONE), uses, statement, in_loop)
+                    if target[0] == EXPR_INDEX:
+                        self.escape_node(target[2], ("use", ESCAPE_NONE), uses, statement, in_loop)
+                self.escape_node(statement.expression, use, uses, statement, in_loop)
+            elif statement.kind == STATEMENT_EXPRESSION:
+                self.escape_node(statement.expression, ("use", ESCAPE_NONE), uses, statement, in_loop)
+
+    def escape_node(self, node, use, uses, statement, in_loop):
+        # records the use of the value of node and the uses its operands get,
+        # a use is ("use", escape), ("alias", key) of a value it is stored in
+        # or ("argument", function, index, key) of the call it is passed to
+        kind = node[0]
+        key = None
+        operands = ()
+        kept = ("use", ESCAPE_NONE)
+        if kind == EXPR_NAME:
+            if node[1] in self.local_set:
+                key = ("local", node[1])
+        elif kind == EXPR_OBJECT:
+            key = id(node)
+            self.allocation_sites.append((self.function, statement, node, in_loop))
+            if in_loop:
+                self.loop_literals.add(key)
+            operands = [(value, ("use", ESCAPE_ALL)) for value in node[3]]
+        elif kind == EXPR_ARRAY:
+            operands = [(item, ("use", ESCAPE_ALL)) for item in node[1]]
+        elif kind == EXPR_CALL:
+            key, operands = self.escape_call(node)
+        elif kind == EXPR_BINARY:
+            operator = None
+            if node[1] in OPERATOR_FIELDS and OPERATOR_FIELDS[node[1]] not in self.assigned_fields:
+                operator = self.shape_operator(self.shape_of(node[2]), node[1])
+            if operator:
+                key = id(node)
+                self.escape_calls[key] = (operator[1], self.function)
+                operands = [(node[2], ("argument", operator[1], 0, key)), (node[3], ("argument", operator[1], 1, key))]
+            else:
+                # overloads of other shapes may keep both operands
+                escape = ("use", ESCAPE_ALL) if node[1] in OPERATOR_FIELDS else kept
+                operands = [(node[2], escape), (node[3], escape)]
+        elif kind == EXPR_FIELD:
+            if not self.is_static_path(node):
+                operands = [(node[1], kept)]
+        else:
+            operands = [(child, kept) for child in expression_children(node)]
+        if key is not None:
+            uses.append((key, use))
+        for operand, operand_use in operands:
+            self.escape_node(operand, operand_use, uses, statement, in_loop)
+
+    def escape_call(self, node):
+        # the key of the result of a call to a known function and the uses
+        # of the callee and arguments
+        callee, arguments = node[1], node[2]
+        escaped = [(argument, ("use", ESCAPE_ALL)) for argument in arguments]
+        target = None
+        operands = []
+        offset = 0
+        if self.is_static_path(callee):
+            reference = self.lookup_path(callee)
+            if reference[0] != "function":
+                # builtins and externs do not keep their arguments
+                return None, [(argument, ("use", ESCAPE_NONE)) for argument in arguments]
+            target = reference[1]
+        elif callee[0] == EXPR_FIELD:
+            # an object that left its shape is dispatched by name and reaches
+            # the same function, unless the program assigns to that field
+            method = None
+            if callee[2] not in self.assigned_fields:
+                method = self.shape_method(self.shape_of(callee[1]), callee[2], len(arguments))
+            if method is None:
+                return None, [(callee[1], ("use", ESCAPE_ALL))] + escaped
+            slot, target = method
+            offset = self.shapes[self.shape_of(callee[1])][1][slot]
+            operands.append((callee[1], ("argument", target, 0, id(node)) if offset else ("use", ESCAPE_NONE)))
+        else:
+            return None, [(callee, ("use", ESCAPE_NONE))] + escaped
+        if len(arguments) + offset != len(target.parameters):
+            return None, operands + escaped
+        self.escape_calls[id(node)] = (target, self.function)
+        operands.extend((argument, ("argument", target, index + offset, id(node))) for index, argument in enumerate(arguments))
+        return id(node), operands
+
+    def call_region(self, node, target):
+        # the arena a call makes the objects it returns in
+        escape = self.escapes.get(id(node), ESCAPE_ALL)
+        if id(target) not in self.region_functions or escape == ESCAPE_ALL:
+            return "NULL"
+        return "&mur_frame" if escape == ESCAPE_NONE else "mur_region"
+
+    def object_allocation_site(self, node):
+        escape = self.escapes.get(id(node), ESCAPE_ALL)
+        if escape == ESCAPE_RETURN:
+            return "caller's region"
+        if escape == ESCAPE_NONE:
+            return "arena" if id(node) in self.loop_literals else "stack"
+        return "heap"
+
+    def escape_report(self):
+        # one line for every object literal that is not allocated on the heap
+        lines = []
+        for function, statement, node, _ in self.allocation_sites:
+            placement = self.object_allocation_site(node)
+            if placement != "heap":
+                span = statement.tokens
+                fields = ", ".join(("@" if method else "") + key for key, method in zip(node[1], node[2]))
+                lines.append(f"{statement.module_name}:{span.tokens.lines[span.start]}: {{{{ {fields} }}}} in {function.parent_ast.name}.{function.name}: {placement}")
+        lines.append(f"{len(lines)} of {len(self.allocation_sites)} object literals allocated off the heap")
+        return lines
+
+    def emit_shapes(self):
+        # the key tables of every shape and its method table, calls through
+        # the table reach the stored function directly while the object keeps
+        # its shape and go through the name lookup otherwise
+        for index, (keys, methods, functions) in enumerate(self.shapes):
+            name = self.shape_name(index)
+            fields = ", ".join(("@" if method else "") + key for key, method in zip(keys, methods))
+            yield f"/* {fields or 'no fields'} */\n"
+            # split into units the tables are defined once, objects are
+            # matched to their shape by its address
+            if self.units:
+                yield f"extern const mur_shape {name};\n"
+            else:
+                yield from self.shape_table(index)
+            if not keys:
+                yield f"typedef struct {name}_object {{\n    mur_object object;\n}} {name}_object;\n\n"
+                continue
+            # objects of the shape that live on the stack
+            yield f"typedef struct {name}_object {{\n    mur_object object;\n    mur_value values[{len(keys)}];\n}} {name}_object;\n"
+            for slot, function in enumerate(functions):
+                if function is None:
+                    continue
+                key = keys[slot]
+                region = ["mur_arena *mur_region"] if id(function) in self.region_functions else []
+                argc = len(function.parameters) - methods[slot]
+                if argc >= 0:
+                    arguments = [f"a{argument}" for argument in range(argc)]
+                    parameters = ", ".join(region + ["mur_value self"] + [f"mur_value {argument}" for argument in arguments])
+                    direct = self.direct_call(function, "mur_region", (["self"] if methods[slot] else []) + arguments)
+                    yield f"static inline mur_value {name}__{key}({parameters}) {{\n"
+                    yield f"    if (self.type == MUR_OBJECT && self.as.o->shape == &{name}) {{\n"
+                    yield f"        return {direct};\n    }}\n"
+                    yield f"    return mur_call_method(self, {self.c_string(key.encode())}, {argc}, {self.value_array(arguments)});\n}}\n"
+                for operator, field in OPERATOR_FIELDS.items():
+                    if field == key and len(function.parameters) == 2:
+                        parameters = ", ".join(region + ["mur_value left", "mur_value right"])
+                        yield f"static inline mur_value {name}__{key}__operator({parameters}) {{\n"
+                        yield f"    if (left.type == MUR_OBJECT && left.as.o->shape == &{name}) {{\n"
+                        yield f"        return {self.direct_call(function, 'mur_region', ['left', 'right'])};\n    }}\n"
+                        yield f"    return {BINARY_FUNCTIONS[operator]}(left, right);\n}}\n"
+            yield "\n"
+
+    def shape_table(self, index):
+        keys, methods, functions = self.shapes[index]
+        name = self.shape_name(index)
+        linkage = "" if self.units else "static "
+        if not keys:
+            yield f"{linkage}const mur_shape {name} = {{0, NULL, NULL, NULL}};\n"
+            return
+        yield f"static const char *const {name}_keys[] = {{{', '.join(self.c_string(key.encode()) for key in keys)}}};\n"
+        yield f"static const unsigned char {name}_methods[] = {{{', '.join('1' if method else '0' for method in methods)}}};\n"
+        yield f"static const unsigned char {name}_constants[] = {{{', '.join('0' if function is None else '1' for function in functions)}}};\n"
+        yield f"{linkage}const mur_shape {name} = {{{len(keys)}, {name}_keys, {name}_methods, {name}_constants}};\n"
+
+    def emit_shape_tables(self):
+        for index in range(len(self.shapes)):
+            yield from self.shape_table(index)
+        if self.shapes:
+            yield "\n"
+
+    def new_label(self, name):
+        self.labels += 1
+        return f"{name}_{self.labels}"
+
+    def switch_strategy(self, switch):
+        # picks the lowering of a switch from its folded case values, returns
+        # it with the (key, body) pairs to dispatch to, later duplicates of a
+        # case value can never run and are dropped
+        if self.switch_lowering == SWITCH_CHAIN or len(switch.cases) < SWITCH_MIN_CASES:
+            return SWITCH_CHAIN, None
+        kinds = {case_expression.expression[0] for case_expression, _ in switch.cases}
+        if kinds != {EXPR_INT} and kinds != {EXPR_STRING}:
+            return SWITCH_CHAIN, None
+        cases = {}
+        for case_expression, case_body in switch.cases:
+            key = case_expression.expression[1]
+            if kinds == {EXPR_STRING}:
+                # the runtime compares C strings, which end at the first NUL
+                key = key.split(b"\0", 1)[0]
+            cases.setdefault(key, case_body)
+        cases = sorted(cases.items())
+
+        if kinds == {EXPR_STRING}:
+            if len({string_hash(key) for key, _ in cases}) != len(cases):
+                return SWITCH_CHAIN, None
+            return SWITCH_HASH, sorted(cases, key = lambda case: string_hash(case[0]))
+        if cases[0][0] < -SWITCH_MAX_KEY or cases[-1][0] > SWITCH_MAX_KEY:
+            return SWITCH_CHAIN, None
+        key_range = cases[-1][0] - cases[0][0] + 1
+        if len(cases) >= key_range * (1 - SWITCH_MAX_HOLES):
+            return SWITCH_DENSE, cases
+        return SWITCH_SEARCH, cases
+
+    def variable(self, name):
+        if name not in self.local_set:
+            print_compiler_error(f"unknown variable '{name}'", None, self.module.module_name)
+        return f"v_{name}"
+
+    def statement(self, expression):
+        kind = expression.kind
+        if kind == STATEMENT_EXPRESSION:
+            return f"{self.c_expression(expression.expression, expression)};"
+        if kind == STATEMENT_RETURN:
+            value = "mur_nil()" if expression.expression is None else self.c_expression(expression.expression, expression)
+            # the call ends after its result is computed
+            leave = []
+            if id(self.function) in self.arena_functions:
+                leave.append("mur_arena_release(&mur_frame);")
+            if self.profile:
+                leave.append("mur_profile_leave(&mur_profile_call);")
+            if leave:
+                return f"{{ mur_value mur_result = {value}; {' '.join(leave)} return mur_result; }}"
+            return f"return {value};"
+        if kind == STATEMENT_BREAK:
+            return "break;"
+        if kind == STATEMENT_CONTINUE:
+            return "continue;"
+
+        value = self.c_expression(expression.expression, expression)
+        target = expression.target
+        operator = BINARY_FUNCTIONS.get(expression.operator)
+        if target[0] == EXPR_NAME:
+            variable = self.variable(target[1])
+            if operator:
+                value = f"{operator}({variable}, {value})"
+            return f"{variable} = {value};"
+        base = self.c_expression(target[1], expression)
+        if target[0] == EXPR_FIELD:
+            field = self.c_string(target[2].encode())
+            if operator is None:
+                shape = self.shape_of(target[1])
+                slot = self.shape_slot(shape, target[2])
+                if slot is not None and not self.shapes[shape][2][slot]:
+                    return f"mur_shape_set_field({base}, &{self.shape_name(shape)}, {slot}, {field}, {value});"
+                if self.object_dispatch == OBJECT_DYNAMIC:
+                    return f"mur_set_field({base}, {field}, {value});"
+                return f"mur_set_field_cached({base}, {field}, {value}, {self.new_cache()});"
+            return f"{{ mur_value mur_target = {base}; mur_set_field(mur_target, {field}, {operator}(mur_get_field(mur_target, {field}), {value})); }}"
+        key = self.c_expression(target[2], expression)
+        if operator is None:
+            return f"mur_set_index({base}, {key}, {value});"
+        return f"{{ mur_value mur_target = {base}, mur_key = {key}; mur_set_index(mur_target, mur_key, {operator}(mur_get_index(mur_target, mur_key), {value})); }}"
+
+    def expression(self, expression):
+        return self.c_expression(expression.expression, expression)
+
+    def condition(self, expression):
+        node = expression.expression
+        if node[0] <= EXPR_STRING:
+            return "1" if constant_truthy(node) else "0"
+        return f"mur_truthy({self.c_expression(node, expression)})"
+
+    def c_expression(self, node, expression):
+        kind = node[0]
+        if kind == EXPR_NIL:
+            return "mur_nil()"
+        if kind == EXPR_INT:
+            return f"mur_int({self.c_integer(node[1])})"
+        if kind == EXPR_FLOAT:
+            return f"mur_float({self.c_float(node[1])})"
+        if kind == EXPR_STRING:
+            return f"mur_string({self.c_string(node[1])})"
+        if kind == EXPR_NAME:
+            if node[1] in self.local_set:
+                return self.variable(node[1])
+            reference = self.resolve_path(node, expression)
+            if reference[0] != "function":
+                expression.error(f"'{node[1]}' can only be called", node[2])
+            return f"mur_function_value({self.function_name(reference[1])}__function())"
+        if kind == EXPR_REFERENCE:
+            return f"mur_function_value({self.function_name(node[1][1])}__function())"
+        if kind == EXPR_UNARY:
+            return f"{UNARY_FUNCTIONS[node[1]]}({self.c_expression(node[2], expression)})"
+        if kind == EXPR_BINARY:
+            left = self.c_expression(node[2], expression)
+            right = self.c_expression(node[3], expression)
+            if node[1] == "&&" or node[1] == "||":
+                return f"mur_bool(mur_truthy({left}) {node[1]} mur_truthy({right}))"
+            if node[1] in OPERATOR_FIELDS:
+                shape = self.shape_of(node[2])
+                operator = self.shape_operator(shape, node[1])
+                if operator:
+                    arguments = [left, right]
+                    if id(operator[1]) in self.region_functions:
+                        arguments.insert(0, self.call_region(node, operator[1]))
+                    return f"{self.shape_name(shape)}__{OPERATOR_FIELDS[node[1]]}__operator({', '.join(arguments)})"
+            return f"{BINARY_FUNCTIONS[node[1]]}({left}, {right})"
+        if kind == EXPR_CALL:
+            return self.c_call(node, expression)
+        if kind == EXPR_INDEX:
+            return f"mur_get_index({self.c_expression(node[1], expression)}, {self.c_expression(node[2], expression)})"
+        if kind == EXPR_FIELD:
+            if self.is_static_path(node):
+                reference = self.resolve_path(node, expression)
+                if reference[0] != "function":
+                    expression.error(f"'{node[2]}' can only be called", node[3])
+                return f"mur_function_value({self.function_name(reference[1])}__function())"
+            value = self.c_expression(node[1], expression)
+            field = self.c_string(node[2].encode())
+            shape = self.shape_of(node[1])
+            slot = self.shape_slot(shape, node[2])
+            if slot is not None:
+                return f"mur_shape_get_field({value}, &{self.shape_name(shape)}, {slot}, {field})"
+            if self.object_dispatch == OBJECT_DYNAMIC:
+                return f"mur_get_field({value}, {field})"
+            return f"mur_get_field_cached({value}, {field}, {self.new_cache()})"
+        if kind == EXPR_ARRAY:
+            items = [self.c_expression(item, expression) for item in node[1]]
+            return f"mur_array_new({len(items)}, {self.value_array(items)})"
+        values = self.value_array([self.c_expression(value, expression) for value in node[3]])
+        shape = self.literal_shapes[id(node)]
+        placement = self.object_allocation_site(node)
+        if placement == "stack":
+            self.storages.append(shape)
+            return f"mur_object_init(&mur_storage_{len(self.storages) - 1}.object, &{self.shape_name(shape)}, {values})"
+        if placement == "arena":
+            return f"mur_object_in(&mur_frame, &{self.shape_name(shape)}, {values})"
+        if placement == "caller's region":
+            return f"mur_object_in(mur_region, &{self.shape_name(shape)}, {values})"
+        return f"mur_object_shaped(&{self.shape_name(shape)}, {values})"
+
+    def c_call(self, node, expression):
+        callee = node[1]
+        arguments = [self.c_expression(argument, expression) for argument in node[2]]
+        if self.is_static_path(callee):
+            return self.static_call(self.resolve_path(callee, expression), arguments, expression, node)
+        if callee[0] == EXPR_FIELD:
+            receiver = self.c_expression(callee[1], expression)
+            shape = self.shape_of(callee[1])
+            method = self.shape_method(shape, callee[2], len(arguments))
+            if method:
+                arguments.insert(0, receiver)
+                if id(method[1]) in self.region_functions:
+                    arguments.insert(0, self.call_region(node, method[1]))
+                return f"{self.shape_name(shape)}__{callee[2]}({', '.join(arguments)})"
+            name = self.c_string(callee[2].encode())
+            if self.object_dispatch == OBJECT_DYNAMIC:
+                return f"mur_call_method({receiver}, {name}, {len(arguments)}, {self.value_array(arguments)})"
+            return f"mur_call_method_cached({receiver}, {name}, {len(arguments)}, {self.value_array(arguments)}, {self.new_cache()})"
+        return f"mur_call({self.c_expression(callee, expression)}, {len(arguments)}, {self.value_array(arguments)})"
+
+    def is_static_path(self, node):
+        # a chain of names that starts with a name that is not a local
+        while node[0] == EXPR_FIELD:
+            node = node[1]
+        return node[0] == EXPR_REFERENCE or (node[0] == EXPR_NAME and node[1] not in self.local_set)
+
+    def resolve_path(self, node, expression):
+        reference = self.lookup_path(node)
+        if reference[0] == "error":
+            expression.error(reference[1], reference[2])
+        return reference
+
+    def lookup_path(self, node):
+        # a function of this module or a builtin, or a namespace.function or
+        # alias.function or alias.namespace.function path, unknown paths give
+        # an ("error", message, token) reference
+        if node[0] == EXPR_REFERENCE:
+            return node[1]
+        names = []
+        while node[0] == EXPR_FIELD:
+            names.append((node[2], node[3]))
+            node = node[1]
+        name, index = node[1], node[2]
+        names.reverse()
+        module = self.module
+        if not names:
+            function = self.namespace.functions.get(name)
+            if function is None and "global" in module.namespaces:
+                function = module.namespaces["global"].functions.get(name)
+            if function is not None:
+                return ("function", function)
+            if name in module.external_functions:
+                return ("extern", module.external_functions[name])
+            if name in BUILTIN_FUNCTIONS:
+                return ("builtin", name)
+            return ("error", f"unknown name '{name}'", index)
+
+        if name in module.namespaces:
+            target = module
+            namespace_name = name
+        else:
+            target = self.resolve_includes(module).get(name)
+            namespace_name = "global"
+            if target is None:
+                return ("error", f"unknown name '{name}'", index)
+            if len(names) == 2 and names[0][0] in target.namespaces:
+                namespace_name = names[0][0]
+                names = names[1:]
+        if len(names) != 1:
+            return ("error", f"expected a function of '{name}'", index)
+        member, member_index = names[0]
+        namespace = target.namespaces.get(namespace_name)
+        function = namespace.functions.get(member) if namespace else None
+        if function is not None:
+            return ("function", function)
+        if target is not module and namespace_name == "global" and member in target.external_functions:
+            return ("extern", target.external_functions[member])
+        return ("error", f"unknown function '{member}'", member_index)
+
+    def static_call(self, reference, arguments, expression, node):
+        kind, target = reference
+        index = node[3]
+        if kind == "function":
+            if len(arguments) != len(target.parameters):
+                expression.error(f"'{target.name}' takes {len(target.parameters)} arguments, not {len(arguments)}", index)
+            return self.direct_call(target, self.call_region(node, target), arguments)
+        if kind == "builtin":
+            function, arity = BUILTIN_FUNCTIONS[target]
+            if len(arguments) != arity:
+                expression.error(f"'{target}' takes {arity} arguments, not {len(arguments)}", index)
+            return f"{function}({', '.join(arguments)})"
+        if len(arguments) != len(target.parameters):
+            expression.error(f"'{target.name}' takes {len(target.parameters)} arguments, not {len(arguments)}", index)
+        if self.unit_headers is not None:
+            self.unit_headers.add(f"{self.prefixes[id(target.parent_ast)]}.h")
+        converted = [f"{EXTERN_TYPES[parameter.string][1]}({argument})" for parameter, argument in zip(target.parameters, arguments)]
+        call = f"{target.name}({', '.join(converted)})"
+        result = EXTERN_TYPES[target.return_type][2]
+        if result is None:
+            return f"({call}, mur_nil())"
+        return f"{result}({call})"
+
+    def value_array(self, items):
+        if not items:
+            return "NULL"
+        return f"(const mur_value[]){{{', '.join(items)}}}"
+
+    def c_integer(self, value):
+        if value == -0x8000000000000000:
+            return "INT64_MIN"
+        return str(value)
+
+    def c_float(self, value):
+        if math.isinf(value):
+            return "-1e999" if value < 0 else "1e999"
+        return repr(value)
+
+    def c_string(self, value):
+        # printable ASCII is kept, everything else becomes an octal escape
+        characters = []
+        for byte in value:
+            if 32 <= byte < 127 and byte != 34 and byte != 92 and byte != 63:
+                characters.append(chr(byte))
+            elif byte in C_ESCAPES:
+                characters.append(C_ESCAPES[byte])
+            else:
+                characters.append(f"\\{byte:03o}")
+        return f"\"{''.join(characters)}\""
+
+
+# the --watch server keeps one persistent session and answers requests sent as
+# one JSON object per line over a local Unix socket, e.g.
+#   {"command": "compile", "file": "main.mur", "output": "main.c"}
+#   {"command": "status"}
+#   {"command": "shutdown"}
+# and replies with one JSON object per line, requests are served one at a time
+class CompilerRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            if isinstance(request, dict):
+                response = self.server.dispatch(request)
+            else:
+                response = {"ok": False, "error": "expected a JSON object"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+            if response.get("shutdown"):
+                self.server.stopped.set()
+                threading.Thread(target = self.server.shutdown).start()
+                return
+
+class CompilerServer(socketserver.UnixStreamServer):
+    def __init__(self, socket_path, session, input_file = None, codegen_options = None):
+        self.session = session
+        self.input_file = input_file
+        self.codegen_options = codegen_options or {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        super().__init__(socket_path, CompilerRequestHandler)
+
+    def compile(self, inputFile, outputFile):
+        # compiler errors print and exit, the server sends them back instead
+        messages = io.StringIO()
+        start = time.perf_counter()
+        with self.lock, contextlib.redirect_stdout(messages):
+            try:
+                ast = self.session.rebuild(inputFile)
+                write_output(ast, outputFile, **self.codegen_options)
+            except SystemExit:
+                return {"ok": False, "error": messages.getvalue()}
+        response = {"ok": True, "output": outputFile, "messages": messages.getvalue()}
+        response.update(self.session.rebuild_stats)
+        response["time_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return response
+
+    def dispatch(self, request):
+        command = request.get("command")
+        if command == "compile":
+            inputFile = request.get("file") or self.input_file
+            if not inputFile or not os.path.isfile(inputFile):
+                return {"ok": False, "error": "input file does not exist"}
+            return self.compile(inputFile, request.get("output") or inputFile + ".out.c")
+        if command == "status":
+            with self.lock:
+                modules = sorted(self.session.module_graph)
+            return {"ok": True, "version": COMPILER_VERSION, "modules": modules}
+        if command == "shutdown":
+            return {"ok": True, "shutdown": True}
+        return {"ok": False, "error": f"unknown command {command!r}"}
+
+    def watch(self, inputFile, outputFile, interval):
+        # polls the files of every loaded module and recompiles on a change
+        signatures = None
+        while not self.stopped.is_set():
+            with self.lock:
+                current = self.session.file_signatures()
+            if current != signatures:
+                response = self.compile(inputFile, outputFile)
+                if response["ok"]:
+                    print(f"compiled {inputFile} in {response['time_ms']:.1f} ms: {response['relexed']} modules lexed, {response['reparsed']} namespaces parsed, {response['reused']} reused")
+                else:
+                    print(response["error"], end = "")
+                with self.lock:
+                    signatures = self.session.file_signatures()
+            self.stopped.wait(interval)
+
+def run_compiler_server(socket_path, session, inputFile, outputFile, interval, codegen_options = None):
+    if not hasattr(socket, "AF_UNIX"):
+        print_help_and_exit("Error: --watch needs Unix domain sockets")
+    if os.path.exists(socket_path):
+        # a socket nobody listens on is left over from a server that died
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+        else:
+            print_help_and_exit(f"Error: a compiler server is already listening on {socket_path}")
+        finally:
+            probe.close()
+
+    server = CompilerServer(socket_path, session, inputFile, codegen_options)
+    if inputFile:
+        threading.Thread(target = server.watch, args = (inputFile, outputFile, interval), daemon = True).start()
+    print(f"listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stopped.set()
+        server.server_close()
+        with contextlib.suppress(OSError):
+            os.remove(socket_path)
+
+def write_output(ast, outputFile, **codegen_options):
+    # the C is streamed through a large write buffer into a temporary file
+    # that replaces the output only once the whole program is generated
+    with ast.session.phase("codegen", ast.module_name):
+        generator = CGenerator(ast, **codegen_options)
+        temporary = outputFile + ".tmp"
+        try:
+            with open(temporary, 'w', encoding = "utf-8", newline = "\n", buffering = OUTPUT_BUFFER_SIZE) as f:
+                f.writelines(generator.emit_program())
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temporary)
+            raise
+        os.replace(temporary, outputFile)
+    return generator
+
+def batch_inputs(paths, manifest = None):
+    # the .mur files of the paths and of the lines of the manifest, which are
+    # relative to the manifest, directories are searched recursively
+    paths = list(paths)
+    if manifest:
+        with open(manifest) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    paths.append(os.path.join(os.path.dirname(manifest), line))
+    files = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for directory, directories, names in os.walk(path):
+                directories.sort()
+                found.extend(os.path.join(directory, name) for name in sorted(names) if name.endswith(".mur"))
+        elif os.path.isfile(path):
+            found = [path]
+        else:
+            print_help_and_exit(f"Error: input {path} does not exist")
+        for file in found:
+            key = os.path.realpath(file)
+            if key not in seen:
+                seen.add(key)
+                files.append(file)
+    return files
+
+def batch_output_files(files, out_dir):
+    # the outputs mirror the directories of the inputs below their common root
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(file)) for file in files])
+    return [os.path.join(out_dir, os.path.relpath(os.path.abspath(file), root)) + ".out.c" for file in files]
+
+def compile_in_session(session, inputFile, outputFile, check_all, codegen_options):
+    # compiles one program of a batch, compiler errors are returned instead of
+    # ending the process and the modules the failed compile added are dropped,
+    # so the next program that includes them reports the error again
+    messages = io.StringIO()
+    known = set(session.module_graph)
+    with contextlib.redirect_stdout(messages):
+        try:
+            ast = session.load_program(inputFile)
+            if check_all:
+                for module in session.module_graph.values():
+                    module.parse_bodies()
+            os.makedirs(os.path.dirname(os.path.abspath(outputFile)), exist_ok = True)
+            write_output(ast, outputFile, **codegen_options)
+        except SystemExit:
+            for path in set(session.module_graph) - known:
+                del session.module_graph[path]
+            session.loading = set()
+            session.parsed_modules = {}
+            return False, messages.getvalue()
+    return True, messages.getvalue()
+
+# the session of a batch worker process, shared by every program it compiles
+batch_session = None
+
+def start_batch_worker(parse_cache, include_paths, lazy_bodies, precompiled_dir):
+    global batch_session
+    batch_session = CompilationSession(parse_cache, 1, include_paths, lazy_bodies = lazy_bodies, precompiled_dir = precompiled_dir)
+
+def compile_batch_file(inputFile, outputFile, check_all, codegen_options):
+    ok, messages = compile_in_session(batch_session, inputFile, outputFile, check_all, codegen_options)
+    return ok, messages, os.getpid(), len(batch_session.module_graph)
+
+def compile_batch(files, out_dir, jobs, session, check_all, codegen_options):
+    # every program is compiled in one process with one session, or spread
+    # over a pool of worker processes with a session each, so an included
+    # module is parsed once per process, returns the number of failed files
+    outputs = batch_output_files(files, out_dir)
+    failed = 0
+    start = time.perf_counter()
+    if jobs == 1:
+        results = (compile_in_session(session, inputFile, outputFile, check_all, codegen_options) + (os.getpid(), len(session.module_graph)) for inputFile, outputFile in zip(files, outputs))
+        executor = None
+    else:
+        # each worker takes a run of neighbouring files, which tend to include
+        # the same modules
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers = jobs if jobs > 0 else os.cpu_count(), initializer = start_batch_worker, initargs = (session.parse_cache, session.resolver.include_paths, session.lazy_bodies, session.resolver.precompiled_dir))
+        chunksize = max(1, len(files) // ((jobs if jobs > 0 else os.cpu_count()) * 4))
+        results = executor.map(compile_batch_file, files, outputs, [check_all] * len(files), [codegen_options] * len(files), chunksize = chunksize)
+    modules = {}
+    try:
+        for inputFile, (ok, messages, worker, module_count) in zip(files, results):
+            modules[worker] = module_count
+            if not ok:
+                failed += 1
+                print(f"{inputFile}: failed")
+                print(messages, end = "")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+    print(f"compiled {len(files) - failed} of {len(files)} files in {elapsed:.2f} s, {len(files) / elapsed:.1f} files/s, {sum(modules.values())} modules loaded in {len(modules)} process{'es' if len(modules) != 1 else ''}")
+    return failed
+
+def write_if_changed(path, text):
+    # a file whose text did not change keeps its mtime
+    try:
+        with open(path, encoding = "utf-8", newline = "\n") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    temporary = path + ".tmp"
+    with open(temporary, 'w', encoding = "utf-8", newline = "\n") as f:
+        f.write(text)
+    os.replace(temporary, path)
+    return True
+
+def write_units(ast, directory, **codegen_options):
+    # the program as one C unit per module and the headers they include,
+    # returns the generator, the text of every header by name and the path,
+    # C and included headers of every unit
+    with ast.session.phase("codegen", ast.module_name):
+        generator = CGenerator(ast, **codegen_options)
+        headers, units = generator.emit_units()
+        os.makedirs(directory, exist_ok = True)
+        for name, text in headers.items():
+            write_if_changed(os.path.join(directory, name), text)
+        paths = []
+        for prefix, (text, includes) in units.items():
+            path = os.path.join(directory, prefix + ".c")
+            write_if_changed(path, text)
+            paths.append((path, text, includes))
+    return generator, headers, paths
+
+def compiler_identity(cc):
+    # a different compiler binary at the same name misses the object cache
+    path = shutil.which(cc)
+    if path is None:
+        print_help_and_exit(f"Error: C compiler '{cc}' not found")
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}"
+
+def build_units(session, headers, units, executable, cc, cflags, ldflags, jobs, object_cache):
+    # compiles the units that miss the object cache in parallel and links
+    # every object into the executable, returns the number of units compiled,
+    # an object is keyed on its unit and the headers that unit includes
+    identity = compiler_identity(cc)
+    keys = []
+    for path, text, includes in units:
+        key = "\0".join([COMPILER_VERSION, identity, *cflags, *(headers[name] for name in includes), text])
+        keys.append(hashlib.sha256(key.encode()).hexdigest())
+
+    def compile_unit(path, key):
+        with session.phase("cc", os.path.basename(path)):
+            handle, temporary = tempfile.mkstemp(dir = object_cache.directory, suffix = ".tmp")
+            os.close(handle)
+            result = subprocess.run([cc, *cflags, "-c", path, "-o", temporary], capture_output = True, text = True)
+            if result.returncode != 0:
+                with contextlib.suppress(OSError):
+                    os.remove(temporary)
+                return result.stderr
+            os.replace(temporary, object_cache.entry_path(key))
+        return None
+
+    objects = []
+    pending = []
+    for (path, _, _), key in zip(units, keys):
+        if object_cache.lookup(key) is None:
+            pending.append((path, key))
+        objects.append(object_cache.entry_path(key))
+    if pending:
+        # the compiler runs as a child process, so threads are enough
+        with concurrent.futures.ThreadPoolExecutor(max_workers = jobs if jobs > 0 else os.cpu_count()) as executor:
+            errors = list(executor.map(lambda unit: compile_unit(*unit), pending))
+        for (path, _), error in zip(pending, errors):
+            if error is not None:
+                print(error, end = "")
+                print_help_and_exit(f"Error: {cc} failed to compile {path}")
+    with session.phase("link", os.path.basename(executable)):
+        result = subprocess.run([cc, *cflags, "-o", executable, *objects, *ldflags], capture_output = True, text = True)
+    if result.returncode != 0:
+        print(result.stderr, end = "")
+        print_help_and_exit(f"Error: {cc} failed to link {executable}")
+    object_cache.evict()
+    return len(pending)
+
+def precompiled_output_file(file, resolver):
+    # next to the source, or in the directory of precompiled modules at the
+    # path the module is included by from its include root
+    if not resolver.precompiled_dir:
+        return os.path.splitext(file)[0] + PRECOMPILED_SUFFIX
+    path = os.path.realpath(file)
+    relative = os.path.basename(path)
+    for include_path in resolver.include_paths:
+        root = os.path.realpath(include_path)
+        if path.startswith(root + os.sep):
+            relative = os.path.relpath(path, root)
+            break
+    return os.path.join(resolver.precompiled_dir, os.path.splitext(relative)[0] + PRECOMPILED_SUFFIX)
+
+def precompile_modules(files, session):
+    # writes the .murc of every module whose source or includes changed since
+    # it was precompiled, every function body is parsed to catch its errors
+    written = 0
+    for file in files:
+        output = precompiled_output_file(file, session.resolver)
+        ast = session.load_module(file)
+        ast.parse_bodies()
+        include_hashes = precompiled_include_hashes(ast)
+        if precompiled_is_fresh(output, file) and read_precompiled_include_hashes(output) == include_hashes:
+            continue
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+        write_precompiled(ast, output, include_hashes)
+        print(f"precompiled {file} to {output}")
+        written += 1
+    print(f"{written} of {len(files)} modules precompiled, {len(files) - written} up to date")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(prog = "muriel.py", usage = "python muriel.py [options] <input_file> [output_file]\n       python muriel.py [options] --out-dir DIR [-j N] [--manifest FILE] <input_file or directory>...")
+    parser.add_argument("inputs", nargs = "*", metavar = "input", help = "the input file and the optional output file, or with --out-dir any number of input files and directories")
+    parser.add_argument("--out-dir", help = "compile every input, the .mur files of directories and those listed in --manifest in one process, into DIR")
+    parser.add_argument("--manifest", metavar = "FILE", help = "also compile the files and directories listed in FILE, one per line, relative to FILE")
+    parser.add_argument("-j", "--jobs", type = int, default = 1, help = "compile the files of a batch in N worker processes, 0 uses every core (default: 1)")
+    parser.add_argument("-I", "--include-path", action = "append", default = [], help = "search DIR for included modules, may be repeated, searched before $MURIEL_INCLUDE_PATH and '.'")
+    parser.add_argument("--cache-dir", default = os.environ.get("MURIEL_CACHE_DIR"), help = "directory of the parse cache for included modules (default: $MURIEL_CACHE_DIR)")
+    parser.add_argument("--cache-size", type = int, default = 256, help = "size limit of the parse cache in MiB (default: 256)")
+    parser.add_argument("--no-cache", action = "store_true", help = "do not read or write the parse cache")
+    parser.add_argument("--lazy-parse", action = "store_true", help = "parse a function body only when code generation or the reachability walk from global.main needs it")
+    parser.add_argument("--check-all", action = "store_true", help = "parse and generate every function, also those global.main does not reach, so errors anywhere in the program are reported")
+    parser.add_argument("--parse-jobs", type = int, default = 1, help = "parse modules in N worker processes, 0 uses every core (default: 1)")
+    parser.add_argument("--switch-lowering", choices = ["auto", SWITCH_CHAIN], default = "auto", help = "lower switch blocks to jump tables and binary or hash searches where the case values allow it, or always to an if chain (default: auto)")
+    parser.add_argument("--object-dispatch", choices = [OBJECT_SHAPES, OBJECT_DYNAMIC], default = OBJECT_SHAPES, help = "dispatch field accesses, methods and operators of objects through the shapes of object literals and inline caches, or by name lookups only (default: auto)")
+    parser.add_argument("--object-allocation", choices = [OBJECT_ALLOCATION, OBJECT_HEAP], default = OBJECT_ALLOCATION, help = "allocate object literals that cannot outlive their call on the stack or in an arena of the call and those only returned in the region of the caller, or all of them on the heap (default: auto)")
+    parser.add_argument("--profile", action = "store_true", help = "instrument the program to count and time the calls of every function and count the iterations of every loop, at exit it writes collapsed stacks for flame graphs to $MURIEL_PROFILE (default: muriel.folded) and a table of functions and loops to the same name with .txt appended, turns off inlining")
+    parser.add_argument("--inline-threshold", type = int, default = INLINE_THRESHOLD, help = f"inline calls of functions whose body has at most N statements and expression nodes, across namespaces and modules, 0 inlines nothing (default: {INLINE_THRESHOLD})")
+    parser.add_argument("--keep-unused", action = "store_true", help = "emit every function, extern declaration and module, not only those global.main reaches")
+    parser.add_argument("--prune-report", action = "store_true", help = "print what was pruned as unreachable from global.main")
+    parser.add_argument("--escape-report", action = "store_true", help = "list the object literals escape analysis moved off the heap")
+    parser.add_argument("--precompile", action = "store_true", help = "write a precompiled module (.murc) of every input file or .mur file under an input directory, next to its source or into --murc-dir, includes prefer a fresh .murc to its source")
+    parser.add_argument("--murc-dir", default = os.environ.get("MURIEL_MURC_DIR"), metavar = "DIR", help = "directory of precompiled modules laid out like the include paths, searched after the .murc next to a source (default: $MURIEL_MURC_DIR)")
+    parser.add_argument("--units", metavar = "DIR", help = "write the program as one C unit per module and the headers they include into DIR instead of one output file")
+    parser.add_argument("--build", metavar = "EXECUTABLE", help = "write the units, into <input_file>.units unless --units is given, compile them with the C compiler in parallel and link EXECUTABLE, units whose C and headers did not change come from the object cache")
+    parser.add_argument("--cc", default = os.environ.get("CC", "cc"), help = "C compiler of --build (default: $CC or cc)")
+    parser.add_argument("--cflags", default = "-O2", help = "flags of the C compiler for --build, given as --cflags=\"...\" (default: -O2)")
+    parser.add_argument("--ldflags", default = "-lm", help = "flags of the link of --build, given as --ldflags=\"...\" (default: -lm)")
+    parser.add_argument("--cc-jobs", type = int, default = 0, help = "run N C compilers at once for --build, 0 runs one per core (default: 0)")
+    parser.add_argument("--object-cache", metavar = "DIR", help = "object cache of --build (default: .objects in the units directory)")
+    parser.add_argument("--timings", action = "store_true", help = "print the wall time of every compiler phase")
+    parser.add_argument("--stats", action = "store_true", help = "like --timings, also trace the allocations of every phase and print the token counts of the modules and the largest functions, tracing allocations slows the compiler down")
+    parser.add_argument("--stats-json", metavar = "FILE", help = "write the --timings or --stats report as JSON to FILE, '-' writes it to stdout")
+    parser.add_argument("--profile-phase", metavar = "PHASE", help = "run PHASE, e.g. codegen or tokenize, under cProfile and print its most expensive functions")
+    parser.add_argument("--watch", action = "store_true", help = "keep running, recompile the input file when a module changes and serve compile requests on --socket")
+    parser.add_argument("--socket", default = ".muriel.sock", help = "Unix socket of the --watch server (default: .muriel.sock)")
+    parser.add_argument("--watch-interval", type = float, default = 0.5, help = "seconds between checks for changed modules in --watch mode (default: 0.5)")
+    return parser.parse_args()
+
+def print_stats(args, stats, session, profiler, report_stream):
+    if args.stats_json:
+        report = json.dumps(stats.report(session), indent = 2)
+        if args.stats_json == "-":
+            print(report, file = report_stream)
+        else:
+            with open(args.stats_json, 'w') as f:
+                f.write(report + "\n")
+    elif args.timings or args.stats:
+        for line in stats.report_lines(session):
+            print(line)
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
 def main():
-    if len(sys.argv) < 2:
+    args = parse_arguments()
+    # with --stats-json - stdout only carries the report, everything else the
+    # compiler prints goes to stderr
+    report_stream = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr) if args.stats_json == "-" else contextlib.nullcontext():
+        run_compiler(args, report_stream)
+
+def run_compiler(args, report_stream):
+    batch = args.out_dir is not None
+    if args.manifest and not batch:
+        print_help_and_exit("Error: --manifest needs --out-dir")
+    if batch and args.watch:
+        print_help_and_exit("Error: --watch compiles a single input file")
+    if (args.units or args.build) and (batch or args.watch):
+        print_help_and_exit("Error: --units and --build compile a single input file")
+    if args.precompile and (batch or args.watch):
+        print_help_and_exit("Error: --precompile takes its modules as input files")
+    if not batch and not args.precompile and len(args.inputs) > 2:
+        print_help_and_exit("Error: compiling several input files needs --out-dir")
+    if not args.inputs and not args.watch and not args.manifest:
         print_help_and_exit("Error: no input file specified")
 
-    inputFile = sys.argv[1]
+    inputFile = None
+    outputFile = None
+    if not batch and not args.precompile and args.inputs:
+        inputFile = args.inputs[0]
+        if not os.path.isfile(inputFile):
+            print_help_and_exit("Error: input file does not exist")
+        outputFile = inputFile + ".out.c"
+        if len(args.inputs) > 1:
+            outputFile = args.inputs[1]
 
-    if not os.path.isfile(inputFile):
-        print_help_and_exit("Error: input file does not exist")
+    parse_cache = None
+    if args.cache_dir and not args.no_cache:
+        parse_cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
 
-    outputFile = inputFile + ".out.c"
-    if len(sys.argv) > 2:
-        outputFile = sys.argv[2]
-    
-    tokens = []
-    with open(inputFile, 'rb') as f:
-        tokens = list(tokenize.tokenize(f.readline))
+    codegen_options = {"switch_lowering": args.switch_lowering, "object_dispatch": args.object_dispatch, "object_allocation": args.object_allocation, "inline_threshold": args.inline_threshold, "prune": not (args.keep_unused or args.check_all), "profile": args.profile}
+
+    if args.watch:
+        session = CompilationSession(parse_cache, args.parse_jobs, args.include_path, persistent = True, lazy_bodies = args.lazy_parse, precompiled_dir = args.murc_dir)
+        run_compiler_server(args.socket, session, inputFile, outputFile, args.watch_interval, codegen_options)
+        return
 
-    with open(outputFile, 'w') as f:
-        for token in tokens:
-            f.write(str(token))
-            f.write('\n')
+    stats = None
+    profiler = None
+    if args.timings or args.stats or args.stats_json or args.profile_phase:
+        if batch and args.jobs != 1:
+            print_help_and_exit("Error: --timings, --stats and --profile-phase need -j 1")
+        stats = CompilerStats(trace_allocations = args.stats)
+        if args.profile_phase:
+            profiler = cProfile.Profile()
+            stats.add_hook(args.profile_phase, lambda phase, subject: profiler)
 
-    file_name_without_extension = os.path.splitext(os.path.basename(inputFile))[0]
-    ast = MurielAst(file_name_without_extension)
-    ast.parse(tokens[1:])
+    session = CompilationSession(parse_cache, args.parse_jobs, args.include_path, lazy_bodies = args.lazy_parse, stats = stats, precompiled_dir = args.murc_dir)
+    if args.precompile:
+        files = batch_inputs(args.inputs)
+        if not files:
+            print_help_and_exit("Error: no .mur files to precompile")
+        precompile_modules(files, session)
+        if stats:
+            stats.stop()
+        print_stats(args, stats, session, profiler, report_stream)
+        return
+    if batch:
+        files = batch_inputs(args.inputs, args.manifest)
+        if not files:
+            print_help_and_exit("Error: no .mur files to compile")
+        failed = compile_batch(files, args.out_dir, args.jobs, session, args.check_all, codegen_options)
+        if stats:
+            stats.stop()
+        print_stats(args, stats, session, profiler, report_stream)
+        if failed:
+            sys.exit(1)
+        return
 
+    ast = session.load_program(inputFile)
+    if args.check_all:
+        for module in session.module_graph.values():
+            module.parse_bodies()
+    if args.units or args.build:
+        units_directory = args.units or inputFile + ".units"
+        generator, headers, units = write_units(ast, units_directory, **codegen_options)
+        if args.build:
+            start = time.perf_counter()
+            object_cache = ObjectCache(args.object_cache or os.path.join(units_directory, ".objects"))
+            compiled = build_units(session, headers, units, args.build, args.cc, shlex.split(args.cflags), shlex.split(args.ldflags), args.cc_jobs, object_cache)
+            print(f"built {args.build} from {len(units)} units in {time.perf_counter() - start:.2f} s: {compiled} compiled, {len(units) - compiled} from the object cache")
+    else:
+        generator = write_output(ast, outputFile, **codegen_options)
+    if stats:
+        stats.stop()
+    if args.prune_report:
+        for line in generator.prune_report():
+            print(line)
+    if args.escape_report:
+        for line in generator.escape_report():
+            print(line)
+    print_stats(args, stats, session, profiler, report_stream)
 
     #print(ast)
     for namespace_name in ast.namespaces:
@@ -655,4 +4494,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()